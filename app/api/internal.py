@@ -0,0 +1,53 @@
+import os
+import hmac
+from fastapi import APIRouter, Depends, Header
+from app.db.base import engine, replica_router
+from app.db.pool import pool_status
+from app.controllers.access_policy import access_policy
+from app.controllers.cast_graph import collaboration_graph
+from app.utils.error_handler import ErrorHandler
+
+
+# required by the internal endpoints (/internal/*, /metrics, the export);
+# unset, they answer 403
+INTERNAL_API_TOKEN = os.environ.get("INTERNAL_API_TOKEN")
+# opens them without a token, for development / a network nothing else reaches
+INTERNAL_API_ALLOW_UNAUTHENTICATED = os.environ.get("INTERNAL_API_ALLOW_UNAUTHENTICATED", "false").lower() == "true"
+
+router = APIRouter()
+
+
+def check_internal_token(internal_token: str = Header(default=None)):
+    if not INTERNAL_API_TOKEN:
+        if INTERNAL_API_ALLOW_UNAUTHENTICATED:
+            return
+        raise ErrorHandler.access_denied("endpoint")
+    if not internal_token or not hmac.compare_digest(internal_token, INTERNAL_API_TOKEN):
+        raise ErrorHandler.access_denied("endpoint")
+
+
+# connection pool usage of this worker
+@router.get("/pool", dependencies=[Depends(check_internal_token)])
+async def pool_route():
+    return pool_status(engine)
+
+
+# read replicas: health, lag and pool usage as seen by this worker
+@router.get("/replicas", dependencies=[Depends(check_internal_token)])
+async def replicas_route():
+    return [
+        {**replica.status(), "pool": pool_status(replica.engine)}
+        for replica in replica_router.replicas
+    ]
+
+
+# ip rules / cors origins this worker enforces
+@router.get("/access-policy", dependencies=[Depends(check_internal_token)])
+async def access_policy_route():
+    return access_policy.status()
+
+
+# size and freshness of this worker's cast graph
+@router.get("/cast-graph", dependencies=[Depends(check_internal_token)])
+async def cast_graph_route():
+    return collaboration_graph.status()
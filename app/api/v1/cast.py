@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Path, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import get_db
+from app.schemas import ICastDetail, ICastPath
+from app.controllers.cast import CastController
+from app.controllers.cast_graph import CAST_GRAPH_MAX_DEGREES
+from app.controllers.response_cache import response_cache, tag
+
+
+router = APIRouter()
+
+
+# cast detail (cached, conditional with If-None-Match)
+@router.get("/{cast_id}", response_model=ICastDetail)
+async def get_cast_route(
+        request: Request,
+        cast_id: int = Path(description="Cast id"),
+        db: AsyncSession = Depends(get_db)
+):
+    async def render():
+        cast = await CastController(db).get_by_id(cast_id)
+        tags = [tag("cast", cast_id)]
+        tags += [tag("movie", movie.id) for movie in cast.movies]
+        return cast, tags
+
+    return await response_cache.respond(request, f"cast:{cast_id}", render, db)
+
+
+# shortest chain of co-starring casts between two casts (degrees of separation)
+@router.get("/{cast_id}/path/{other_cast_id}", response_model=ICastPath)
+async def get_cast_path_route(
+        cast_id: int = Path(description="Cast id"),
+        other_cast_id: int = Path(description="Cast id"),
+        max_degrees: int = Query(default=CAST_GRAPH_MAX_DEGREES, ge=1, le=CAST_GRAPH_MAX_DEGREES),
+        db: AsyncSession = Depends(get_db)
+):
+    return await CastController(db).get_path(cast_id, other_cast_id, max_degrees)
@@ -0,0 +1,23 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from app.controllers.export import export_movies_ndjson
+from app.api.internal import check_internal_token
+
+
+router = APIRouter()
+
+
+# every movie with its credits, one json object per line (chunked)
+@router.get("/movies.ndjson", dependencies=[Depends(check_internal_token)])
+async def export_movies_route(
+        updated_since: datetime = Query(default=None, alias="updatedSince",
+                                        description="only movies updated at or after this time"),
+        accept_encoding: str = Header(default="")
+):
+    compress = "gzip" in accept_encoding.lower()
+    headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"} if compress else {}
+    return StreamingResponse(
+        export_movies_ndjson(updated_since, compress),
+        media_type="application/x-ndjson",
+        headers=headers)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Path, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import get_db
+from app.schemas import IGenreDetail
+from app.controllers.genre import GenreController
+from app.controllers.response_cache import response_cache, tag
+
+
+router = APIRouter()
+
+
+# genre detail (cached, conditional with If-None-Match)
+@router.get("/{genre_id}", response_model=IGenreDetail)
+async def get_genre_route(
+        request: Request,
+        genre_id: int = Path(description="Genre id"),
+        db: AsyncSession = Depends(get_db)
+):
+    async def render():
+        genre = await GenreController(db).get_by_id(genre_id)
+        return genre, [tag("genre", genre_id)]
+
+    return await response_cache.respond(request, f"genre:{genre_id}", render, db)
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Path, Query
+from app.schemas import ILeaderboard
+from app.controllers.leaderboard import LeaderboardController, leaderboard_key
+
+
+router = APIRouter()
+
+
+async def get_leaderboard(key: str, offset: int, limit: int):
+    leaderboard_controller = LeaderboardController()
+    items = await leaderboard_controller.top(key, offset=offset, limit=limit)
+    return ILeaderboard(items=items)
+
+
+# top rated movies overall
+@router.get("/top", response_model=ILeaderboard)
+async def top_movies_route(
+        offset: int = Query(default=0, ge=0, le=1000),
+        limit: int = Query(default=50, ge=1, le=100)
+):
+    return await get_leaderboard(leaderboard_key("all"), offset, limit)
+
+
+# top rated movies of a genre
+@router.get("/genre/{genre_id}", response_model=ILeaderboard)
+async def top_movies_by_genre_route(
+        genre_id: int = Path(description="Genre id"),
+        offset: int = Query(default=0, ge=0, le=1000),
+        limit: int = Query(default=50, ge=1, le=100)
+):
+    return await get_leaderboard(leaderboard_key("genre", genre_id), offset, limit)
+
+
+# best of a release year
+@router.get("/year/{year}", response_model=ILeaderboard)
+async def top_movies_by_year_route(
+        year: int = Path(description="Release year"),
+        offset: int = Query(default=0, ge=0, le=1000),
+        limit: int = Query(default=50, ge=1, le=100)
+):
+    return await get_leaderboard(leaderboard_key("year", year), offset, limit)
+
+
+# top rated movies of a country
+@router.get("/country/{country}", response_model=ILeaderboard)
+async def top_movies_by_country_route(
+        country: str = Path(description="Country name"),
+        offset: int = Query(default=0, ge=0, le=1000),
+        limit: int = Query(default=50, ge=1, le=100)
+):
+    return await get_leaderboard(leaderboard_key("country", country), offset, limit)
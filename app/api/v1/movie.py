@@ -0,0 +1,71 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, Path, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import get_db
+from app.schemas import IMoviePage, IMovieDetail, IMovieSearchPage, ISimilarMovieList
+from app.controllers.movie import MovieController, MAX_PAGE_SIZE
+from app.controllers.search import get_search_backend
+from app.controllers.similar_movies import SimilarMoviesController, SIMILAR_MOVIES_K
+from app.controllers.response_cache import response_cache, tag
+
+
+router = APIRouter()
+
+
+# list movies (keyset pagination)
+@router.get("", response_model=IMoviePage)
+async def get_movies_route(
+        order: Literal["latest", "top"] = Query(default="latest"),
+        cursor: str = Query(default=None, description="nextCursor of the previous page"),
+        limit: int = Query(default=20, ge=1, le=MAX_PAGE_SIZE),
+        db: AsyncSession = Depends(get_db)
+):
+    movie_controller = MovieController(db)
+    movies, next_cursor = await movie_controller.get_page(
+        order=order, cursor=cursor, limit=limit)
+
+    return IMoviePage(items=movies, nextCursor=next_cursor)
+
+
+# full-text search over name, summary and storyline
+@router.get("/search", response_model=IMovieSearchPage)
+async def search_movies_route(
+        q: str = Query(min_length=1, max_length=200),
+        page: int = Query(default=1, ge=1, le=50),
+        size: int = Query(default=20, ge=1, le=MAX_PAGE_SIZE),
+        db: AsyncSession = Depends(get_db)
+):
+    search_backend = get_search_backend(db)
+    hits, has_more = await search_backend.search(
+        q, offset=(page - 1) * size, limit=size)
+
+    return IMovieSearchPage(items=hits, page=page, size=size, hasMore=has_more)
+
+
+# movie detail (cached, conditional with If-None-Match)
+@router.get("/{movie_id}", response_model=IMovieDetail)
+async def get_movie_route(
+        request: Request,
+        movie_id: int = Path(description="Movie id"),
+        db: AsyncSession = Depends(get_db)
+):
+    async def render():
+        movie = await MovieController(db).get_by_id(movie_id)
+        tags = [tag("movie", movie.id)]
+        tags += [tag("cast", item.id) for item in movie.cast]
+        tags += [tag("writer", item.id) for item in movie.writers]
+        tags += [tag("genre", item.id) for item in movie.genres]
+        return movie, tags
+
+    return await response_cache.respond(request, f"movie:{movie_id}", render, db)
+
+
+# movies with the most cast, writers, genres, countries and languages in common
+@router.get("/{movie_id}/similar", response_model=ISimilarMovieList)
+async def get_similar_movies_route(
+        movie_id: int = Path(description="Movie id"),
+        limit: int = Query(default=10, ge=1, le=SIMILAR_MOVIES_K),
+        db: AsyncSession = Depends(get_db)
+):
+    items = await SimilarMoviesController(db).get_similar(movie_id, limit=limit)
+    return ISimilarMovieList(items=items)
@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, Path, Body
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import get_db
+from app.models import Review
+from app.schemas import (ICreateReviewBody, IUpdateReviewBody, IReview, IMovieRating,
+                         IReviewResponse, IReviewDeleteResponse)
+from app.controllers.review import ReviewController
+from app.controllers.rating import weighted_rate
+from app.dependencies.authentication import get_token_info
+
+
+router = APIRouter()
+
+
+def review_response(review: Review, rating):
+    return IReviewResponse(
+        review=IReview(
+            id=review.id,
+            userId=review.userId,
+            movieId=review.movieId,
+            title=review.title,
+            rate=review.rate.value,
+            text=review.text,
+            createdAt=review.createdAt,
+            updatedAt=review.updatedAt),
+        rating=movie_rating(rating) if rating else None)
+
+
+def movie_rating(rating):
+    rate, rate_sum, rate_count = rating
+    return IMovieRating(rate=rate, rateCount=rate_count,
+                        weightedRate=weighted_rate(rate_sum, rate_count))
+
+
+# review a movie
+@router.post("/movies/{movie_id}/reviews", response_model=IReviewResponse)
+async def create_review_route(
+        movie_id: int = Path(description="Movie id"),
+        data: ICreateReviewBody = Body(description="Review data"),
+        token_info: dict = Depends(get_token_info),
+        db: AsyncSession = Depends(get_db)
+):
+    review_controller = ReviewController(db)
+    review, rating = await review_controller.create(
+        user_id=token_info["user"].id,
+        movie_id=movie_id,
+        review_items=data.model_dump())
+    return review_response(review, rating)
+
+
+# edit own review
+@router.put("/reviews/{review_id}", response_model=IReviewResponse)
+async def update_review_route(
+        review_id: int = Path(description="Review id"),
+        data: IUpdateReviewBody = Body(description="Review data to update"),
+        token_info: dict = Depends(get_token_info),
+        db: AsyncSession = Depends(get_db)
+):
+    review_controller = ReviewController(db)
+    review = await review_controller.get_by_id(review_id, for_update=True)
+    review_controller.check_owner(review, token_info["user"].id)
+
+    review, rating = await review_controller.update(
+        review, review_items=data.model_dump(exclude_unset=True))
+    return review_response(review, rating)
+
+
+# delete own review
+@router.delete("/reviews/{review_id}", response_model=IReviewDeleteResponse)
+async def delete_review_route(
+        review_id: int = Path(description="Review id"),
+        token_info: dict = Depends(get_token_info),
+        db: AsyncSession = Depends(get_db)
+):
+    review_controller = ReviewController(db)
+    review = await review_controller.get_by_id(review_id, for_update=True)
+    review_controller.check_owner(review, token_info["user"].id)
+
+    rating = await review_controller.delete(review)
+    return IReviewDeleteResponse(rating=movie_rating(rating) if rating else None)
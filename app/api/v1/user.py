@@ -1,34 +1,47 @@
-from fastapi import APIRouter, Depends, Path, Body
+from fastapi import APIRouter, Depends, Path, Body, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_db
-from app.schemas import ICreateUserBody, ILoginUser, IUpdateUserBody
+from app.schemas import (ICreateUserBody, ILoginUser, IUpdateUserBody, IUserResponse,
+                         IAuthResponse, IUserProfileResponse, IUsernameAvailable,
+                         ISession, ISessionList, ILogoutResponse)
 from app.utils.error_handler import ErrorHandler
 from app.controllers.user import UserController
+from app.controllers.session import session_store, new_token_id
+from app.controllers.principal_cache import principal_cache
 from app.dependencies.authentication import token_generator, get_token_info
-from app.utils.password_operator import get_password_hash
-from app.controllers.redis import RedisController
+from app.utils.password_operator import password_hasher
 from datetime import datetime
 
 
 router = APIRouter()
 
 
+async def start_session(request: Request, user):
+    # a new token and session per login, other devices stay logged in
+    jti = new_token_id()
+    token = token_generator(user_id=user.id, scope="user", jti=jti)  # or admin
+    await session_store.create(
+        user_id=user.id, jti=jti,
+        device=request.headers.get("user-agent"),
+        ip=request.client.host if request.client else None)
+    return token
+
+
 # register
-@router.post("/register")
+@router.post("/register", response_model=IAuthResponse)
 async def register_route(
+        request: Request,
         data: ICreateUserBody = Body(description="User data to register"),
         db: AsyncSession = Depends(get_db)
 ):
     user_controller = UserController(db)
 
-    # check username
-    await user_controller.check_username_not_exists(data.username)
-
     # check username characters
     user_controller.validate_username_characters(data.username)
 
-    # check email
-    await user_controller.check_email_not_exists(data.email)
+    # check username and email in one query
+    await user_controller.check_user_conflicts(
+        username=data.username, email=data.email)
 
     # check dob
     if (data.dob):
@@ -38,7 +51,7 @@ async def register_route(
     user_controller.validate_password_characters(data.password)
 
     # hash user's password
-    hashed_password = get_password_hash(data.password)
+    hashed_password = await password_hasher.hash(data.password)
 
     # create a new user
     user_items = {
@@ -52,22 +65,16 @@ async def register_route(
     user = await user_controller.create(user_items=user_items)
     await db.close()
 
-    # generate jwt token
-    user_token = token_generator(
-        user_id=user.id, scope="user")  # or admin
-
-    # store user token in redis
-    await store_redis_token(user=user, token=user_token)
+    # generate jwt token and its session
+    user_token = await start_session(request, user)
 
-    return {
-        "user": user,
-        "token": user_token
-    }
+    return IAuthResponse(user=IUserResponse.model_validate(user), token=user_token)
 
 
 # login
-@router.post("/token")
+@router.post("/token", response_model=IAuthResponse)
 async def login_route(
+        request: Request,
         data: ILoginUser = Body(description="User data to login"),
         db: AsyncSession = Depends(get_db)
 ):
@@ -81,15 +88,105 @@ async def login_route(
 
     await db.close()
 
-    # generate jwt token
+    # generate jwt token and its session
     user = await user_controller.get_by_username(data.username)
-    token = token_generator(user_id=user.id, scope="user")  # or admin
+    token = await start_session(request, user)
 
-    # store user token in redis
-    await remove_redis_token(user=user)
-    await store_redis_token(user=user, token=token)
+    return IAuthResponse(user=IUserResponse.model_validate(user), token=token)
 
-    return {
-        "user": user,
-        "token": token
-    }
+
+# logout: revokes the token it's called with
+@router.post("/logout", response_model=ILogoutResponse)
+async def logout_route(
+        token_info: dict = Depends(get_token_info)
+):
+    if not token_info["jti"]:
+        raise ErrorHandler.bad_request("This token has no session, it expires on its own.")
+
+    await session_store.revoke(
+        user_id=token_info["user_id"], jti=token_info["jti"], expires_at=token_info["exp"])
+    principal_cache.invalidate_token(token_info["token"])
+    return ILogoutResponse(revoked=1)
+
+
+# sessions (devices) of the current user
+@router.get("/sessions", response_model=ISessionList)
+async def get_sessions_route(
+        token_info: dict = Depends(get_token_info)
+):
+    sessions = await session_store.get_sessions(token_info["user_id"])
+    return ISessionList(items=[
+        ISession(**session, current=session["jti"] == token_info["jti"]) for session in sessions])
+
+
+# logout one device
+@router.delete("/sessions/{jti}", response_model=ILogoutResponse)
+async def revoke_session_route(
+        jti: str = Path(description="Session id"),
+        token_info: dict = Depends(get_token_info)
+):
+    sessions = await session_store.get_sessions(token_info["user_id"])
+    session = next((session for session in sessions if session["jti"] == jti), None)
+    if not session:
+        raise ErrorHandler.not_found("Session")
+
+    await session_store.revoke(user_id=token_info["user_id"], jti=jti, expires_at=session["expiresAt"])
+    return ILogoutResponse(revoked=1)
+
+
+# logout every device
+@router.delete("/sessions", response_model=ILogoutResponse)
+async def revoke_all_sessions_route(
+        token_info: dict = Depends(get_token_info)
+):
+    revoked = await session_store.revoke_all(token_info["user_id"])
+    principal_cache.invalidate_token(token_info["token"])
+    return ILogoutResponse(revoked=revoked)
+
+
+# username / email availability (signup form typeahead)
+@router.get("/username-available", response_model=IUsernameAvailable)
+async def username_available_route(
+        username: str = Query(default=None),
+        email: str = Query(default=None),
+        db: AsyncSession = Depends(get_db)
+):
+    if not username and not email:
+        raise ErrorHandler.bad_request("username or email is required.")
+
+    user_controller = UserController(db)
+    available = await user_controller.is_available(username=username, email=email)
+    return IUsernameAvailable(available=available)
+
+
+# update profile
+@router.put("/me", response_model=IUserProfileResponse)
+async def update_profile_route(
+        data: IUpdateUserBody = Body(description="User data to update"),
+        token_info: dict = Depends(get_token_info),
+        db: AsyncSession = Depends(get_db)
+):
+    user_controller = UserController(db)
+    user_id = token_info["user"].id
+
+    user_items = data.model_dump(exclude_unset=True)
+
+    # username and email can be changed but not cleared
+    for field in ("username", "email"):
+        if field in user_items and user_items[field] is None:
+            raise ErrorHandler.bad_request(f"{field} can not be null.")
+
+    # check username characters
+    if data.username:
+        user_controller.validate_username_characters(data.username)
+
+    # check username and email in one query
+    await user_controller.check_user_conflicts(
+        username=data.username, email=data.email, exclude_user_id=user_id)
+
+    # check dob
+    if data.dob:
+        user_items["dob"] = await user_controller.validate_dob(dob=data.dob)
+
+    user = await user_controller.update_by_id(id=user_id, user_items=user_items)
+    return IUserProfileResponse(user=IUserResponse.model_validate(user))
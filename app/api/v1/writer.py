@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Path, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import get_db
+from app.schemas import IWriterDetail
+from app.controllers.writer import WriterController
+from app.controllers.response_cache import response_cache, tag
+
+
+router = APIRouter()
+
+
+# writer detail (cached, conditional with If-None-Match)
+@router.get("/{writer_id}", response_model=IWriterDetail)
+async def get_writer_route(
+        request: Request,
+        writer_id: int = Path(description="Writer id"),
+        db: AsyncSession = Depends(get_db)
+):
+    async def render():
+        writer = await WriterController(db).get_by_id(writer_id)
+        tags = [tag("writer", writer_id)]
+        tags += [tag("movie", movie.id) for movie in writer.movies]
+        return writer, tags
+
+    return await response_cache.respond(request, f"writer:{writer_id}", render, db)
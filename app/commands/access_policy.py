@@ -0,0 +1,82 @@
+# Show or change the ip allow / block rules and cors origins in redis;
+# running workers pick changes up through pub/sub.
+#
+#   python -m app.commands.access_policy show
+#   python -m app.commands.access_policy block 203.0.113.0/24 2001:db8::/32
+#   python -m app.commands.access_policy unblock 203.0.113.0/24
+#   python -m app.commands.access_policy cors-add https://imdb.example.com
+#   python -m app.commands.access_policy migrate-legacy
+#
+# migrate-legacy moves the former allow list (the allowed_ip_list redis
+# list, which workers no longer read) into the allow rules, once.
+
+import argparse
+import asyncio
+import json
+from app.db.redis import get_redis_pool, close_redis_pool
+from app.controllers.access_policy import (AccessPolicy, change_policy, parse_network, ALLOW_KEY, BLOCK_KEY,
+                                           CORS_ORIGINS_KEY)
+
+LEGACY_ALLOW_KEY = "allowed_ip_list"
+
+# command -> (key, adds)
+CHANGES = {
+    "allow": (ALLOW_KEY, True),
+    "unallow": (ALLOW_KEY, False),
+    "block": (BLOCK_KEY, True),
+    "unblock": (BLOCK_KEY, False),
+    "cors-add": (CORS_ORIGINS_KEY, True),
+    "cors-remove": (CORS_ORIGINS_KEY, False),
+}
+
+
+async def migrate_legacy():
+    redis_pool = get_redis_pool()
+    valid, invalid = [], []
+    for value in dict.fromkeys(await redis_pool.lrange(LEGACY_ALLOW_KEY, 0, -1)):
+        try:
+            parse_network(value)
+            valid.append(value)
+        except ValueError:
+            invalid.append(value)
+
+    if valid:
+        await change_policy(ALLOW_KEY, add=valid)
+    print(f"{len(valid)} rules moved from {LEGACY_ALLOW_KEY} to {ALLOW_KEY}")
+    if invalid:
+        # kept, so nothing is lost; running it again after fixing them is safe
+        raise SystemExit(f"{LEGACY_ALLOW_KEY} was kept, these aren't ips / cidrs: {invalid}")
+    await redis_pool.delete(LEGACY_ALLOW_KEY)
+
+
+async def run(command: str, values: list):
+    if command == "migrate-legacy":
+        await migrate_legacy()
+    elif command != "show":
+        key, adds = CHANGES[command]
+        if not values:
+            raise SystemExit(f"{command} needs at least one value")
+        await change_policy(key, add=values if adds else (), remove=() if adds else values)
+
+    policy = AccessPolicy()
+    await policy.load()
+    print(json.dumps(policy.status(), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["show", "migrate-legacy", *CHANGES])
+    parser.add_argument("values", nargs="*", help="ips / cidrs, or origins for cors-*")
+    args = parser.parse_args()
+
+    async def run_and_close():
+        try:
+            await run(args.command, args.values)
+        finally:
+            await close_redis_pool()
+
+    asyncio.run(run_and_close())
+
+
+if __name__ == "__main__":
+    main()
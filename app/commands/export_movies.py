@@ -0,0 +1,44 @@
+# Export the catalog as NDJSON, one movie with its credits per line.
+#
+#   python -m app.commands.export_movies [--output movies.ndjson.gz --gzip] [--updated-since 2024-01-01]
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from app.db.base import engine
+from app.controllers.export import export_movies_ndjson
+
+
+async def export(output: str, compress: bool, updated_since: datetime):
+    file = open(output, "wb") if output else sys.stdout.buffer
+    written = 0
+    try:
+        async for chunk in export_movies_ndjson(updated_since, compress):
+            file.write(chunk)
+            written += len(chunk)
+    finally:
+        if output:
+            file.close()
+    print(f"{written} bytes written", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="file to write, default stdout")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--updated-since", type=datetime.fromisoformat,
+                        help="only movies updated at or after this time (ISO 8601)")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await export(args.output, args.gzip, args.updated_since)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
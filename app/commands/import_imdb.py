@@ -0,0 +1,387 @@
+# Bulk import of IMDb dataset dumps (https://datasets.imdbws.com) into the
+# catalog tables, for an empty catalog.
+#
+#   python -m app.commands.import_imdb --dir ./imdb
+#
+# Reads title.basics, title.crew, title.principals and name.basics
+# (.tsv.gz). Ids are derived from the input (tt0000042 -> movie 42,
+# nm0000042 -> cast/writer 42, credits numbered in file order), so an
+# interrupted import resumes by skipping the rows it already committed; the
+# count is kept in the import_imdb_progress table, committed with each
+# batch. Secondary indexes are dropped during the load and rebuilt at the
+# end.
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+import asyncpg
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, DropIndex
+from app.db.base import Base, SQLALCHEMY_DATABASE_URL
+from app.controllers.rating import DEFAULT_MOVIE_RATE
+import app.models  # noqa: F401, registers the tables on Base.metadata
+
+
+FILES = {
+    "titles": "title.basics.tsv.gz",
+    "crew": "title.crew.tsv.gz",
+    "principals": "title.principals.tsv.gz",
+    "names": "name.basics.tsv.gz",
+}
+NULL = "\\N"
+TITLE_TYPES = ("movie", "tvMovie")
+CAST_CATEGORIES = {"actor", "actress", "self"}
+# principals billed up to this position are stars
+STAR_BILLING = 3
+BATCH_SIZE = 50000
+# one row, the Checkpoint state; dropped once the import is done
+PROGRESS_TABLE = "import_imdb_progress"
+
+TABLE_COLUMNS = {
+    "genres": ["id", "title", "description", "createdAt", "updatedAt"],
+    "casts": ["id", "fullname", "profilePic", "summary", "dob", "gender", "createdAt", "updatedAt"],
+    "writers": ["id", "fullname", "profilePic", "summary", "dob", "gender", "createdAt", "updatedAt"],
+    "movies": ["id", "name", "rate", "rateSum", "rateCount", "duration", "releaseYear", "cover",
+               "countries", "languages", "director", "summary", "storyline", "budget",
+               "createdAt", "updatedAt"],
+    "movie_genres": ["id", "genreId", "movieId", "createdAt", "updatedAt"],
+    "movie_casts": ["id", "castId", "movieId", "isStar", "createdAt", "updatedAt"],
+    "movie_writers": ["id", "writerId", "movieId", "createdAt", "updatedAt"],
+}
+
+
+# input stages
+def read_tsv(path: str):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as file:
+        header = file.readline().rstrip("\n").split("\t")
+        for line in file:
+            values = line.rstrip("\n").split("\t")
+            yield dict(zip(header, (None if value == NULL else value for value in values)))
+
+
+def imdb_id(value: str):
+    return int(value[2:])
+
+
+def split_list(value: str):
+    return value.split(",") if value else []
+
+
+def title_rows(path: str, title_types):
+    for row in read_tsv(path):
+        if row["titleType"] in title_types and row["startYear"]:
+            yield row
+
+
+def person_gender(professions: str):
+    professions = split_list(professions)
+    if "actress" in professions:
+        return "FEMALE"
+    if "actor" in professions:
+        return "MALE"
+    return "NOT_SPECIFIED"
+
+
+# scans: the id maps the record stages filter and join with
+def scan_titles(path: str, title_types):
+    movie_ids, genres = set(), set()
+    for row in title_rows(path, title_types):
+        movie_ids.add(imdb_id(row["tconst"]))
+        genres.update(split_list(row["genres"]))
+    return movie_ids, {title: genre_id for genre_id, title in enumerate(sorted(genres), 1)}
+
+
+def scan_crew(path: str, movie_ids: set):
+    directors, writer_ids = {}, set()
+    for row in read_tsv(path):
+        movie_id = imdb_id(row["tconst"])
+        if movie_id not in movie_ids:
+            continue
+        director_ids = split_list(row["directors"])
+        if director_ids:
+            directors[movie_id] = imdb_id(director_ids[0])
+        writer_ids.update(imdb_id(writer_id) for writer_id in split_list(row["writers"]))
+    return directors, writer_ids
+
+
+def scan_principals(path: str, movie_ids: set):
+    cast_ids = set()
+    for row in read_tsv(path):
+        if row["category"] in CAST_CATEGORIES and imdb_id(row["tconst"]) in movie_ids:
+            cast_ids.add(imdb_id(row["nconst"]))
+    return cast_ids
+
+
+def scan_names(path: str, person_ids: set, director_ids: set):
+    # credits can name people missing from name.basics, keep only known ones
+    known_ids, director_names = set(), {}
+    for row in read_tsv(path):
+        person_id = imdb_id(row["nconst"])
+        if person_id in person_ids:
+            known_ids.add(person_id)
+        if person_id in director_ids:
+            director_names[person_id] = row["primaryName"]
+    return known_ids, director_names
+
+
+# record stages: (table, record) in a deterministic order
+def genre_records(genre_ids: dict, now: datetime):
+    for title, genre_id in genre_ids.items():
+        yield "genres", (genre_id, title, None, now, now)
+
+
+def people_records(path: str, cast_ids: set, writer_ids: set, now: datetime):
+    for row in read_tsv(path):
+        person_id = imdb_id(row["nconst"])
+        if person_id not in cast_ids and person_id not in writer_ids:
+            continue
+        record = (person_id, row["primaryName"], None, "", None,
+                  person_gender(row["primaryProfession"]), now, now)
+        if person_id in cast_ids:
+            yield "casts", record
+        if person_id in writer_ids:
+            yield "writers", record
+
+
+def movie_records(path: str, title_types, directors: dict, director_names: dict, now: datetime):
+    for row in title_rows(path, title_types):
+        movie_id = imdb_id(row["tconst"])
+        director = director_names.get(directors.get(movie_id), "")
+        yield "movies", (movie_id, row["primaryTitle"], DEFAULT_MOVIE_RATE, 0, 0,
+                         float(row["runtimeMinutes"] or 0), int(row["startYear"]), "",
+                         [], [], director, "", "", 0.0, now, now)
+
+
+def movie_genre_records(path: str, title_types, genre_ids: dict, now: datetime):
+    credit_id = itertools.count(1)
+    for row in title_rows(path, title_types):
+        movie_id = imdb_id(row["tconst"])
+        for genre in split_list(row["genres"]):
+            yield "movie_genres", (next(credit_id), genre_ids[genre], movie_id, now, now)
+
+
+def movie_cast_records(path: str, movie_ids: set, cast_ids: set, now: datetime):
+    credit_id = itertools.count(1)
+    for row in read_tsv(path):
+        movie_id = imdb_id(row["tconst"])
+        if row["category"] not in CAST_CATEGORIES or movie_id not in movie_ids:
+            continue
+        cast_id = imdb_id(row["nconst"])
+        if cast_id in cast_ids:
+            is_star = int(row["ordering"]) <= STAR_BILLING
+            yield "movie_casts", (next(credit_id), cast_id, movie_id, is_star, now, now)
+
+
+def movie_writer_records(path: str, movie_ids: set, writer_ids: set, now: datetime):
+    credit_id = itertools.count(1)
+    for row in read_tsv(path):
+        movie_id = imdb_id(row["tconst"])
+        if movie_id not in movie_ids:
+            continue
+        for writer_id in dict.fromkeys(imdb_id(value) for value in split_list(row["writers"])):
+            if writer_id in writer_ids:
+                yield "movie_writers", (next(credit_id), writer_id, movie_id, now, now)
+
+
+class Checkpoint:
+    # {"inputs": {file: [size, mtime]}, "createdAt": ..., "rows": {stage: n}, "complete": [stage]}
+    # Saved in the database, in the transaction of the batch it counts, so
+    # the rows and the count commit (or are lost) together
+    def __init__(self, conn, inputs: dict):
+        self.conn = conn
+        self.state = {"inputs": inputs, "createdAt": datetime.utcnow().isoformat(),
+                      "rows": {}, "complete": []}
+
+    async def load(self):
+        if await self.conn.fetchval("SELECT to_regclass($1)", PROGRESS_TABLE) is None:
+            return
+        state = await self.conn.fetchval(f"SELECT state FROM {PROGRESS_TABLE} WHERE id = 1")
+        if state is None:
+            return
+        state = json.loads(state)
+        if state["inputs"] != self.state["inputs"]:
+            raise SystemExit(f"The import in {PROGRESS_TABLE} was started from other input files; "
+                             f"empty the catalog and drop {PROGRESS_TABLE} to start over")
+        self.state = state
+
+    @property
+    def resumed(self):
+        return bool(self.state["rows"])
+
+    @property
+    def created_at(self):
+        # every row of one import shares its timestamps, also across resumes
+        return datetime.fromisoformat(self.state["createdAt"])
+
+    def rows(self, stage: str):
+        return self.state["rows"].get(stage, 0)
+
+    def is_complete(self, stage: str):
+        return stage in self.state["complete"]
+
+    async def advance(self, stage: str, rows: int):
+        # in the transaction of the batch
+        self.state["rows"][stage] = self.rows(stage) + rows
+        await self.save()
+
+    async def complete(self, stage: str):
+        self.state["complete"].append(stage)
+        await self.save()
+
+    async def save(self):
+        await self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (id INTEGER PRIMARY KEY, state TEXT NOT NULL)")
+        await self.conn.execute(
+            f"INSERT INTO {PROGRESS_TABLE} (id, state) VALUES (1, $1) "
+            f"ON CONFLICT (id) DO UPDATE SET state = excluded.state", json.dumps(self.state))
+
+    async def drop(self):
+        await self.conn.execute(f"DROP TABLE IF EXISTS {PROGRESS_TABLE}")
+
+
+def take(records, size: int):
+    return list(itertools.islice(records, size))
+
+
+async def copy_stage(conn, checkpoint: Checkpoint, stage: str, records, batch_size: int):
+    if checkpoint.is_complete(stage):
+        print(f"{stage}: already imported, skipping")
+        return
+
+    skipped = checkpoint.rows(stage)
+    records = itertools.islice(records, skipped, None)
+    started_at = time.perf_counter()
+    copied = 0
+
+    # parse the next batch in a thread while the current one is copied
+    pending = asyncio.ensure_future(asyncio.to_thread(take, records, batch_size))
+    while True:
+        batch = await pending
+        if not batch:
+            break
+        pending = asyncio.ensure_future(asyncio.to_thread(take, records, batch_size))
+
+        by_table = defaultdict(list)
+        for table, record in batch:
+            by_table[table].append(record)
+        async with conn.transaction():
+            for table, table_records in by_table.items():
+                await conn.copy_records_to_table(
+                    table, records=table_records, columns=TABLE_COLUMNS[table])
+            await checkpoint.advance(stage, len(batch))
+
+        copied += len(batch)
+        elapsed = time.perf_counter() - started_at
+        print(f"{stage}: {skipped + copied} rows, {copied / elapsed:.0f} rows/s")
+
+    await checkpoint.complete(stage)
+    elapsed = time.perf_counter() - started_at
+    print(f"{stage}: done, {copied} rows in {elapsed:.1f}s ({copied / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+def secondary_indexes():
+    return [index for table in TABLE_COLUMNS for index in Base.metadata.tables[table].indexes]
+
+
+def compile_ddl(element):
+    return str(element.compile(dialect=postgresql.dialect()))
+
+
+async def drop_indexes(conn):
+    for index in secondary_indexes():
+        await conn.execute(compile_ddl(DropIndex(index, if_exists=True)))
+
+
+async def create_indexes(conn):
+    for index in secondary_indexes():
+        started_at = time.perf_counter()
+        await conn.execute(compile_ddl(CreateIndex(index, if_not_exists=True)))
+        print(f"index {index.name}: built in {time.perf_counter() - started_at:.1f}s")
+
+
+async def reset_sequences(conn):
+    for table in TABLE_COLUMNS:
+        await conn.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)")
+
+
+async def run(directory: str, title_types, batch_size: int, maintenance_work_mem: str):
+    paths = {name: os.path.join(directory, file_name) for name, file_name in FILES.items()}
+    inputs = {path: [os.path.getsize(path), int(os.path.getmtime(path))] for path in paths.values()}
+
+    dsn = make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    conn = await asyncpg.connect(dsn)
+    try:
+        checkpoint = Checkpoint(conn, inputs)
+        await checkpoint.load()
+        now = checkpoint.created_at
+        if not checkpoint.resumed and await conn.fetchval("SELECT EXISTS (SELECT 1 FROM movies)"):
+            print("movies is not empty, the importer only loads an empty catalog")
+            return 1
+        await checkpoint.save()
+
+        # a crash loses at most the last batches and their counts, which are redone
+        await conn.execute("SET synchronous_commit TO off")
+        await conn.execute(f"SET maintenance_work_mem TO '{maintenance_work_mem}'")
+        await drop_indexes(conn)
+
+        print("scanning inputs")
+        movie_ids, genre_ids = scan_titles(paths["titles"], title_types)
+        directors, writer_ids = scan_crew(paths["crew"], movie_ids)
+        cast_ids = scan_principals(paths["principals"], movie_ids)
+        known_ids, director_names = scan_names(
+            paths["names"], cast_ids | writer_ids, set(directors.values()))
+        cast_ids &= known_ids
+        writer_ids &= known_ids
+        print(f"{len(movie_ids)} movies, {len(genre_ids)} genres, "
+              f"{len(cast_ids)} cast, {len(writer_ids)} writers")
+
+        stages = [
+            ("genres", genre_records(genre_ids, now)),
+            ("people", people_records(paths["names"], cast_ids, writer_ids, now)),
+            ("movies", movie_records(paths["titles"], title_types, directors, director_names, now)),
+            ("movie_genres", movie_genre_records(paths["titles"], title_types, genre_ids, now)),
+            ("movie_casts", movie_cast_records(paths["principals"], movie_ids, cast_ids, now)),
+            ("movie_writers", movie_writer_records(paths["crew"], movie_ids, writer_ids, now)),
+        ]
+        for stage, records in stages:
+            await copy_stage(conn, checkpoint, stage, records, batch_size)
+
+        await create_indexes(conn)
+        await reset_sequences(conn)
+        for table in TABLE_COLUMNS:
+            await conn.execute(f"ANALYZE {table}")
+        await checkpoint.drop()
+    finally:
+        await conn.close()
+
+    print("done; rebuild the derived data: python -m app.commands.leaderboards rebuild")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", required=True, help="directory of the IMDb .tsv.gz files")
+    parser.add_argument("--title-type", action="append", dest="title_types",
+                        help=f"titleType to import, default: {', '.join(TITLE_TYPES)}")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--maintenance-work-mem", default="512MB",
+                        help="postgres memory for the index rebuilds")
+    args = parser.parse_args()
+
+    raise SystemExit(asyncio.run(run(
+        args.dir, tuple(args.title_types or TITLE_TYPES),
+        args.batch_size, args.maintenance_work_mem)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Rebuild or check the redis leaderboards against postgres.
+#
+#   python -m app.commands.leaderboards rebuild
+#   python -m app.commands.leaderboards check [--fix]
+
+import argparse
+import asyncio
+import json
+from app.db.base import SessionLocal, engine
+from app.db.redis import close_redis_pool
+from app.controllers.leaderboard import LeaderboardController
+
+
+async def run(command: str, fix: bool):
+    async with SessionLocal() as db:
+        leaderboard_controller = LeaderboardController(db)
+        if command == "rebuild":
+            result = await leaderboard_controller.rebuild()
+            print(json.dumps(result))
+            return 0
+
+        result = await leaderboard_controller.check(fix=fix)
+        print(json.dumps(result, indent=2))
+        inconsistent = bool(result["scores"] or result["sizes"])
+        return 1 if inconsistent and not fix else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--fix", action="store_true", help="repair what check finds")
+    args = parser.parse_args()
+
+    async def run_and_close():
+        try:
+            return await run(args.command, args.fix)
+        finally:
+            await close_redis_pool()
+            await engine.dispose()
+
+    raise SystemExit(asyncio.run(run_and_close()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Detect (and optionally repair) drift between Movie.rateSum/rateCount and
+# the reviews they summarize.
+#
+#   python -m app.commands.reconcile_ratings [--fix] [--movie-id 1 --movie-id 2]
+
+import argparse
+import asyncio
+from app.db.base import SessionLocal, engine
+from app.db.redis import close_redis_pool
+from app.controllers.rating import RatingEngine
+from app.controllers.leaderboard import update_leaderboards
+from app.controllers.response_cache import pending_invalidations
+
+
+async def reconcile(fix: bool, movie_ids: list):
+    async with SessionLocal() as db:
+        rating_engine = RatingEngine(db)
+        drifted = await rating_engine.find_drift(movie_ids)
+
+        for movie_id, rate_sum, rate_count, actual_sum, actual_count in drifted:
+            print(f"movie {movie_id}: stored sum={rate_sum} count={rate_count}, "
+                  f"reviews sum={actual_sum} count={actual_count}")
+
+        if fix and drifted:
+            # recompute under row locks so concurrent reviews can't interleave
+            fixed = 0
+            for movie_id, *_ in drifted:
+                await rating_engine.lock_movie(movie_id)
+                rate = None
+                for _, _, _, actual_sum, actual_count in await rating_engine.find_drift([movie_id]):
+                    rate = await rating_engine.reset(movie_id, actual_sum, actual_count)
+                    fixed += 1
+                await db.commit()
+                if rate is not None:
+                    await update_leaderboards(db, movie_id, rate)
+            print(f"fixed {fixed} movies")
+
+        print(f"{len(drifted)} movies drifted")
+        return len(drifted)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fix", action="store_true", help="overwrite stored aggregates")
+    parser.add_argument("--movie-id", type=int, action="append", dest="movie_ids")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            return await reconcile(args.fix, args.movie_ids)
+        finally:
+            # the commits invalidate the cached movie pages in tasks, let them finish
+            await asyncio.gather(*pending_invalidations)
+            await close_redis_pool()
+            await engine.dispose()
+
+    drifted = asyncio.run(run())
+    raise SystemExit(1 if drifted and not args.fix else 0)
+
+
+if __name__ == "__main__":
+    main()
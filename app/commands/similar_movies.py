@@ -0,0 +1,53 @@
+# Build the similar movies index, or refresh the movies whose credits changed.
+#
+#   python -m app.commands.similar_movies rebuild
+#   python -m app.commands.similar_movies refresh [--interval 60]
+#
+# Run one job at a time: both rewrite SIMILAR_MOVIES_MODEL_PATH.
+
+import argparse
+import asyncio
+import json
+from app.db.base import SessionLocal, engine
+from app.db.redis import close_redis_pool
+from app.controllers.similar_movies import SimilarMoviesController
+
+
+async def run(command: str, interval: float):
+    async with SessionLocal() as db:
+        similar_movies_controller = SimilarMoviesController(db)
+        if command == "rebuild":
+            print(json.dumps(await similar_movies_controller.rebuild()))
+            return
+
+        while True:
+            result = await similar_movies_controller.refresh()
+            print(json.dumps(result))
+            if not interval:
+                return
+            # what's left of a large backlog right away, otherwise wait
+            if not result["movies"]:
+                await asyncio.sleep(interval)
+            # a fresh transaction sees what was committed meanwhile
+            await db.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["rebuild", "refresh"])
+    parser.add_argument("--interval", type=float, default=0,
+                        help="keep refreshing, checking for changes every this many seconds")
+    args = parser.parse_args()
+
+    async def run_and_close():
+        try:
+            await run(args.command, args.interval)
+        finally:
+            await close_redis_pool()
+            await engine.dispose()
+
+    asyncio.run(run_and_close())
+
+
+if __name__ == "__main__":
+    main()
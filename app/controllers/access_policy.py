@@ -0,0 +1,238 @@
+import os
+import time
+import asyncio
+import logging
+import ipaddress
+from app.db.redis import get_redis_pool
+
+
+# seconds between version checks; pub/sub makes changes visible sooner,
+# polling catches what a dropped subscription missed
+ACCESS_POLICY_POLL_INTERVAL = float(os.environ.get("ACCESS_POLICY_POLL_INTERVAL", 30))
+# origins allowed whatever redis holds, comma separated
+CORS_ORIGINS = [origin.strip() for origin in
+                os.environ.get("CORS_ORIGINS", "http://localhost:3000").split(",") if origin.strip()]
+
+# access_policy:allow         set of ips / cidrs; when not empty, only these get in
+# access_policy:block         set of ips / cidrs turned away
+# access_policy:cors_origins  set of origins
+# access_policy:version       bumped by every change
+ALLOW_KEY = "access_policy:allow"
+BLOCK_KEY = "access_policy:block"
+CORS_ORIGINS_KEY = "access_policy:cors_origins"
+VERSION_KEY = "access_policy:version"
+CHANGED_CHANNEL = "access_policy:changed"
+
+ALLOW = "allow"
+BLOCK = "block"
+
+
+def stronger(rule, other):
+    # (prefix length, action): the longer prefix wins, block on a tie
+    if other is None:
+        return rule
+    if rule[0] != other[0]:
+        return rule if rule[0] > other[0] else other
+    return rule if rule[1] == BLOCK else other
+
+
+class TrieNode:
+    __slots__ = ("children", "partial", "rule")
+
+    def __init__(self):
+        # next byte -> node
+        self.children = {}
+        # rules whose prefix ends inside the next byte, expanded to every
+        # byte value they cover: byte -> (prefix length, action)
+        self.partial = {}
+        # rule whose prefix ends at this node's byte boundary
+        self.rule = None
+
+
+class PrefixTrie:
+    # longest-prefix match over 8-bit strides: a lookup walks one dict per
+    # address byte (4 for IPv4, at most 16 for IPv6)
+    def __init__(self):
+        self.root = TrieNode()
+        self.size = 0
+
+    def insert(self, network, action: str):
+        packed = network.network_address.packed
+        full_bytes, rest_bits = divmod(network.prefixlen, 8)
+        rule = (network.prefixlen, action)
+
+        node = self.root
+        for byte in packed[:full_bytes]:
+            node = node.children.setdefault(byte, TrieNode())
+        if not rest_bits:
+            node.rule = stronger(rule, node.rule)
+        else:
+            first = packed[full_bytes]
+            for byte in range(first, first + (1 << (8 - rest_bits))):
+                node.partial[byte] = stronger(rule, node.partial.get(byte))
+        self.size += 1
+
+    def lookup(self, packed: bytes):
+        node = self.root
+        best = node.rule
+        for byte in packed:
+            # deeper matches are longer prefixes, the last one found wins
+            best = node.partial.get(byte, best)
+            node = node.children.get(byte)
+            if node is None:
+                break
+            if node.rule is not None:
+                best = node.rule
+        return best[1] if best else None
+
+
+def parse_network(value: str):
+    network = ipaddress.ip_network(value.strip(), strict=False)
+    if network.version == 6 and network.network_address.ipv4_mapped and network.prefixlen >= 96:
+        network = ipaddress.ip_network(
+            f"{network.network_address.ipv4_mapped}/{network.prefixlen - 96}", strict=False)
+    return network
+
+
+def parse_address(value: str):
+    address = ipaddress.ip_address(value)
+    if address.version == 6 and address.ipv4_mapped:
+        # ::ffff:1.2.3.4 from dual-stack sockets matches IPv4 rules
+        address = address.ipv4_mapped
+    return address
+
+
+class PolicySnapshot:
+    # immutable once built; a reload swaps in a new one
+    def __init__(self, allow=(), block=(), cors_origins=(), version=None):
+        self.tries = {4: PrefixTrie(), 6: PrefixTrie()}
+        self.has_allow_rules = False
+        self.invalid = []
+        for action, values in ((ALLOW, allow), (BLOCK, block)):
+            for value in values:
+                try:
+                    network = parse_network(value)
+                except ValueError:
+                    self.invalid.append(value)
+                    continue
+                self.tries[network.version].insert(network, action)
+                self.has_allow_rules = self.has_allow_rules or action == ALLOW
+        self.cors_origins = frozenset(cors_origins)
+        self.version = version
+
+    def is_allowed(self, client_ip: str):
+        try:
+            address = parse_address(client_ip)
+        except ValueError:
+            # not an ip (e.g. a unix socket peer), nothing to match
+            return not self.has_allow_rules
+        action = self.tries[address.version].lookup(address.packed)
+        if action is None:
+            return not self.has_allow_rules
+        return action == ALLOW
+
+
+class AccessPolicy:
+    # ip allow / block rules and cors origins, kept in memory: checks cost a
+    # trie lookup and no network hop, redis is read only when they change
+    def __init__(self, poll_interval: float = ACCESS_POLICY_POLL_INTERVAL, cors_origins=CORS_ORIGINS):
+        self.poll_interval = poll_interval
+        self.static_cors_origins = frozenset(cors_origins)
+        self.snapshot = PolicySnapshot()
+        self.loaded_at = None
+        self.tasks = []
+
+    def is_allowed(self, client_ip: str):
+        return self.snapshot.is_allowed(client_ip)
+
+    def is_allowed_origin(self, origin: str):
+        return origin in self.static_cors_origins or origin in self.snapshot.cors_origins
+
+    async def load(self):
+        pipe = get_redis_pool().pipeline(transaction=True)
+        pipe.get(VERSION_KEY)
+        pipe.smembers(ALLOW_KEY)
+        pipe.smembers(BLOCK_KEY)
+        pipe.smembers(CORS_ORIGINS_KEY)
+        version, allow, block, cors_origins = await pipe.execute()
+
+        snapshot = PolicySnapshot(allow, block, cors_origins, version)
+        if snapshot.invalid:
+            logging.error(f"Access policy skipped invalid rules: {snapshot.invalid}")
+        self.snapshot = snapshot
+        self.loaded_at = time.time()
+
+    async def reload_if_changed(self):
+        version = await get_redis_pool().get(VERSION_KEY)
+        if version != self.snapshot.version:
+            await self.load()
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                # keep enforcing the last policy we loaded
+                logging.error(f"Access policy could not be refreshed: {e!r}")
+
+    async def listen(self):
+        while True:
+            pubsub = get_redis_pool().pubsub()
+            try:
+                await pubsub.subscribe(CHANGED_CHANNEL)
+                # changes made while we weren't subscribed
+                await self.reload_if_changed()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await self.reload_if_changed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Access policy subscription failed, polling until it's back: {e!r}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                await pubsub.reset()
+
+    async def start(self):
+        try:
+            await self.load()
+        except Exception as e:
+            # no rules yet: everyone gets in, the static origins apply
+            logging.error(f"Access policy could not be loaded: {e!r}")
+        self.tasks = [asyncio.create_task(self.poll()), asyncio.create_task(self.listen())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "loadedAt": self.loaded_at,
+            "ipv4Rules": snapshot.tries[4].size,
+            "ipv6Rules": snapshot.tries[6].size,
+            "allowListActive": snapshot.has_allow_rules,
+            "invalidRules": snapshot.invalid,
+            "corsOrigins": sorted(self.static_cors_origins | snapshot.cors_origins),
+        }
+
+
+async def change_policy(key: str, add=(), remove=()):
+    # validates rules, writes them, and tells every worker in one round trip
+    if key in (ALLOW_KEY, BLOCK_KEY):
+        for value in add:
+            parse_network(value)
+    pipe = get_redis_pool().pipeline(transaction=True)
+    if add:
+        pipe.sadd(key, *add)
+    if remove:
+        pipe.srem(key, *remove)
+    pipe.incr(VERSION_KEY)
+    pipe.publish(CHANGED_CHANNEL, key)
+    await pipe.execute()
+
+
+access_policy = AccessPolicy()
@@ -0,0 +1,62 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Cast, Movie, MovieCast
+from app.schemas import ICastDetail, ICastMovie, ICastPath, ICastPathCast, ICastPathMovie
+from app.controllers.cast_graph import collaboration_graph, CAST_GRAPH_MAX_DEGREES
+from app.utils.error_handler import ErrorHandler
+
+
+class CastController:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, id: int):
+        cast = (await self.db.execute(select(Cast).where(Cast.id == id))).scalar_one_or_none()
+        if not cast:
+            raise ErrorHandler.not_found("Cast")
+
+        movies = await self.db.execute(
+            select(Movie.id, Movie.name, Movie.releaseYear, Movie.cover, MovieCast.isStar)
+            .join(MovieCast, MovieCast.movieId == Movie.id)
+            .where(MovieCast.castId == id)
+            .order_by(Movie.releaseYear.desc(), Movie.id.desc()))
+
+        return ICastDetail(
+            id=cast.id,
+            fullname=cast.fullname,
+            profilePic=cast.profilePic,
+            summary=cast.summary,
+            dob=cast.dob,
+            gender=cast.gender,
+            movies=[ICastMovie(id=movie_id, name=name, releaseYear=release_year,
+                               cover=cover, isStar=is_star)
+                    for movie_id, name, release_year, cover, is_star in movies],
+            createdAt=cast.createdAt,
+            updatedAt=cast.updatedAt)
+
+    async def get_path(self, source_id: int, target_id: int, max_degrees: int = CAST_GRAPH_MAX_DEGREES):
+        # the chain comes from the in-memory graph, names from two primary key lookups
+        path = collaboration_graph.shortest_path(source_id, target_id, max_degrees)
+        cast_ids = [source_id, target_id] if path is None else path[0::2]
+        movie_ids = [] if path is None else path[1::2]
+
+        casts = {cast.id: cast for cast in (await self.db.execute(
+            select(Cast.id, Cast.fullname, Cast.profilePic).where(Cast.id.in_(cast_ids))))}
+        if source_id not in casts or target_id not in casts:
+            raise ErrorHandler.not_found("Cast")
+        if path is None:
+            raise ErrorHandler.not_found("Path")
+        movies = {movie.id: movie for movie in (await self.db.execute(
+            select(Movie.id, Movie.name, Movie.releaseYear, Movie.cover).where(Movie.id.in_(movie_ids))))}
+        if len(casts) < len(set(cast_ids)) or len(movies) < len(set(movie_ids)):
+            # deleted since this worker's graph last heard of it
+            raise ErrorHandler.not_found("Path")
+
+        return ICastPath(
+            degrees=len(movie_ids),
+            casts=[ICastPathCast(id=cast_id, fullname=casts[cast_id].fullname,
+                                 profilePic=casts[cast_id].profilePic)
+                   for cast_id in cast_ids],
+            movies=[ICastPathMovie(id=movie_id, name=movies[movie_id].name,
+                                   releaseYear=movies[movie_id].releaseYear, cover=movies[movie_id].cover)
+                    for movie_id in movie_ids])
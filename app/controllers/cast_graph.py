@@ -0,0 +1,220 @@
+import os
+import time
+import array
+import asyncio
+import logging
+import numpy as np
+from sqlalchemy import select, inspect, event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import SessionLocal
+from app.db.redis import get_redis_pool
+from app.db.routing import use_primary
+from app.models import MovieCast
+from app.utils.cast_graph import CastGraph
+from app.utils.error_handler import ErrorHandler
+
+
+CAST_GRAPH_ENABLED = os.environ.get("CAST_GRAPH_ENABLED", "true").lower() == "true"
+# full reload from postgres; catches anything the deltas missed
+CAST_GRAPH_REBUILD_INTERVAL = float(os.environ.get("CAST_GRAPH_REBUILD_INTERVAL", 3600))
+# seconds between reads of the credit changes other workers published
+CAST_GRAPH_DELTA_INTERVAL = float(os.environ.get("CAST_GRAPH_DELTA_INTERVAL", 5))
+# longest chain /path looks for, in movies
+CAST_GRAPH_MAX_DEGREES = 6
+
+# cast_graph:deltas   stream of committed credit changes {op: add | remove, castId, movieId}
+DELTAS_KEY = "cast_graph:deltas"
+# trimmed past this; a worker further behind reloads instead
+DELTAS_MAX_LENGTH = 100000
+DELTAS_BATCH_SIZE = 10000
+# id to read a stream from its start
+STREAM_START = "0-0"
+
+
+def stream_id(value: str):
+    milliseconds, _, sequence = value.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+async def load_credits(db: AsyncSession):
+    # (cast ids, movie ids), one entry per credit, in two int64 arrays
+    cast_ids, movie_ids = array.array("q"), array.array("q")
+    result = await db.stream(
+        select(MovieCast.castId, MovieCast.movieId).execution_options(yield_per=10000))
+    async for partition in result.partitions():
+        for cast_id, movie_id in partition:
+            cast_ids.append(cast_id)
+            movie_ids.append(movie_id)
+    return np.frombuffer(cast_ids, dtype=np.int64), np.frombuffer(movie_ids, dtype=np.int64)
+
+
+class CollaborationGraph:
+    # the co-starring graph of every worker, in memory: loaded at startup,
+    # kept current from the deltas stream and reloaded every so often
+    def __init__(self, rebuild_interval: float = CAST_GRAPH_REBUILD_INTERVAL,
+                 delta_interval: float = CAST_GRAPH_DELTA_INTERVAL):
+        self.rebuild_interval = rebuild_interval
+        self.delta_interval = delta_interval
+        self.graph = None
+        self.last_delta_id = STREAM_START
+        self.loaded_at = None
+        self.tasks = []
+        # one rebuild / delta batch at a time
+        self.lock = asyncio.Lock()
+
+    async def rebuild(self):
+        async with self.lock:
+            # deltas from here on are applied on top of what postgres returns
+            last = await get_redis_pool().xrevrange(DELTAS_KEY, count=1)
+            last_delta_id = last[0][0] if last else STREAM_START
+            async with SessionLocal() as db:
+                # a replica behind the stream would lose the deltas in between
+                use_primary(db)
+                cast_ids, movie_ids = await load_credits(db)
+            graph = await asyncio.to_thread(CastGraph.from_credits, cast_ids, movie_ids)
+            self.graph, self.last_delta_id = graph, last_delta_id
+            self.loaded_at = time.time()
+        await self.apply_deltas()
+
+    async def apply_deltas(self):
+        if self.graph is None:
+            # still loading
+            return
+        async with self.lock:
+            pipe = get_redis_pool().pipeline(transaction=False)
+            pipe.xrange(DELTAS_KEY, count=1)
+            pipe.xread({DELTAS_KEY: self.last_delta_id}, count=DELTAS_BATCH_SIZE)
+            first, streams = await pipe.execute()
+            missed = (first and self.last_delta_id != STREAM_START
+                      and stream_id(first[0][0]) > stream_id(self.last_delta_id))
+            entries = streams[0][1] if streams else []
+            if not missed and not entries:
+                return
+
+            if not missed:
+                # the last change to a credit wins
+                changes = {}
+                for _, fields in entries:
+                    changes[(int(fields["castId"]), int(fields["movieId"]))] = fields["op"]
+                added = [credit for credit, op in changes.items() if op == "add"]
+                removed = [credit for credit, op in changes.items() if op == "remove"]
+                self.graph = await asyncio.to_thread(self.graph.with_changes, added, removed)
+                self.last_delta_id = entries[-1][0]
+                return
+
+        # trimmed before this worker read them
+        logging.error("Cast graph fell behind the deltas stream, reloading")
+        await self.rebuild()
+
+    async def every(self, interval: float, job):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await job()
+            except Exception as e:
+                # keep answering from the graph we have
+                logging.error(f"Cast graph could not be refreshed: {e!r}")
+
+    async def load(self):
+        while self.graph is None:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logging.error(f"Cast graph could not be loaded, retrying: {e!r}")
+                await asyncio.sleep(self.delta_interval)
+
+    async def start(self):
+        if not CAST_GRAPH_ENABLED:
+            return
+        # loaded in the background, /path answers 503 until then
+        self.tasks = [
+            asyncio.create_task(self.load()),
+            asyncio.create_task(self.every(self.delta_interval, self.apply_deltas)),
+            asyncio.create_task(self.every(self.rebuild_interval, self.rebuild)),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def shortest_path(self, source_id: int, target_id: int, max_degrees: int = CAST_GRAPH_MAX_DEGREES):
+        if self.graph is None:
+            raise ErrorHandler.service_unavailable()
+        return self.graph.shortest_path(source_id, target_id, max_degrees)
+
+    def status(self):
+        graph = self.graph
+        return {
+            "loadedAt": self.loaded_at,
+            "lastDeltaId": self.last_delta_id,
+            "casts": len(graph.cast_ids) if graph else 0,
+            "movies": len(graph.movie_ids) if graph else 0,
+            "credits": graph.credits if graph else 0,
+            "bytes": graph.nbytes if graph else 0,
+        }
+
+
+collaboration_graph = CollaborationGraph()
+
+
+# deltas: published on commit of any session that changed credits
+def credit_changes(instance, created: bool, deleted: bool):
+    if created:
+        return [("add", instance.castId, instance.movieId)]
+    if deleted:
+        return [("remove", instance.castId, instance.movieId)]
+    attributes = inspect(instance).attrs
+    cast_history, movie_history = attributes.castId.history, attributes.movieId.history
+    if not cast_history.has_changes() and not movie_history.has_changes():
+        return []
+    old_cast_id = cast_history.deleted[0] if cast_history.deleted else instance.castId
+    old_movie_id = movie_history.deleted[0] if movie_history.deleted else instance.movieId
+    return [("remove", old_cast_id, old_movie_id), ("add", instance.castId, instance.movieId)]
+
+
+@event.listens_for(Session, "after_flush")
+def collect_credit_changes(session, flush_context):
+    for instances, created, deleted in ((session.new, True, False), (session.dirty, False, False),
+                                        (session.deleted, False, True)):
+        for instance in instances:
+            if isinstance(instance, MovieCast):
+                session.info.setdefault("cast_graph_deltas", []).extend(
+                    credit_changes(instance, created, deleted))
+
+
+# keeps the fire-and-forget tasks referenced until they finish
+pending_deltas = set()
+
+
+async def publish_deltas(deltas):
+    try:
+        pipe = get_redis_pool().pipeline(transaction=False)
+        for op, cast_id, movie_id in deltas:
+            pipe.xadd(DELTAS_KEY, {"op": op, "castId": cast_id, "movieId": movie_id},
+                      maxlen=DELTAS_MAX_LENGTH, approximate=True)
+        await pipe.execute()
+    except Exception as e:
+        # the next rebuild picks them up
+        logging.error(f"Could not publish cast graph changes {deltas}: {e!r}")
+
+
+@event.listens_for(Session, "after_commit")
+def publish_credit_changes(session):
+    deltas = session.info.pop("cast_graph_deltas", None)
+    if not deltas:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logging.error(f"Could not publish cast graph changes {deltas}: no event loop")
+        return
+    task = loop.create_task(publish_deltas(deltas))
+    pending_deltas.add(task)
+    task.add_done_callback(pending_deltas.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_credit_changes(session):
+    session.info.pop("cast_graph_deltas", None)
@@ -0,0 +1,100 @@
+import os
+import zlib
+import orjson
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import SessionLocal
+from app.models import Movie, MovieCast, MovieWriter, MovieGenre, Cast, Writer, Genre
+from app.controllers.rating import weighted_rate
+
+
+# movies fetched from the server-side cursor (and serialized) at a time
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+EXPORT_COLUMNS = (Movie.id, Movie.name, Movie.rate, Movie.rateSum, Movie.rateCount,
+                  Movie.duration, Movie.releaseYear, Movie.cover, Movie.countries,
+                  Movie.languages, Movie.director, Movie.summary, Movie.storyline,
+                  Movie.budget, Movie.createdAt, Movie.updatedAt)
+
+
+def to_ndjson_line(record: dict):
+    return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+
+class MovieExporter:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def credits(self, movie_ids: list):
+        # one query per relation for the whole batch
+        credits = {movie_id: {"cast": [], "writers": [], "genres": []} for movie_id in movie_ids}
+
+        cast = await self.db.execute(
+            select(MovieCast.movieId, Cast.id, Cast.fullname, Cast.profilePic, MovieCast.isStar)
+            .join(Cast, Cast.id == MovieCast.castId)
+            .where(MovieCast.movieId.in_(movie_ids))
+            .order_by(MovieCast.movieId, MovieCast.id))
+        for movie_id, cast_id, fullname, profile_pic, is_star in cast:
+            credits[movie_id]["cast"].append(
+                {"id": cast_id, "fullname": fullname, "profilePic": profile_pic, "isStar": is_star})
+
+        writers = await self.db.execute(
+            select(MovieWriter.movieId, Writer.id, Writer.fullname, Writer.profilePic)
+            .join(Writer, Writer.id == MovieWriter.writerId)
+            .where(MovieWriter.movieId.in_(movie_ids))
+            .order_by(MovieWriter.movieId, MovieWriter.id))
+        for movie_id, writer_id, fullname, profile_pic in writers:
+            credits[movie_id]["writers"].append(
+                {"id": writer_id, "fullname": fullname, "profilePic": profile_pic})
+
+        genres = await self.db.execute(
+            select(MovieGenre.movieId, Genre.id, Genre.title)
+            .join(Genre, Genre.id == MovieGenre.genreId)
+            .where(MovieGenre.movieId.in_(movie_ids))
+            .order_by(MovieGenre.movieId, MovieGenre.id))
+        for movie_id, genre_id, title in genres:
+            credits[movie_id]["genres"].append({"id": genre_id, "title": title})
+
+        return credits
+
+    async def batches(self, updated_since: datetime = None):
+        # rows come from a server-side cursor EXPORT_BATCH_SIZE at a time,
+        # memory doesn't grow with the catalog
+        query = select(*EXPORT_COLUMNS).order_by(Movie.id)
+        if updated_since and updated_since.tzinfo:
+            # updatedAt is naive utc; an offset would fail the query once streaming started
+            updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+        if updated_since:
+            query = query.where(Movie.updatedAt >= updated_since)
+        result = await self.db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        async for rows in result.partitions():
+            credits = await self.credits([row.id for row in rows])
+            yield [
+                {
+                    **row._asdict(),
+                    "weightedRate": weighted_rate(row.rateSum, row.rateCount),
+                    **credits[row.id],
+                }
+                for row in rows
+            ]
+
+    async def ndjson(self, updated_since: datetime = None, compress: bool = False):
+        # one chunk per batch; compressed output is sent as zlib emits it
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        async for records in self.batches(updated_since):
+            chunk = b"".join(to_ndjson_line(record) for record in records)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+
+
+async def export_movies_ndjson(updated_since: datetime = None, compress: bool = False):
+    # owns its session: a streamed body outlives the request's dependencies
+    async with SessionLocal() as db:
+        async for chunk in MovieExporter(db).ndjson(updated_since, compress):
+            yield chunk
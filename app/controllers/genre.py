@@ -0,0 +1,16 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Genre
+from app.schemas import IGenreDetail
+from app.utils.error_handler import ErrorHandler
+
+
+class GenreController:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, id: int):
+        genre = (await self.db.execute(select(Genre).where(Genre.id == id))).scalar_one_or_none()
+        if not genre:
+            raise ErrorHandler.not_found("Genre")
+        return IGenreDetail.model_validate(genre)
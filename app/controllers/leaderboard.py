@@ -0,0 +1,228 @@
+import json
+import logging
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.redis import get_redis_pool
+from app.models import Movie, MovieGenre
+
+
+# sorted sets: movie id -> Movie.rate
+#   leaderboard:all
+#   leaderboard:genre:<genre id>
+#   leaderboard:year:<release year>
+#   leaderboard:country:<country, lower case>
+# hash leaderboard:movies: movie id -> json summary incl. the sets it is in
+# set leaderboard:keys: every sorted set above
+LEADERBOARD_PREFIX = "leaderboard"
+SUMMARIES_KEY = f"{LEADERBOARD_PREFIX}:movies"
+KEYS_KEY = f"{LEADERBOARD_PREFIX}:keys"
+BUILDING_PREFIX = f"{LEADERBOARD_PREFIX}:building"
+
+BATCH_SIZE = 1000
+
+
+def leaderboard_key(kind: str, value=None):
+    if kind == "all":
+        return f"{LEADERBOARD_PREFIX}:all"
+    if kind == "country":
+        value = str(value).lower()
+    return f"{LEADERBOARD_PREFIX}:{kind}:{value}"
+
+
+def movie_keys(release_year: int, countries: list, genre_ids: list):
+    keys = [leaderboard_key("all"), leaderboard_key("year", release_year)]
+    keys += [leaderboard_key("genre", genre_id) for genre_id in genre_ids]
+    keys += [leaderboard_key("country", country) for country in countries or []]
+    return list(dict.fromkeys(keys))
+
+
+def movie_summary(movie_id: int, name: str, cover: str, release_year: int, keys: list):
+    return json.dumps({"id": movie_id, "name": name, "cover": cover,
+                       "releaseYear": release_year, "keys": keys})
+
+
+class LeaderboardController:
+    def __init__(self, db: AsyncSession = None):
+        self.db = db
+        self.redis_pool = get_redis_pool()
+
+    # reads: O(log N + limit), redis only
+    async def top(self, key: str, offset: int = 0, limit: int = 50):
+        members = await self.redis_pool.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        if not members:
+            return []
+
+        summaries = await self.redis_pool.hmget(SUMMARIES_KEY, [movie_id for movie_id, _ in members])
+        items = []
+        for position, ((movie_id, rate), summary) in enumerate(zip(members, summaries)):
+            if not summary:
+                continue
+            summary = json.loads(summary)
+            items.append({
+                "rank": offset + position + 1,
+                "id": summary["id"],
+                "name": summary["name"],
+                "cover": summary["cover"],
+                "releaseYear": summary["releaseYear"],
+                "rate": rate,
+            })
+        return items
+
+    # incremental updates
+    async def load_movie(self, movie_id: int):
+        movie = (await self.db.execute(
+            select(Movie.id, Movie.name, Movie.cover, Movie.releaseYear, Movie.countries, Movie.rate)
+            .where(Movie.id == movie_id))).one_or_none()
+        if not movie:
+            return None, None
+        genre_ids = (await self.db.execute(
+            select(MovieGenre.genreId).where(MovieGenre.movieId == movie_id))).scalars().all()
+        keys = movie_keys(movie.releaseYear, movie.countries, genre_ids)
+        return movie_summary(movie.id, movie.name, movie.cover, movie.releaseYear, keys), keys
+
+    async def index_movie(self, movie_id: int, rate: float = None):
+        # (re)places a movie in every leaderboard it belongs to, e.g. after
+        # its genres, countries or year changed
+        summary, keys = await self.load_movie(movie_id)
+        if not summary:
+            await self.remove_movie(movie_id)
+            return
+        if rate is None:
+            rate = (await self.db.execute(select(Movie.rate).where(Movie.id == movie_id))).scalar_one()
+
+        old_summary = await self.redis_pool.hget(SUMMARIES_KEY, movie_id)
+        old_keys = json.loads(old_summary)["keys"] if old_summary else []
+
+        pipe = self.redis_pool.pipeline(transaction=True)
+        for key in set(old_keys) - set(keys):
+            pipe.zrem(key, movie_id)
+        for key in keys:
+            pipe.zadd(key, {movie_id: rate})
+        pipe.sadd(KEYS_KEY, *keys)
+        pipe.hset(SUMMARIES_KEY, movie_id, summary)
+        await pipe.execute()
+
+    async def movie_rate_changed(self, movie_id: int, rate: float):
+        summary = await self.redis_pool.hget(SUMMARIES_KEY, movie_id)
+        if not summary:
+            # not indexed yet, read its genres/year/countries once
+            await self.index_movie(movie_id, rate)
+            return
+
+        pipe = self.redis_pool.pipeline(transaction=True)
+        for key in json.loads(summary)["keys"]:
+            pipe.zadd(key, {movie_id: rate})
+        await pipe.execute()
+
+    async def remove_movie(self, movie_id: int):
+        summary = await self.redis_pool.hget(SUMMARIES_KEY, movie_id)
+        if not summary:
+            return
+        pipe = self.redis_pool.pipeline(transaction=True)
+        for key in json.loads(summary)["keys"]:
+            pipe.zrem(key, movie_id)
+        pipe.hdel(SUMMARIES_KEY, movie_id)
+        await pipe.execute()
+
+    # full rebuild / consistency check
+    async def load_genres(self):
+        genre_ids = defaultdict(list)
+        result = await self.db.stream(
+            select(MovieGenre.movieId, MovieGenre.genreId).execution_options(yield_per=10000))
+        async for movie_id, genre_id in result:
+            genre_ids[movie_id].append(genre_id)
+        return genre_ids
+
+    async def stream_movies(self):
+        genre_ids = await self.load_genres()
+        result = await self.db.stream(
+            select(Movie.id, Movie.name, Movie.cover, Movie.releaseYear, Movie.countries, Movie.rate)
+            .execution_options(yield_per=BATCH_SIZE))
+        async for movie in result:
+            keys = movie_keys(movie.releaseYear, movie.countries, genre_ids.get(movie.id, []))
+            yield movie, keys
+
+    async def rebuild(self):
+        # build everything under temporary keys, then swap them in at once
+        built_keys = set()
+        pipe = self.redis_pool.pipeline(transaction=False)
+        movies = 0
+        async for movie, keys in self.stream_movies():
+            for key in keys:
+                pipe.zadd(f"{BUILDING_PREFIX}:{key}", {movie.id: movie.rate})
+            pipe.hset(f"{BUILDING_PREFIX}:{SUMMARIES_KEY}", movie.id,
+                      movie_summary(movie.id, movie.name, movie.cover, movie.releaseYear, keys))
+            built_keys.update(keys)
+            movies += 1
+            if movies % BATCH_SIZE == 0:
+                await pipe.execute()
+        await pipe.execute()
+
+        old_keys = await self.redis_pool.smembers(KEYS_KEY)
+        pipe = self.redis_pool.pipeline(transaction=True)
+        for key in set(old_keys) - built_keys:
+            pipe.delete(key)
+        for key in built_keys:
+            pipe.rename(f"{BUILDING_PREFIX}:{key}", key)
+        pipe.delete(SUMMARIES_KEY, KEYS_KEY)
+        if movies:
+            pipe.rename(f"{BUILDING_PREFIX}:{SUMMARIES_KEY}", SUMMARIES_KEY)
+        if built_keys:
+            pipe.sadd(KEYS_KEY, *built_keys)
+        await pipe.execute()
+        return {"movies": movies, "leaderboards": len(built_keys)}
+
+    async def check(self, fix: bool = False):
+        # compares every expected (leaderboard, movie, rate) with redis and
+        # every leaderboard's size with the expected one
+        mismatches = []
+        expected_sizes = defaultdict(int)
+        batch = []
+
+        async def check_batch():
+            pipe = self.redis_pool.pipeline(transaction=False)
+            for key, movie_id, _ in batch:
+                pipe.zscore(key, movie_id)
+            scores = await pipe.execute()
+            for (key, movie_id, rate), score in zip(batch, scores):
+                if score is None or abs(score - rate) > 1e-9:
+                    mismatches.append({"key": key, "movieId": movie_id,
+                                       "expected": rate, "actual": score})
+            batch.clear()
+
+        async for movie, keys in self.stream_movies():
+            for key in keys:
+                expected_sizes[key] += 1
+                batch.append((key, movie.id, movie.rate))
+            if len(batch) >= BATCH_SIZE:
+                await check_batch()
+        await check_batch()
+
+        keys = set(expected_sizes) | set(await self.redis_pool.smembers(KEYS_KEY))
+        pipe = self.redis_pool.pipeline(transaction=False)
+        for key in keys:
+            pipe.zcard(key)
+        sizes = dict(zip(keys, await pipe.execute()))
+        size_mismatches = [{"key": key, "expected": expected_sizes.get(key, 0), "actual": size}
+                           for key, size in sizes.items() if size != expected_sizes.get(key, 0)]
+
+        if fix and (mismatches or size_mismatches):
+            # stray members can only be found by a rebuild
+            if size_mismatches:
+                await self.rebuild()
+            else:
+                pipe = self.redis_pool.pipeline(transaction=False)
+                for mismatch in mismatches:
+                    pipe.zadd(mismatch["key"], {mismatch["movieId"]: mismatch["expected"]})
+                await pipe.execute()
+
+        return {"scores": mismatches, "sizes": size_mismatches}
+
+
+async def update_leaderboards(db: AsyncSession, movie_id: int, rate: float):
+    # leaderboards are derived data; on failure the checker/rebuild repairs them
+    try:
+        await LeaderboardController(db).movie_rate_changed(movie_id, rate)
+    except Exception as e:
+        logging.error(f"Could not update leaderboards for movie {movie_id}: {e!r}")
@@ -0,0 +1,133 @@
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import selectinload, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Movie, MovieCast, MovieWriter, MovieGenre, Cast, Writer, Genre
+from app.schemas import ICastCredit, IWriterCredit, IGenreItem, IMovieListItem, IMovieDetail
+from app.utils.error_handler import ErrorHandler
+from app.controllers.rating import weighted_rate
+
+
+# keyset orderings, always tie-broken by id
+MOVIE_ORDERS = {
+    "latest": Movie.createdAt,
+    "top": Movie.rate,
+}
+
+MOVIE_LIST_COLUMNS = (Movie.id, Movie.name, Movie.rate, Movie.duration,
+                      Movie.releaseYear, Movie.cover, Movie.createdAt)
+
+MAX_PAGE_SIZE = 100
+
+
+class MovieController:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def credits_options(self):
+        # one batched query per relation, whatever the number of movies
+        return [
+            selectinload(Movie.movieCast)
+            .load_only(MovieCast.movieId, MovieCast.castId, MovieCast.isStar)
+            .joinedload(MovieCast.cast)
+            .load_only(Cast.fullname, Cast.profilePic),
+            selectinload(Movie.movieWriter)
+            .load_only(MovieWriter.movieId, MovieWriter.writerId)
+            .joinedload(MovieWriter.writer)
+            .load_only(Writer.fullname, Writer.profilePic),
+            selectinload(Movie.movieGenre)
+            .load_only(MovieGenre.movieId, MovieGenre.genreId)
+            .joinedload(MovieGenre.genre)
+            .load_only(Genre.title),
+        ]
+
+    def credits(self, movie: Movie):
+        return {
+            "cast": [ICastCredit(id=item.cast.id, fullname=item.cast.fullname,
+                                 profilePic=item.cast.profilePic, isStar=item.isStar)
+                     for item in movie.movieCast],
+            "writers": [IWriterCredit(id=item.writer.id, fullname=item.writer.fullname,
+                                      profilePic=item.writer.profilePic)
+                        for item in movie.movieWriter],
+            "genres": [IGenreItem(id=item.genre.id, title=item.genre.title)
+                       for item in movie.movieGenre],
+        }
+
+    def to_list_item(self, movie: Movie):
+        return IMovieListItem(
+            id=movie.id,
+            name=movie.name,
+            rate=movie.rate,
+            duration=movie.duration,
+            releaseYear=movie.releaseYear,
+            cover=movie.cover,
+            **self.credits(movie))
+
+    def to_detail(self, movie: Movie):
+        return IMovieDetail(
+            id=movie.id,
+            name=movie.name,
+            rate=movie.rate,
+            duration=movie.duration,
+            releaseYear=movie.releaseYear,
+            cover=movie.cover,
+            countries=movie.countries,
+            languages=movie.languages,
+            director=movie.director,
+            summary=movie.summary,
+            storyline=movie.storyline,
+            budget=movie.budget,
+            rateCount=movie.rateCount,
+            weightedRate=weighted_rate(movie.rateSum, movie.rateCount),
+            createdAt=movie.createdAt,
+            updatedAt=movie.updatedAt,
+            **self.credits(movie))
+
+    # cursor: urlsafe base64 of [order, sort value, id] of the last movie
+    def encode_cursor(self, order: str, movie: Movie):
+        value = getattr(movie, MOVIE_ORDERS[order].key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([order, value, movie.id]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, order: str, cursor: str):
+        try:
+            cursor_order, value, last_id = json.loads(
+                base64.urlsafe_b64decode(cursor.encode()))
+            if cursor_order != order:
+                raise ValueError(cursor_order)
+            if order == "latest":
+                value = datetime.fromisoformat(value)
+            return value, int(last_id)
+        except Exception:
+            raise ErrorHandler.bad_request("Invalid cursor.")
+
+    async def get_page(self, order: str = "latest", cursor: str = None, limit: int = 20):
+        sort_column = MOVIE_ORDERS[order]
+        limit = min(limit, MAX_PAGE_SIZE)
+
+        query = select(Movie).options(
+            load_only(*MOVIE_LIST_COLUMNS), *self.credits_options())
+        if cursor:
+            value, last_id = self.decode_cursor(order, cursor)
+            query = query.where(tuple_(sort_column, Movie.id) < tuple_(value, last_id))
+        query = query.order_by(sort_column.desc(), Movie.id.desc()).limit(limit + 1)
+
+        movies = (await self.db.execute(query)).scalars().all()
+
+        next_cursor = None
+        if len(movies) > limit:
+            movies = movies[:limit]
+            next_cursor = self.encode_cursor(order, movies[-1])
+
+        return [self.to_list_item(movie) for movie in movies], next_cursor
+
+    async def get_by_id(self, id: int):
+        query = select(Movie).where(Movie.id == id).options(*self.credits_options())
+        movie = (await self.db.execute(query)).scalar_one_or_none()
+        if not movie:
+            raise ErrorHandler.not_found("Movie")
+        return self.to_detail(movie)
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from app.db.redis import get_redis_pool
+from app.models import User, Gender
+
+
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = int(os.environ.get("PRINCIPAL_CACHE_TTL", 30))
+PRINCIPAL_REDIS_TTL = int(os.environ.get("PRINCIPAL_REDIS_TTL", 300))
+
+# hashedPassword never leaves postgres
+USER_SNAPSHOT_FIELDS = ("id", "username", "fullname", "profilePic",
+                        "email", "dob", "gender", "createdAt", "updatedAt")
+
+
+def user_to_snapshot(user: User):
+    snapshot = {}
+    for field in USER_SNAPSHOT_FIELDS:
+        value = getattr(user, field)
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        elif isinstance(value, Gender):
+            value = value.value
+        snapshot[field] = value
+    return json.dumps(snapshot)
+
+
+def snapshot_to_user(snapshot: str):
+    items = json.loads(snapshot)
+    if items["dob"]:
+        items["dob"] = date.fromisoformat(items["dob"])
+    if items["gender"]:
+        items["gender"] = Gender(items["gender"])
+    items["createdAt"] = datetime.fromisoformat(items["createdAt"])
+    items["updatedAt"] = datetime.fromisoformat(items["updatedAt"])
+    # transient instance, not attached to any session
+    return User(**items)
+
+
+class PrincipalCache:
+    # tier 1: in-process LRU keyed by token -> (verified claims, user)
+    # tier 2: redis, serialized user snapshots keyed by user id
+    def __init__(self, size: int = PRINCIPAL_CACHE_SIZE, ttl: int = PRINCIPAL_CACHE_TTL,
+                 redis_ttl: int = PRINCIPAL_REDIS_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.entries = OrderedDict()
+        self.tokens_by_user = {}
+
+    def get_local(self, token: str):
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+
+        expires_at, token_info, user = entry
+        if time.time() >= expires_at:
+            self._drop(token)
+            return None
+
+        self.entries.move_to_end(token)
+        return token_info, user
+
+    def set_local(self, token: str, token_info: dict, user: User):
+        expires_at = time.time() + self.ttl
+        if token_info.get("exp"):
+            # never outlive the token itself
+            expires_at = min(expires_at, token_info["exp"])
+
+        self._drop(token)
+        self.entries[token] = (expires_at, token_info, user)
+        self.tokens_by_user.setdefault(user.id, set()).add(token)
+
+        while len(self.entries) > self.size:
+            oldest_token = next(iter(self.entries))
+            self._drop(oldest_token)
+
+    def _drop(self, token: str):
+        entry = self.entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[2].id
+        tokens = self.tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[user_id]
+
+    async def get_user(self, user_id: int):
+        try:
+            snapshot = await get_redis_pool().get(f"principal:user:{user_id}")
+        except Exception as e:
+            logging.error(f"Principal cache could not read redis: {e!r}")
+            return None
+        if not snapshot:
+            return None
+        return snapshot_to_user(snapshot)
+
+    async def set_user(self, user: User):
+        try:
+            await get_redis_pool().setex(
+                name=f"principal:user:{user.id}",
+                time=self.redis_ttl,
+                value=user_to_snapshot(user))
+        except Exception as e:
+            logging.error(f"Principal cache could not write redis: {e!r}")
+
+    def invalidate_token(self, token: str):
+        self._drop(token)
+
+    async def invalidate_user(self, user_id: int):
+        for token in list(self.tokens_by_user.get(user_id, ())):
+            self._drop(token)
+        try:
+            await get_redis_pool().delete(f"principal:user:{user_id}")
+        except Exception as e:
+            logging.error(f"Principal cache could not invalidate redis: {e!r}")
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from app.db.redis import get_redis_pool
+from app.controllers.principal_cache import principal_cache
+from app.controllers.session import session_store
+from app.dependencies.authentication import token_decoder
+from app.utils.error_handler import ErrorHandler, CustomException
+
+
+RATE_LIMIT_CAPACITY = int(os.environ.get("RATE_LIMIT_CAPACITY", 5))
+RATE_LIMIT_PERIOD = int(os.environ.get("RATE_LIMIT_PERIOD", 60))
+RATE_LIMIT_AUTHENTICATED_CAPACITY = int(
+    os.environ.get("RATE_LIMIT_AUTHENTICATED_CAPACITY", 60))
+RATE_LIMIT_REDIS_TIMEOUT_MS = int(
+    os.environ.get("RATE_LIMIT_REDIS_TIMEOUT_MS", 50))
+RATE_LIMIT_REDIS_COOLDOWN = int(
+    os.environ.get("RATE_LIMIT_REDIS_COOLDOWN", 5))
+RATE_LIMIT_LOCAL_MAX_KEYS = int(
+    os.environ.get("RATE_LIMIT_LOCAL_MAX_KEYS", 10000))
+
+
+# token bucket, evaluated atomically on the redis server in one round trip
+# KEYS[1] = bucket key
+# ARGV = capacity, refill rate (tokens per ms), now (ms), cost
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) / refill)
+end
+
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill))
+return {allowed, math.floor(tokens), retry_after}
+"""
+
+
+class RateLimitPolicy:
+    def __init__(self, name: str, capacity: int, period: int):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        # tokens per millisecond
+        self.refill_rate = capacity / (period * 1000)
+
+
+DEFAULT_POLICY = RateLimitPolicy(
+    "default", RATE_LIMIT_CAPACITY, RATE_LIMIT_PERIOD)
+AUTHENTICATED_POLICY = RateLimitPolicy(
+    "authenticated", RATE_LIMIT_AUTHENTICATED_CAPACITY, RATE_LIMIT_PERIOD)
+
+# (path prefix, anonymous policy, authenticated policy)
+ROUTE_POLICIES = [
+    ("/v1/user/token", RateLimitPolicy("login", 5, 60), RateLimitPolicy("login", 5, 60)),
+    ("/v1/user/register", RateLimitPolicy("register", 3, 60), RateLimitPolicy("register", 3, 60)),
+]
+
+
+class LocalTokenBucket:
+    # in-process fallback, used while redis is slow or down
+    def __init__(self, max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float, cost: int = 1):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            tokens, ts = policy.capacity, now
+        else:
+            tokens, ts = bucket
+            self.buckets.move_to_end(key)
+
+        tokens = min(policy.capacity, tokens +
+                     max(0, now - ts) * policy.refill_rate)
+
+        allowed = tokens >= cost
+        retry_after = 0
+        if allowed:
+            tokens -= cost
+        else:
+            retry_after = int((cost - tokens) / policy.refill_rate) + 1
+
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+        return allowed, int(tokens), retry_after
+
+
+async def verified_user_id(auth_token: str):
+    # user of a token whose signature and expiry check out and that isn't
+    # revoked (see get_token_info), else None
+    _, _, token = auth_token.partition(" ")
+    cached_principal = principal_cache.get_local(token)
+    if cached_principal:
+        token_info, _ = cached_principal
+    else:
+        try:
+            token_info = token_decoder(token)
+        except CustomException:
+            return None
+    if token_info["jti"] and await session_store.is_revoked(token_info["jti"]):
+        return None
+    return token_info["user_id"]
+
+
+class RateLimiter:
+    def __init__(self):
+        self.local_bucket = LocalTokenBucket()
+        self.script = None
+        self.redis_disabled_until = 0
+
+    def get_policy(self, path: str, authenticated: bool):
+        for prefix, anonymous_policy, authenticated_policy in ROUTE_POLICIES:
+            if path.startswith(prefix):
+                return authenticated_policy if authenticated else anonymous_policy
+        return AUTHENTICATED_POLICY if authenticated else DEFAULT_POLICY
+
+    async def get_principal(self, client_ip: str, auth_token: str = None):
+        # (principal, authenticated); an unverified or revoked token counts as
+        # no token, or every made-up / logged out one would get a fresh bucket
+        user_id = await verified_user_id(auth_token) if auth_token else None
+        if user_id is not None:
+            return f"user:{user_id}", True
+        return "ip:" + client_ip, False
+
+    async def hit(self, key: str, policy: RateLimitPolicy, cost: int = 1):
+        now = time.time() * 1000
+
+        if now >= self.redis_disabled_until:
+            try:
+                if self.script is None:
+                    self.script = get_redis_pool().register_script(TOKEN_BUCKET_SCRIPT)
+                allowed, remaining, retry_after = await asyncio.wait_for(
+                    self.script(keys=[key], args=[
+                        policy.capacity, policy.refill_rate, int(now), cost]),
+                    timeout=RATE_LIMIT_REDIS_TIMEOUT_MS / 1000)
+                return bool(allowed), int(remaining), int(retry_after)
+            except Exception as e:
+                # stop asking redis for a while and keep limiting locally
+                self.redis_disabled_until = now + RATE_LIMIT_REDIS_COOLDOWN * 1000
+                logging.error(
+                    f"Rate limiter falls back to local buckets: {e!r}")
+
+        return self.local_bucket.hit(key, policy, now, cost)
+
+    async def check(self, path: str, client_ip: str, auth_token: str = None):
+        principal, authenticated = await self.get_principal(client_ip, auth_token)
+        policy = self.get_policy(path, authenticated=authenticated)
+
+        allowed, _, _ = await self.hit(f"rate:{policy.name}:{principal}", policy)
+        if not allowed:
+            raise ErrorHandler.too_many_request()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,90 @@
+import os
+from sqlalchemy import update, select, func, case, Float, cast
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Movie, Review, ReviewRate
+from app.controllers.response_cache import mark_changed, tag
+
+
+DEFAULT_MOVIE_RATE = 1.0
+# bayesian average: RATING_PRIOR_WEIGHT virtual reviews of RATING_PRIOR_MEAN
+RATING_PRIOR_MEAN = float(os.environ.get("RATING_PRIOR_MEAN", 3.0))
+RATING_PRIOR_WEIGHT = float(os.environ.get("RATING_PRIOR_WEIGHT", 10))
+
+# reviews store the enum name, map it back to its value in sql
+REVIEW_RATE_VALUE = case({rate: rate.value for rate in ReviewRate}, value=Review.rate)
+
+
+def weighted_rate(rate_sum: int, rate_count: int):
+    return (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + rate_sum) / (RATING_PRIOR_WEIGHT + rate_count)
+
+
+class RatingEngine:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def apply(self, movie_id: int, delta_sum: int, delta_count: int):
+        # one row update inside the caller's transaction; the row lock
+        # serializes concurrent reviews of the same movie
+        new_sum = Movie.rateSum + delta_sum
+        new_count = Movie.rateCount + delta_count
+        query = (
+            update(Movie)
+            .where(Movie.id == movie_id)
+            .values(
+                rateSum=new_sum,
+                rateCount=new_count,
+                rate=case((new_count > 0, cast(new_sum, Float) / cast(new_count, Float)),
+                          else_=DEFAULT_MOVIE_RATE))
+            .returning(Movie.rate, Movie.rateSum, Movie.rateCount)
+            .execution_options(synchronize_session=False))
+        return (await self.db.execute(query)).one_or_none()
+
+    async def review_created(self, movie_id: int, rate: ReviewRate):
+        return await self.apply(movie_id, rate.value, 1)
+
+    async def review_updated(self, movie_id: int, old_rate: ReviewRate, new_rate: ReviewRate):
+        return await self.apply(movie_id, new_rate.value - old_rate.value, 0)
+
+    async def review_deleted(self, movie_id: int, rate: ReviewRate):
+        return await self.apply(movie_id, -rate.value, -1)
+
+    async def find_drift(self, movie_ids: list = None):
+        # movies whose running aggregates disagree with their reviews
+        actual = (
+            select(
+                Review.movieId.label("movieId"),
+                func.sum(REVIEW_RATE_VALUE).label("rateSum"),
+                func.count().label("rateCount"))
+            .group_by(Review.movieId)
+            .subquery())
+        actual_sum = func.coalesce(actual.c.rateSum, 0)
+        actual_count = func.coalesce(actual.c.rateCount, 0)
+
+        query = (
+            select(Movie.id, Movie.rateSum, Movie.rateCount, actual_sum, actual_count)
+            .outerjoin(actual, actual.c.movieId == Movie.id)
+            .where((Movie.rateSum != actual_sum) | (Movie.rateCount != actual_count))
+            .order_by(Movie.id))
+        if movie_ids:
+            query = query.where(Movie.id.in_(movie_ids))
+        return (await self.db.execute(query)).all()
+
+    async def lock_movie(self, movie_id: int):
+        # taken before re-reading reviews, so the next statement's snapshot
+        # includes every review that touched this movie before us
+        await self.db.execute(select(Movie.id).where(Movie.id == movie_id).with_for_update())
+
+    async def reset(self, movie_id: int, rate_sum: int, rate_count: int):
+        # returns the new rate; the caller updates the leaderboards after commit
+        query = (
+            update(Movie)
+            .where(Movie.id == movie_id)
+            .values(
+                rateSum=rate_sum,
+                rateCount=rate_count,
+                rate=rate_sum / rate_count if rate_count else DEFAULT_MOVIE_RATE)
+            .returning(Movie.rate)
+            .execution_options(synchronize_session=False))
+        rate = (await self.db.execute(query)).scalar_one_or_none()
+        mark_changed(self.db, tag("movie", movie_id))
+        return rate
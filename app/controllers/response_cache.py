@@ -0,0 +1,297 @@
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import orjson
+from pydantic import BaseModel
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.redis import get_redis_pool
+from app.db.routing import use_primary
+from app.models import Movie, Cast, Writer, Genre, MovieCast, MovieWriter, MovieGenre, Review
+
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+# how long other workers wait for the one rendering a missed key
+RESPONSE_CACHE_LOCK_TIMEOUT = float(os.environ.get("RESPONSE_CACHE_LOCK_TIMEOUT", 5))
+
+# response:<key>               hash {etag, body}
+# response:<key>:lock          set while one worker renders it
+# response_tag:<tag>           set of the response keys built from <tag>
+# response_tag:<tag>:generation  generation <tag> was last invalidated at
+# response_cache:generation    counter bumped by every invalidation
+GENERATION_KEY = "response_cache:generation"
+
+# stores unless one of the tags was invalidated after the render started
+STORE_SCRIPT = """
+local started = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+for i = 2, #KEYS do
+    local invalidated = tonumber(redis.call('GET', 'response_tag:' .. KEYS[i] .. ':generation') or '0')
+    if invalidated > started then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], 'etag', ARGV[3], 'body', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ttl)
+for i = 2, #KEYS do
+    local tag_key = 'response_tag:' .. KEYS[i]
+    redis.call('SADD', tag_key, KEYS[1])
+    redis.call('EXPIRE', tag_key, ttl)
+end
+return 1
+"""
+
+INVALIDATE_SCRIPT = """
+local generation = redis.call('INCR', KEYS[1])
+for i = 2, #KEYS do
+    local tag_key = 'response_tag:' .. KEYS[i]
+    redis.call('SET', tag_key .. ':generation', generation, 'EX', ARGV[1])
+    local keys = redis.call('SMEMBERS', tag_key)
+    for j = 1, #keys do
+        redis.call('DEL', keys[j])
+    end
+    redis.call('DEL', tag_key)
+end
+return generation
+"""
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def tag(kind: str, id: int):
+    return f"{kind}:{id}"
+
+
+def render_body(content):
+    if isinstance(content, BaseModel):
+        # orjson handles the datetimes / enums the python dump leaves
+        content = content.model_dump()
+    else:
+        content = jsonable_encoder(content)
+    return orjson.dumps(content)
+
+
+def content_etag(body: bytes):
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [value.strip() for value in if_none_match.split(",")]
+
+
+class ResponseCache:
+    # read-through cache of rendered JSON bodies with strong ETags
+    def __init__(self, ttl: int = RESPONSE_CACHE_TTL, lock_timeout: float = RESPONSE_CACHE_LOCK_TIMEOUT,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.enabled = enabled
+        self.scripts = None
+        # key -> future of the render in flight in this worker
+        self.inflight = {}
+
+    def get_scripts(self):
+        if self.scripts is None:
+            redis_pool = get_redis_pool()
+            self.scripts = {
+                "store": redis_pool.register_script(STORE_SCRIPT),
+                "invalidate": redis_pool.register_script(INVALIDATE_SCRIPT),
+                "release": redis_pool.register_script(RELEASE_LOCK_SCRIPT),
+            }
+        return self.scripts
+
+    async def respond(self, request: Request, key: str, render, db: AsyncSession):
+        # render() -> (content, tags) reading through db; tags name the rows the body was built from
+        if not self.enabled:
+            content, _ = await render()
+            return self.response(request, render_body(content))
+
+        etag, body = await self.get_or_render(key, render, db)
+        return self.response(request, body, etag)
+
+    def response(self, request: Request, body: bytes, etag: str = None):
+        if etag is None:
+            etag = content_etag(body)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def load(self, key: str):
+        try:
+            pipe = get_redis_pool().pipeline(transaction=False)
+            pipe.hmget(f"response:{key}", ["etag", "body"])
+            pipe.get(GENERATION_KEY)
+            (etag, body), generation = await pipe.execute()
+        except Exception as e:
+            logging.error(f"Response cache could not read redis: {e!r}")
+            return None, None
+        if etag is None or body is None:
+            return None, int(generation or 0)
+        return (etag, body.encode()), None
+
+    async def get_or_render(self, key: str, render, db: AsyncSession):
+        cached, generation = await self.load(key)
+        if cached:
+            return cached
+
+        # single flight: concurrent misses in this worker share one render
+        future = self.inflight.get(key)
+        if future:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            entry = await self.fill(key, render, db, generation)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # the waiters (if any) re-raise it, don't warn when there are none
+            future.exception()
+            raise
+        finally:
+            del self.inflight[key]
+
+    async def fill(self, key: str, render, db: AsyncSession, generation: int):
+        if generation is None:
+            # redis is unreachable, render without caching
+            content, _ = await render()
+            body = render_body(content)
+            return content_etag(body), body
+
+        # single flight across workers: one renders, the others poll for its result
+        lock_key = f"response:{key}:lock"
+        token = uuid.uuid4().hex
+        redis_pool = get_redis_pool()
+        try:
+            locked = await redis_pool.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception:
+            locked = True
+        if not locked:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                cached, _ = await self.load(key)
+                if cached:
+                    return cached
+                try:
+                    if not await redis_pool.exists(lock_key):
+                        # released without storing (error, 404, stale render)
+                        break
+                except Exception:
+                    break
+
+        try:
+            # a lagging replica's body would be served for the whole ttl
+            use_primary(db)
+            content, tags = await render()
+            body = render_body(content)
+            etag = content_etag(body)
+            await self.store(key, etag, body, tags, generation)
+            return etag, body
+        finally:
+            if locked:
+                try:
+                    await self.get_scripts()["release"](keys=[lock_key], args=[token])
+                except Exception as e:
+                    logging.error(f"Response cache could not release lock: {e!r}")
+
+    async def store(self, key: str, etag: str, body: bytes, tags, generation: int):
+        try:
+            await self.get_scripts()["store"](
+                keys=[f"response:{key}", *tags],
+                args=[generation, self.ttl, etag, body.decode()])
+        except Exception as e:
+            logging.error(f"Response cache could not write redis: {e!r}")
+
+    async def invalidate(self, *tags):
+        if not tags or not self.enabled:
+            return
+        try:
+            # tag generations outlive any render that could still store them
+            await self.get_scripts()["invalidate"](
+                keys=[GENERATION_KEY, *tags], args=[self.ttl + int(self.lock_timeout) + 1])
+        except Exception as e:
+            logging.error(f"Response cache could not invalidate {tags}: {e!r}")
+
+
+response_cache = ResponseCache()
+# keeps the fire-and-forget invalidation tasks referenced until they finish
+pending_invalidations = set()
+
+
+# invalidation on commit of any session that changed cached rows
+def instance_tags(instance):
+    if isinstance(instance, Movie):
+        return [tag("movie", instance.id)]
+    if isinstance(instance, Cast):
+        return [tag("cast", instance.id)]
+    if isinstance(instance, Writer):
+        return [tag("writer", instance.id)]
+    if isinstance(instance, Genre):
+        return [tag("genre", instance.id)]
+    if isinstance(instance, MovieCast):
+        return [tag("movie", instance.movieId), tag("cast", instance.castId)]
+    if isinstance(instance, MovieWriter):
+        return [tag("movie", instance.movieId), tag("writer", instance.writerId)]
+    if isinstance(instance, MovieGenre):
+        return [tag("movie", instance.movieId), tag("genre", instance.genreId)]
+    if isinstance(instance, Review):
+        # reviews move the movie's rating aggregates
+        return [tag("movie", instance.movieId)]
+    return []
+
+
+def mark_changed(session: Session, *tags):
+    # for changes made with core statements, which the flush doesn't see
+    session.info.setdefault("response_cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changed_tags(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        tags = instance_tags(instance)
+        if tags:
+            mark_changed(session, *tags)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_tags(session):
+    tags = session.info.pop("response_cache_tags", None)
+    if not tags:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logging.error(f"Response cache could not invalidate {tags}: no event loop")
+        return
+    # commit hooks are sync; the task runs on the request's loop right away
+    task = loop.create_task(response_cache.invalidate(*tags))
+    pending_invalidations.add(task)
+    task.add_done_callback(pending_invalidations.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_tags(session):
+    session.info.pop("response_cache_tags", None)
+
@@ -0,0 +1,74 @@
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Review, ReviewRate
+from app.controllers.rating import RatingEngine
+from app.controllers.leaderboard import update_leaderboards
+from app.utils.error_handler import ErrorHandler
+
+
+class ReviewController:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.rating_engine = RatingEngine(db)
+
+    async def get_by_id(self, id: int, for_update: bool = False):
+        query = select(Review).where(Review.id == id)
+        if for_update:
+            # the old rate feeds the aggregate delta, keep it stable
+            query = query.with_for_update()
+        review = (await self.db.execute(query)).scalar_one_or_none()
+        if not review:
+            raise ErrorHandler.not_found("Review")
+        return review
+
+    def check_owner(self, review: Review, user_id: int):
+        if review.userId != user_id:
+            raise ErrorHandler.access_denied("review")
+
+    # review and movie aggregates change in the same transaction
+    async def create(self, user_id: int, movie_id: int, review_items: dict):
+        rate = ReviewRate(review_items["rate"])
+        rating = await self.rating_engine.review_created(movie_id, rate)
+        if not rating:
+            await self.db.rollback()
+            raise ErrorHandler.not_found("Movie")
+
+        new_review = Review(
+            userId=user_id,
+            movieId=movie_id,
+            title=review_items.get("title"),
+            rate=rate,
+            text=review_items["text"]
+        )
+        self.db.add(new_review)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise ErrorHandler.bad_request("You have already reviewed this movie.")
+        await update_leaderboards(self.db, movie_id, rating.rate)
+        return new_review, rating
+
+    async def update(self, review: Review, review_items: dict):
+        rating = None
+        if review_items.get("rate") is not None:
+            new_rate = ReviewRate(review_items["rate"])
+            rating = await self.rating_engine.review_updated(review.movieId, review.rate, new_rate)
+            review.rate = new_rate
+
+        for key in ("title", "text"):
+            if key in review_items:
+                setattr(review, key, review_items[key])
+        await self.db.commit()
+        if rating:
+            await update_leaderboards(self.db, review.movieId, rating.rate)
+        return review, rating
+
+    async def delete(self, review: Review):
+        rating = await self.rating_engine.review_deleted(review.movieId, review.rate)
+        await self.db.delete(review)
+        await self.db.commit()
+        if rating:
+            await update_leaderboards(self.db, review.movieId, rating.rate)
+        return rating
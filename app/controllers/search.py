@@ -0,0 +1,221 @@
+import os
+import re
+import html
+import math
+import heapq
+from collections import defaultdict
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Movie
+from app.schemas import IMovieSearchHit
+
+
+# postgres, or memory for development / tests only: see InvertedIndex
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "postgres")
+
+HIGHLIGHT_START = "<b>"
+HIGHLIGHT_STOP = "</b>"
+# ts_headline marks matches with private use characters, so the text around
+# them can be escaped before they become tags
+HEADLINE_START = "\ue000"
+HEADLINE_STOP = "\ue001"
+NAME_HEADLINE_OPTIONS = f'StartSel="{HEADLINE_START}", StopSel="{HEADLINE_STOP}", HighlightAll=true'
+SUMMARY_HEADLINE_OPTIONS = f'StartSel="{HEADLINE_START}", StopSel="{HEADLINE_STOP}", MaxWords=35, MinWords=15'
+
+
+def headline_html(headline: str):
+    return html.escape(headline).replace(HEADLINE_START, HIGHLIGHT_START).replace(HEADLINE_STOP, HIGHLIGHT_STOP)
+
+
+class PostgresSearchBackend:
+    # "searchVector" is a generated tsvector column with a GIN index
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search(self, q: str, offset: int, limit: int):
+        ts_query = func.websearch_to_tsquery("english", q)
+        rank = func.ts_rank_cd(Movie.searchVector, ts_query).label("rank")
+
+        # rank through the index first, then build headlines for one page only
+        page = (
+            select(Movie.id, rank)
+            .where(Movie.searchVector.op("@@")(ts_query))
+            .order_by(rank.desc(), Movie.id)
+            .offset(offset)
+            .limit(limit + 1)
+            .subquery())
+
+        query = (
+            select(
+                Movie.id, Movie.name, Movie.rate, Movie.releaseYear, Movie.cover, page.c.rank,
+                func.ts_headline("english", Movie.name, ts_query, NAME_HEADLINE_OPTIONS),
+                func.ts_headline("english", Movie.summary, ts_query, SUMMARY_HEADLINE_OPTIONS))
+            .join(page, page.c.id == Movie.id)
+            .order_by(page.c.rank.desc(), Movie.id))
+
+        rows = (await self.db.execute(query)).all()
+        hits = [
+            IMovieSearchHit(
+                id=id, name=name, rate=rate, releaseYear=release_year, cover=cover,
+                rank=rank, nameHighlight=headline_html(name_highlight),
+                summaryHighlight=headline_html(summary_highlight))
+            for id, name, rate, release_year, cover, rank, name_highlight, summary_highlight in rows
+        ]
+        return hits[:limit], len(hits) > limit
+
+
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he", "her",
+    "his", "in", "is", "it", "its", "of", "on", "or", "she", "that", "the", "their",
+    "they", "this", "to", "was", "were", "with",
+))
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# same priority as the postgres weights A, B, C
+FIELD_WEIGHTS = {"name": 3.0, "summary": 1.5, "storyline": 1.0}
+
+
+def tokenize(text: str):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def highlight(text: str, terms: set, max_words: int = None):
+    # html: the text is escaped, only the highlight tags are markup
+    words = list(TOKEN_PATTERN.finditer(text))
+    matches = [i for i, word in enumerate(words) if word.group().lower() in terms]
+
+    start_word, stop_word = 0, len(words)
+    if max_words and len(words) > max_words:
+        start_word = max(0, (matches[0] if matches else 0) - 5)
+        stop_word = min(len(words), start_word + max_words)
+    if not words:
+        return html.escape(text)
+
+    matched = set(matches)
+    parts = []
+    position = words[start_word].start()
+    for i in range(start_word, stop_word):
+        word = words[i]
+        parts.append(html.escape(text[position:word.start()]))
+        if i in matched:
+            parts.append(f"{HIGHLIGHT_START}{html.escape(word.group())}{HIGHLIGHT_STOP}")
+        else:
+            parts.append(html.escape(word.group()))
+        position = word.end()
+    if stop_word == len(words):
+        parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+
+class InvertedIndex:
+    # in-process BM25 index, for development, tests and benchmarks only:
+    # - every query is a plain AND of its words; quoted phrases, -term and
+    #   "or" (websearch_to_tsquery) are not understood, so results differ
+    #   from the postgres backend
+    # - it is loaded once at startup and never refreshed, movie writes show
+    #   up after a restart, and each worker holds its own copy
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {movie id: weighted tf}
+        self.lengths = {}
+        self.total_length = 0
+        self.documents = {}
+        self.terms = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, movie_id: int, name: str, summary: str, storyline: str, rate: float = 0,
+            release_year: int = 0, cover: str = ""):
+        if movie_id in self.documents:
+            self.remove(movie_id)
+
+        frequencies = defaultdict(float)
+        for field, text in (("name", name), ("summary", summary), ("storyline", storyline)):
+            for token in tokenize(text or ""):
+                frequencies[token] += FIELD_WEIGHTS[field]
+
+        for token, frequency in frequencies.items():
+            self.postings[token][movie_id] = frequency
+        length = sum(frequencies.values())
+        self.lengths[movie_id] = length
+        self.total_length += length
+        self.terms[movie_id] = tuple(frequencies)
+        self.documents[movie_id] = (name, summary or "", rate, release_year, cover)
+
+    def remove(self, movie_id: int):
+        if movie_id not in self.documents:
+            return
+        for token in self.terms.pop(movie_id):
+            postings = self.postings[token]
+            postings.pop(movie_id, None)
+            if not postings:
+                del self.postings[token]
+        self.total_length -= self.lengths.pop(movie_id)
+        del self.documents[movie_id]
+
+    def search(self, q: str, offset: int, limit: int):
+        terms = list(dict.fromkeys(tokenize(q)))
+        if not terms or not self.documents:
+            return [], False
+
+        # every term must match; intersect starting from the rarest one
+        postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+        candidates = set(postings[0])
+        for term_postings in postings[1:]:
+            candidates.intersection_update(term_postings)
+            if not candidates:
+                return [], False
+
+        documents_count = len(self.documents)
+        average_length = self.total_length / documents_count
+        idfs = [math.log(1 + (documents_count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+
+        def score(movie_id):
+            length_norm = self.k1 * (1 - self.b + self.b * self.lengths[movie_id] / average_length)
+            total = 0
+            for idf, term_postings in zip(idfs, postings):
+                frequency = term_postings[movie_id]
+                total += idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+            return total
+
+        ranked = heapq.nlargest(offset + limit + 1,
+                                ((score(movie_id), -movie_id) for movie_id in candidates))
+
+        matched_terms = set(terms)
+        hits = []
+        for rank, negative_id in ranked[offset:offset + limit + 1]:
+            movie_id = -negative_id
+            name, summary, rate, release_year, cover = self.documents[movie_id]
+            hits.append(IMovieSearchHit(
+                id=movie_id, name=name, rate=rate, releaseYear=release_year, cover=cover,
+                rank=rank, nameHighlight=highlight(name, matched_terms),
+                summaryHighlight=highlight(summary, matched_terms, max_words=35)))
+        return hits[:limit], len(hits) > limit
+
+
+movie_search_index = InvertedIndex()
+
+
+class InMemorySearchBackend:
+    def __init__(self, index: InvertedIndex = movie_search_index):
+        self.index = index
+
+    async def search(self, q: str, offset: int, limit: int):
+        return self.index.search(q, offset, limit)
+
+
+async def load_movie_search_index(db: AsyncSession, index: InvertedIndex = movie_search_index):
+    result = await db.stream(
+        select(Movie.id, Movie.name, Movie.summary, Movie.storyline,
+               Movie.rate, Movie.releaseYear, Movie.cover).execution_options(yield_per=5000))
+    async for movie_id, name, summary, storyline, rate, release_year, cover in result:
+        index.add(movie_id, name, summary, storyline, rate, release_year, cover)
+
+
+def get_search_backend(db: AsyncSession):
+    if SEARCH_BACKEND == "memory":
+        return InMemorySearchBackend()
+    return PostgresSearchBackend(db)
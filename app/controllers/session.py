@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from app.db.redis import get_redis_pool
+
+
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
+# how stale this worker's copy of the revoked token ids may get; a token
+# revoked by another worker is still accepted here for up to this long
+SESSION_REVOCATION_CACHE_TTL = float(os.environ.get("SESSION_REVOCATION_CACHE_TTL", 5))
+
+# sessions:<user id>        hash jti -> json {device, ip, createdAt, expiresAt}
+# revoked_jtis              sorted set jti -> token expiry (epoch seconds)
+# revoked_jtis:version      bumped by every revocation
+SESSIONS_PREFIX = "sessions"
+REVOKED_KEY = "revoked_jtis"
+REVOKED_VERSION_KEY = f"{REVOKED_KEY}:version"
+
+# revokes every session of a user; one script, so a login between reading
+# the sessions and deleting them can't be dropped without being revoked
+REVOKE_ALL_SCRIPT = """
+local sessions = redis.call('HGETALL', KEYS[1])
+if #sessions == 0 then
+    return {}
+end
+local jtis = {}
+for i = 1, #sessions, 2 do
+    redis.call('ZADD', KEYS[2], cjson.decode(sessions[i + 1])['expiresAt'], sessions[i])
+    jtis[#jtis + 1] = sessions[i]
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('INCR', KEYS[3])
+return jtis
+"""
+
+
+def sessions_key(user_id: int):
+    return f"{SESSIONS_PREFIX}:{user_id}"
+
+
+def new_token_id():
+    return uuid.uuid4().hex
+
+
+class SessionStore:
+    # every login is a session of its own (one per device), logout revokes
+    # the token's jti; validation reads a local copy of the revoked ids
+    def __init__(self, ttl: int = ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+                 revocation_cache_ttl: float = SESSION_REVOCATION_CACHE_TTL):
+        self.ttl = ttl
+        self.revocation_cache_ttl = revocation_cache_ttl
+        self.revoked = set()
+        self.revoked_version = None
+        self.refreshed_at = 0
+        self.refreshing = None
+        self.scripts = None
+
+    def get_scripts(self):
+        if self.scripts is None:
+            self.scripts = {"revoke_all": get_redis_pool().register_script(REVOKE_ALL_SCRIPT)}
+        return self.scripts
+
+    async def create(self, user_id: int, jti: str, device: str = None, ip: str = None):
+        now = int(time.time())
+        session = json.dumps({"device": device, "ip": ip, "createdAt": now, "expiresAt": now + self.ttl})
+        key = sessions_key(user_id)
+
+        # one round trip; the hash lives as long as its newest session
+        pipe = get_redis_pool().pipeline(transaction=True)
+        pipe.hset(key, jti, session)
+        pipe.expire(key, self.ttl)
+        pipe.hgetall(key)
+        _, _, sessions = await pipe.execute()
+
+        expired = [other_jti for other_jti, other in sessions.items()
+                   if json.loads(other)["expiresAt"] <= now]
+        if expired:
+            await get_redis_pool().hdel(key, *expired)
+
+    async def get_sessions(self, user_id: int):
+        now = int(time.time())
+        sessions = await get_redis_pool().hgetall(sessions_key(user_id))
+        items = [{"jti": jti, **json.loads(session)} for jti, session in sessions.items()]
+        return sorted((item for item in items if item["expiresAt"] > now),
+                      key=lambda item: item["createdAt"], reverse=True)
+
+    async def revoke(self, user_id: int, jti: str, expires_at: int = None):
+        # drops the session and denies its token until the token expires
+        now = int(time.time())
+        expires_at = expires_at or now + self.ttl
+        pipe = get_redis_pool().pipeline(transaction=True)
+        pipe.hdel(sessions_key(user_id), jti)
+        pipe.zadd(REVOKED_KEY, {jti: expires_at})
+        pipe.zremrangebyscore(REVOKED_KEY, "-inf", now)
+        pipe.expire(REVOKED_KEY, self.ttl)
+        pipe.incr(REVOKED_VERSION_KEY)
+        removed, *_ = await pipe.execute()
+
+        # this worker knows right away, the others on their next refresh
+        self.revoked.add(jti)
+        return bool(removed)
+
+    async def revoke_all(self, user_id: int):
+        jtis = await self.get_scripts()["revoke_all"](
+            keys=[sessions_key(user_id), REVOKED_KEY, REVOKED_VERSION_KEY],
+            args=[int(time.time()), self.ttl])
+
+        self.revoked.update(jtis)
+        return len(jtis)
+
+    async def is_revoked(self, jti: str):
+        if time.monotonic() - self.refreshed_at >= self.revocation_cache_ttl:
+            await self.refresh()
+        return jti in self.revoked
+
+    async def refresh(self):
+        # one refresh at a time per worker, concurrent requests wait for it
+        if self.refreshing is None:
+            self.refreshing = asyncio.ensure_future(self._refresh())
+        try:
+            await asyncio.shield(self.refreshing)
+        finally:
+            if self.refreshing is not None and self.refreshing.done():
+                self.refreshing = None
+
+    async def _refresh(self):
+        try:
+            redis_pool = get_redis_pool()
+            version = await redis_pool.get(REVOKED_VERSION_KEY)
+            if version != self.revoked_version:
+                # revocations of expired tokens no longer matter
+                revoked = await redis_pool.zrangebyscore(REVOKED_KEY, int(time.time()), "+inf")
+                self.revoked = set(revoked)
+                self.revoked_version = version
+        except Exception as e:
+            # keep the ids we have, try again after the ttl
+            logging.error(f"Session store could not refresh revoked tokens: {e!r}")
+        self.refreshed_at = time.monotonic()
+
+
+session_store = SessionStore()
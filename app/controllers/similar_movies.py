@@ -0,0 +1,257 @@
+import os
+import json
+import asyncio
+import logging
+from collections import defaultdict
+from sqlalchemy import select, inspect, event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.redis import get_redis_pool
+from app.db.routing import use_primary
+from app.models import Movie, MovieCast, MovieWriter, MovieGenre
+from app.schemas import ISimilarMovie
+from app.utils.error_handler import ErrorHandler
+
+
+# neighbors kept per movie, the most /similar can return
+SIMILAR_MOVIES_K = int(os.environ.get("SIMILAR_MOVIES_K", 20))
+# matrix, idf and neighbors of the last build, read and rewritten by refreshes
+SIMILAR_MOVIES_MODEL_PATH = os.environ.get("SIMILAR_MOVIES_MODEL_PATH", "similar_movies.npz")
+# bounds the scores held in memory at once while building
+SIMILAR_MOVIES_BLOCK_NNZ = int(os.environ.get("SIMILAR_MOVIES_BLOCK_NNZ", 20_000_000))
+
+# weight of a credit before idf: people say more about a movie than its
+# genres, countries and languages, which thousands of movies share
+FEATURE_WEIGHTS = {
+    "cast": 1.0,
+    "star": 1.5,
+    "writer": 1.0,
+    "genre": 0.5,
+    "country": 0.25,
+    "language": 0.25,
+}
+
+# similar_movies          hash movie id -> json [[movie id, score], ...], best first
+# similar_movies:stale    set of movie ids whose credits changed since the last refresh
+SIMILAR_KEY = "similar_movies"
+BUILDING_KEY = f"{SIMILAR_KEY}:building"
+STALE_KEY = f"{SIMILAR_KEY}:stale"
+
+BATCH_SIZE = 1000
+# stale movies taken per refresh
+REFRESH_BATCH_SIZE = 500
+
+
+def encode_neighbors(neighbors: list):
+    return json.dumps([[movie_id, round(score, 4)] for movie_id, score in neighbors])
+
+
+class SimilarMoviesController:
+    def __init__(self, db: AsyncSession = None):
+        self.db = db
+        self.redis_pool = get_redis_pool()
+        # kept between refreshes of a long running job, until a rebuild replaces the file
+        self.model = None
+        self.model_modified_at = None
+
+    # reads: one HGET and a primary key lookup of at most k movies
+    async def get_similar(self, movie_id: int, limit: int = SIMILAR_MOVIES_K):
+        neighbors = await self.redis_pool.hget(SIMILAR_KEY, movie_id)
+        if neighbors is None:
+            exists = (await self.db.execute(select(Movie.id).where(Movie.id == movie_id))).scalar_one_or_none()
+            if not exists:
+                raise ErrorHandler.not_found("Movie")
+            return []
+
+        scores = dict(json.loads(neighbors)[:limit])
+        if not scores:
+            return []
+        movies = (await self.db.execute(
+            select(Movie.id, Movie.name, Movie.rate, Movie.releaseYear, Movie.cover)
+            .where(Movie.id.in_(scores)))).all()
+        by_id = {movie.id: movie for movie in movies}
+        # movies deleted since the last refresh are skipped
+        return [ISimilarMovie(id=movie.id, name=movie.name, rate=movie.rate, releaseYear=movie.releaseYear,
+                              cover=movie.cover, score=score)
+                for movie, score in ((by_id.get(similar_id), score) for similar_id, score in scores.items())
+                if movie is not None]
+
+    # features
+    async def stream_features(self, movie_ids=None):
+        # (movie id, feature, weight) of every credit, of the given movies only if any
+        def only(query, column):
+            return query.where(column.in_(movie_ids)) if movie_ids is not None else query
+
+        movies = await self.db.stream(
+            only(select(Movie.id, Movie.countries, Movie.languages), Movie.id)
+            .execution_options(yield_per=BATCH_SIZE))
+        async for movie_id, countries, languages in movies:
+            for country in countries or []:
+                yield movie_id, f"country:{country.lower()}", FEATURE_WEIGHTS["country"]
+            for language in languages or []:
+                yield movie_id, f"language:{language.lower()}", FEATURE_WEIGHTS["language"]
+
+        credits = (
+            (select(MovieCast.movieId, MovieCast.castId, MovieCast.isStar), MovieCast.movieId, "cast"),
+            (select(MovieWriter.movieId, MovieWriter.writerId), MovieWriter.movieId, "writer"),
+            (select(MovieGenre.movieId, MovieGenre.genreId), MovieGenre.movieId, "genre"),
+        )
+        for query, movie_column, kind in credits:
+            result = await self.db.stream(only(query, movie_column).execution_options(yield_per=10000))
+            async for movie_id, feature_id, *is_star in result:
+                weight = FEATURE_WEIGHTS["star"] if is_star and is_star[0] else FEATURE_WEIGHTS[kind]
+                yield movie_id, f"{kind}:{feature_id}", weight
+
+    async def load_movie_ids(self, movie_ids=None):
+        query = select(Movie.id).order_by(Movie.id)
+        if movie_ids is not None:
+            query = query.where(Movie.id.in_(movie_ids))
+        return (await self.db.execute(query)).scalars().all()
+
+    # full build
+    async def rebuild(self, k: int = SIMILAR_MOVIES_K, model_path: str = SIMILAR_MOVIES_MODEL_PATH):
+        # scipy is only needed by the batch jobs, the api never loads it
+        from app.utils.similarity import SimilarityModel
+
+        # changes from now on are picked up by the next refresh; a replica
+        # could still miss the ones before, with nothing left to redo them
+        await self.redis_pool.delete(STALE_KEY)
+        use_primary(self.db)
+        movie_ids = await self.load_movie_ids()
+        row_of = {movie_id: row for row, movie_id in enumerate(movie_ids)}
+        column_of = {}
+        rows, columns, weights = [], [], []
+        async for movie_id, feature, weight in self.stream_features():
+            row = row_of.get(movie_id)
+            if row is None:
+                # credited after the movie ids were read
+                continue
+            rows.append(row)
+            columns.append(column_of.setdefault(feature, len(column_of)))
+            weights.append(weight)
+
+        model = SimilarityModel.build(movie_ids, list(column_of), rows, columns, weights,
+                                      k=k, max_nnz=SIMILAR_MOVIES_BLOCK_NNZ)
+        model.save(model_path)
+
+        # written under a temporary key and swapped in at once
+        pipe = self.redis_pool.pipeline(transaction=False)
+        pipe.delete(BUILDING_KEY)
+        for count, movie_id in enumerate(movie_ids, 1):
+            pipe.hset(BUILDING_KEY, movie_id, encode_neighbors(model.similar(movie_id)))
+            if count % BATCH_SIZE == 0:
+                await pipe.execute()
+        await pipe.execute()
+        if movie_ids:
+            await self.redis_pool.rename(BUILDING_KEY, SIMILAR_KEY)
+        else:
+            await self.redis_pool.delete(SIMILAR_KEY)
+        return {"movies": len(movie_ids), "features": len(column_of), "credits": len(rows)}
+
+    # incremental refresh
+    def load_model(self, model_path: str):
+        from app.utils.similarity import SimilarityModel
+
+        modified_at = os.stat(model_path).st_mtime_ns
+        if self.model is None or modified_at != self.model_modified_at:
+            self.model = SimilarityModel.load(model_path)
+            self.model_modified_at = modified_at
+        return self.model
+
+    async def refresh(self, model_path: str = SIMILAR_MOVIES_MODEL_PATH):
+        # recomputes the movies whose credits changed and every movie whose
+        # list they were in or now enter; idf stays as of the last rebuild
+        stale = await self.redis_pool.spop(STALE_KEY, REFRESH_BATCH_SIZE)
+        if not stale:
+            return {"movies": 0, "updated": 0, "deleted": 0}
+        stale = [int(movie_id) for movie_id in stale]
+        # the popped ids are gone, read changes a replica may not have yet
+        use_primary(self.db)
+        try:
+            model = self.load_model(model_path)
+
+            existing = set(await self.load_movie_ids(stale))
+            changes = {movie_id: (defaultdict(float) if movie_id in existing else None) for movie_id in stale}
+            async for movie_id, feature, weight in self.stream_features(stale):
+                if changes[movie_id] is not None:
+                    changes[movie_id][feature] += weight
+
+            updated = model.update(changes)
+            model.save(model_path)
+            self.model_modified_at = os.stat(model_path).st_mtime_ns
+        except Exception:
+            # taken back, the next refresh retries them; the model in memory
+            # may be half updated
+            self.model = None
+            await self.redis_pool.sadd(STALE_KEY, *stale)
+            raise
+
+        deleted = [movie_id for movie_id in stale if movie_id not in existing]
+        pipe = self.redis_pool.pipeline(transaction=False)
+        for count, movie_id in enumerate(set(updated) - set(deleted), 1):
+            pipe.hset(SIMILAR_KEY, movie_id, encode_neighbors(model.similar(movie_id)))
+            if count % BATCH_SIZE == 0:
+                await pipe.execute()
+        if deleted:
+            pipe.hdel(SIMILAR_KEY, *deleted)
+        await pipe.execute()
+        return {"movies": len(stale), "updated": len(updated), "deleted": len(deleted)}
+
+
+# stale movies: marked on commit of any session that changed their features
+def mark_stale(session: Session, *movie_ids):
+    # for changes made with core statements, which the flush doesn't see
+    session.info.setdefault("similar_movies_stale", set()).update(movie_ids)
+
+
+def changed_movie(instance, created_or_deleted: bool):
+    if isinstance(instance, (MovieCast, MovieWriter, MovieGenre)):
+        return instance.movieId
+    if isinstance(instance, Movie):
+        if created_or_deleted:
+            return instance.id
+        attributes = inspect(instance).attrs
+        if attributes.countries.history.has_changes() or attributes.languages.history.has_changes():
+            return instance.id
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def collect_stale_movies(session, flush_context):
+    for instances, created_or_deleted in ((session.new, True), (session.dirty, False), (session.deleted, True)):
+        for instance in instances:
+            movie_id = changed_movie(instance, created_or_deleted)
+            if movie_id is not None:
+                mark_stale(session, movie_id)
+
+
+# keeps the fire-and-forget tasks referenced until they finish
+pending_marks = set()
+
+
+async def add_stale_movies(movie_ids):
+    try:
+        await get_redis_pool().sadd(STALE_KEY, *movie_ids)
+    except Exception as e:
+        # the next rebuild covers them
+        logging.error(f"Could not mark similar movies of {movie_ids} stale: {e!r}")
+
+
+@event.listens_for(Session, "after_commit")
+def mark_stale_movies(session):
+    movie_ids = session.info.pop("similar_movies_stale", None)
+    if not movie_ids:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logging.error(f"Could not mark similar movies of {movie_ids} stale: no event loop")
+        return
+    task = loop.create_task(add_stale_movies(movie_ids))
+    pending_marks.add(task)
+    task.add_done_callback(pending_marks.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_stale_movies(session):
+    session.info.pop("similar_movies_stale", None)
@@ -1,32 +1,106 @@
+import os
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, or_
+from sqlalchemy.exc import IntegrityError
 from app.models import User
 from app.schemas import ICreateUserController, IUpdateUserController
 import re
 from app.utils.error_handler import ErrorHandler
-from app.utils.password_operator import verify_password
+from app.utils.password_operator import password_hasher
+from app.controllers.principal_cache import principal_cache
+from app.utils.bloom_filter import RedisBloomFilter
+from app.db.base import replica_router
+from app.db.routing import use_primary
 from datetime import datetime
 
 
+USER_NAMES_FILTER_CAPACITY = int(
+    os.environ.get("USER_NAMES_FILTER_CAPACITY", 1000000))
+
+# taken usernames ("u:<username>") and emails ("e:<email>")
+taken_names_filter = RedisBloomFilter(
+    key="bloom:taken_user_names", capacity=USER_NAMES_FILTER_CAPACITY)
+
+USERNAME_EXISTS_MESSAGE = "User with this username does exist."
+EMAIL_EXISTS_MESSAGE = "User with this email does exist."
+
+
+class UserLookupCache:
+    # request-scoped identity map, lives in the session's info dict
+    FIELDS = ("id", "username", "email")
+
+    def __init__(self):
+        self.entries = {field: {} for field in self.FIELDS}
+
+    def get(self, field: str, value):
+        entries = self.entries[field]
+        if value in entries:
+            return True, entries[value]
+        return False, None
+
+    def put(self, user: User):
+        # cross-index: a lookup by one column fills the others too
+        for field in self.FIELDS:
+            self.entries[field][getattr(user, field)] = user
+
+    def put_missing(self, field: str, value):
+        self.entries[field][value] = None
+
+    def evict(self, user: User, old_values: dict = None):
+        for field in self.FIELDS:
+            for value in (getattr(user, field), (old_values or {}).get(field)):
+                if self.entries[field].get(value) is user:
+                    del self.entries[field][value]
+
+    def clear(self):
+        for entries in self.entries.values():
+            entries.clear()
+
+
 class UserController:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_by_id(self, id: int):
-        user = (await self.db.execute(select(User).where(User.id == id))).scalar_one_or_none()
+    @property
+    def lookup_cache(self) -> UserLookupCache:
+        # shared by every UserController built on the same (request) session
+        cache = self.db.info.get("user_lookup_cache")
+        if cache is None:
+            cache = self.db.info["user_lookup_cache"] = UserLookupCache()
+        return cache
+
+    async def get_by(self, field: str, value):
+        found, user = self.lookup_cache.get(field, value)
+        if found:
+            return user
+
+        query = select(User).where(getattr(User, field) == value)
+        user = (await self.db.execute(query)).scalar_one_or_none()
+        if not user and replica_router.replicas and not self.db.info.get("use_primary"):
+            # a user created moments ago may not have reached the replica yet
+            use_primary(self.db)
+            user = (await self.db.execute(query)).scalar_one_or_none()
+        if user:
+            self.lookup_cache.put(user)
+        else:
+            self.lookup_cache.put_missing(field, value)
         return user
 
+    async def get_by_id(self, id: int):
+        return await self.get_by("id", id)
+
     async def get_by_username(self, username: str):
-        user = (await self.db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+        user = await self.get_by("username", username)
         # if not user:
         # raise ErrorHandler.not_found("User")
         return user
 
     async def get_by_email(self, email: str):
-        user = (await self.db.execute(select(User).where(User.email == email))).scalar_one_or_none()
-        return user
+        return await self.get_by("email", email)
 
     async def create(self, user_items: ICreateUserController):
+        use_primary(self.db)
         async with self.db as async_session:
             new_user = User(
                 username=user_items["username"],
@@ -37,25 +111,46 @@ class UserController:
                 gender=user_items["gender"]
             )
             async_session.add(new_user)
-            await async_session.commit()
-            await async_session.refresh(new_user)
+            try:
+                await async_session.commit()
+            except IntegrityError as e:
+                await async_session.rollback()
+                self.lookup_cache.clear()
+                self.raise_conflict(e)
+            self.lookup_cache.put(new_user)
+            await self.add_taken_names(new_user.username, new_user.email)
             return new_user
 
     async def update_by_id(self, id: int, user_items: IUpdateUserController):
+        use_primary(self.db)
         user = await self.get_by_id(id=id)
 
         if user:
+            old_values = {field: getattr(user, field)
+                          for field in UserLookupCache.FIELDS}
             for key, value in user_items.items():
                 setattr(user, key, value)
-            await self.db.commit()
+            try:
+                await self.db.commit()
+            except IntegrityError as e:
+                await self.db.rollback()
+                self.lookup_cache.clear()
+                self.raise_conflict(e)
+            self.lookup_cache.evict(user, old_values)
+            self.lookup_cache.put(user)
+            await principal_cache.invalidate_user(id)
+            await self.add_taken_names(user_items.get("username"), user_items.get("email"))
         return user
 
     async def delete_by_id(self, id: int):
+        use_primary(self.db)
         user = await self.get_by_id(id=id)
 
         if user:
             await self.db.execute(delete(User).where(User.id == id))
             await self.db.commit()
+            self.lookup_cache.evict(user)
+            await principal_cache.invalidate_user(id)
         return
 
     # validations
@@ -120,48 +215,128 @@ class UserController:
             raise ErrorHandler.bad_request(errors)
 
     async def check_username_exists(self, username: str):
-        user = (await self.db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+        user = await self.get_by_username(username=username)
         if not user:
             raise ErrorHandler.bad_request(
                 "User with this username does not exist.")
 
     async def check_username_not_exists(self, username: str):
-        user = (await self.db.execute(select(User).where(User.username == username))).scalar_one_or_none()
-        if user:
-            raise ErrorHandler.bad_request(
-                "User with this username does exist.")
+        await self.check_user_conflicts(username=username)
 
     async def check_email_not_exists(self, email: str):
-        user = await self.get_by_email(email=email)
-        if user:
-            raise ErrorHandler.bad_request("User with this email does exist.")
+        await self.check_user_conflicts(email=email)
+
+    async def get_user_conflicts(self, username: str = None, email: str = None, exclude_user_id: int = None):
+        # one query for every unique column
+        conditions = []
+        if username:
+            conditions.append(User.username == username)
+        if email:
+            conditions.append(User.email == email)
+        if not conditions:
+            return []
+
+        query = select(User.username, User.email).where(or_(*conditions))
+        if exclude_user_id:
+            query = query.where(User.id != exclude_user_id)
+
+        errors = []
+        for existing_username, existing_email in (await self.db.execute(query)).all():
+            if username and existing_username == username:
+                errors.append(USERNAME_EXISTS_MESSAGE)
+            if email and existing_email == email:
+                errors.append(EMAIL_EXISTS_MESSAGE)
+        return errors
+
+    async def check_user_conflicts(self, username: str = None, email: str = None, exclude_user_id: int = None):
+        errors = await self.get_user_conflicts(username, email, exclude_user_id)
+        if len(errors) == 1:
+            raise ErrorHandler.bad_request(errors[0])
+        if errors:
+            raise ErrorHandler.bad_request(errors)
+
+    def raise_conflict(self, e: IntegrityError):
+        # a concurrent insert/update won the race against our check
+        message = str(e.orig)
+        if "users_username_key" in message:
+            raise ErrorHandler.bad_request(USERNAME_EXISTS_MESSAGE)
+        if "users_email_key" in message:
+            raise ErrorHandler.bad_request(EMAIL_EXISTS_MESSAGE)
+        raise e
+
+    async def add_taken_names(self, username: str = None, email: str = None):
+        names = []
+        if username:
+            names.append(f"u:{username}")
+        if email:
+            names.append(f"e:{email}")
+        if not names:
+            return
+        try:
+            await taken_names_filter.add(*names)
+        except Exception as e:
+            logging.error(f"Could not add taken names to bloom filter: {e!r}")
+
+    async def build_taken_names_filter(self, force: bool = False):
+        if not force and await taken_names_filter.exists():
+            return
+        bloom = taken_names_filter.new_filter()
+        await taken_names_filter.start_build()
+        # a lagging replica would miss names added before the build started
+        use_primary(self.db)
+        result = await self.db.stream(
+            select(User.username, User.email).execution_options(yield_per=10000))
+        async for username, email in result:
+            bloom.add(f"u:{username}")
+            bloom.add(f"e:{email}")
+        await taken_names_filter.replace(bloom)
+
+    async def is_available(self, username: str = None, email: str = None):
+        # "definitely free" answers come from the bloom filter only; when
+        # the filter is missing every name is checked against the database
+        names = []
+        if username:
+            names.append(f"u:{username}")
+        if email:
+            names.append(f"e:{email}")
+        try:
+            maybe_taken = False
+            for name in names:
+                if await taken_names_filter.might_contain(name):
+                    maybe_taken = True
+                    break
+        except Exception as e:
+            logging.error(f"Could not read bloom filter: {e!r}")
+            maybe_taken = True
+
+        if not maybe_taken:
+            return True
+        return not await self.get_user_conflicts(username=username, email=email)
 
     async def verify_password(self, username: str, password: str):
         user = await self.get_by_username(username=username)
-        is_valid_password = verify_password(password, user.hashedPassword)
+        is_valid_password, new_hashed_password = await password_hasher.verify_and_update(
+            password, user.hashedPassword)
 
         if not is_valid_password:
             raise ErrorHandler.bad_request("Password is incorrect")
 
+        # hash was made with old cost parameters
+        if new_hashed_password:
+            user.hashedPassword = new_hashed_password
+            await self.db.commit()
+
     # def validate_scope(self, scope, operation):
     #     if (scope == "user" and operation not in USER_SCOPES) or (scope == "admin" and operation not in ADMIN_SCOPES):
     #         raise ErrorHandler.access_denied(operation)
 
     async def check_username_not_repeat(self, user_id, username):
-        existing_username = (await self.db.execute(select(User).where(User.username == username))).scalar_one_or_none()
-
-        user = (await self.db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
-
-        if existing_username and existing_username.id != user.id:
+        if await self.get_user_conflicts(username=username, exclude_user_id=user_id):
             raise ErrorHandler.bad_request(
                 custom_message="username is repeated.")
 
     async def check_email_not_repeat(self, user_id, email):
-        existing_email = (await self.db.execute(select(User).where(User.email == email))).scalar_one_or_none()
-
-        user = (await self.db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
-
-        if existing_email and existing_email.id != user.id:
+        if await self.get_user_conflicts(email=email, exclude_user_id=user_id):
             raise ErrorHandler.bad_request(custom_message="Email is repeated.")
 
     async def validate_dob(self, dob: str):  # should be in this format: 01-04-1987
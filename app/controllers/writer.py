@@ -0,0 +1,33 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Writer, Movie, MovieWriter
+from app.schemas import IWriterDetail, IWriterMovie
+from app.utils.error_handler import ErrorHandler
+
+
+class WriterController:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, id: int):
+        writer = (await self.db.execute(select(Writer).where(Writer.id == id))).scalar_one_or_none()
+        if not writer:
+            raise ErrorHandler.not_found("Writer")
+
+        movies = await self.db.execute(
+            select(Movie.id, Movie.name, Movie.releaseYear, Movie.cover)
+            .join(MovieWriter, MovieWriter.movieId == Movie.id)
+            .where(MovieWriter.writerId == id)
+            .order_by(Movie.releaseYear.desc(), Movie.id.desc()))
+
+        return IWriterDetail(
+            id=writer.id,
+            fullname=writer.fullname,
+            profilePic=writer.profilePic,
+            summary=writer.summary,
+            dob=writer.dob,
+            gender=writer.gender,
+            movies=[IWriterMovie(id=movie_id, name=name, releaseYear=release_year, cover=cover)
+                    for movie_id, name, release_year, cover in movies],
+            createdAt=writer.createdAt,
+            updatedAt=writer.updatedAt)
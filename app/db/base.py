@@ -1,27 +1,135 @@
 import os
-from sqlalchemy.orm import DeclarativeBase
+import asyncio
+from sqlalchemy import text, event
+from sqlalchemy.orm import DeclarativeBase, Session
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.db.pool import InstrumentedQueuePool, instrument_pool
+from app.db.profiler import instrument_profiler
+from app.db.routing import ReplicaRouter
+from app.utils.metrics import registry, instrument_engine, pool_metric_lines
 
 
 SQLALCHEMY_DATABASE_URL = os.environ.get('DATABASE_URL')
+# comma separated read replicas; reads are spread over them, writes go to DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+                         if url.strip()]
+ALEMBIC_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+# connections opened at startup, defaults to the pool size
+DB_POOL_WARMUP = os.environ.get("DB_POOL_WARMUP")
+
+# per worker: pool size + max overflow connections at most, so keep
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below postgres' max_connections
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+# seconds a request waits for a connection before failing with 503
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+# seconds before a connection is replaced, -1 to keep them forever
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+# prepared statements cached per connection, 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+DB_ECHO = os.environ.get("DB_ECHO", "false").lower() == "true"
+
+
+def get_connect_args(url: str):
+    # asyncpg only; other drivers (e.g. aiosqlite in the benchmarks) take none
+    if not url.startswith("postgresql+asyncpg"):
+        return {}
+    connect_args = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    if not DB_STATEMENT_CACHE_SIZE:
+        connect_args["statement_cache_size"] = 0
+    return connect_args
+
+
+def make_engine(url: str, name: str):
+    # each replica gets a pool of the same size as the primary
+    engine = create_async_engine(
+        url=url,
+        echo=DB_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=get_connect_args(url))
+    instrument_pool(engine)
+    # name is the database label of the metrics
+    instrument_engine(engine, name)
+    instrument_profiler(engine)
+    return engine
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL, "primary")
+replica_engines = {f"replica{index}": make_engine(url, f"replica{index}")
+                   for index, url in enumerate(DATABASE_REPLICA_URLS)}
+replica_router = ReplicaRouter(primary=engine, replicas=list(replica_engines.values()))
+registry.add_collector(lambda: pool_metric_lines({"primary": engine, **replica_engines}))
+
+
+class RoutingSession(Session):
+    # plain reads go to a healthy replica, everything else to the primary
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return replica_router.get_bind(self, clause)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def routing_session_committed(session):
+    replica_router.committed(session)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def routing_session_rolled_back(session):
+    session.info.pop("wrote", None)
+
 
-engine = create_async_engine(url=SQLALCHEMY_DATABASE_URL, echo=False)
 SessionLocal = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
+    sync_session_class=RoutingSession,
     autocommit=False,
-    autoflush=False)
+    autoflush=False,
+    # keep loaded rows usable after commit, async sessions can't lazy-refresh
+    expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
     pass
 
 
-async def create_all_tables():
-    async with engine.begin() as conn:
-        from app.models import User, Movie, Cast, Writer, Genre, Review, MovieCast, MovieWriter, MovieGenre  # TODO
-        await conn.run_sync(Base.metadata.create_all)
-    await engine.dispose()
+# the schema is owned by the migrations (`alembic upgrade head`), workers
+# only check that the database is at the revision they were built for
+def get_head_revision():
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory.from_config(Config(ALEMBIC_CONFIG)).get_current_head()
+
+
+async def verify_schema_revision():
+    from alembic.migration import MigrationContext
+
+    def current_revision(sync_conn):
+        return MigrationContext.configure(sync_conn).get_current_revision()
+
+    async with engine.connect() as conn:
+        revision = await conn.run_sync(current_revision)
+    head = get_head_revision()
+    if revision != head:
+        raise RuntimeError(
+            f"Database schema is at revision {revision}, expected {head}. Run `alembic upgrade head`.")
+
+
+async def warm_up_pool():
+    # open the connections concurrently, so the first requests don't pay for them
+    size = int(DB_POOL_WARMUP) if DB_POOL_WARMUP else engine.pool.size()
+
+    async def ping(target):
+        async with target.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    targets = [engine] + [replica.engine for replica in replica_router.replicas]
+    await asyncio.gather(*(ping(target) for target in targets for _ in range(size)))
 
 
 async def get_db():
@@ -0,0 +1,114 @@
+import time
+import threading
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+# upper bounds (seconds) of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        self.overflow_max = 0
+
+    def waited(self, seconds: float, overflow: int):
+        with self.lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    break
+            else:
+                index = len(WAIT_BUCKETS)
+            self.wait_buckets[index] += 1
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def count(self, name: str):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool):
+        with self.lock:
+            checkouts = self.checkouts
+            return {
+                "size": pool.size(),
+                "checkedIn": pool.checkedin(),
+                "checkedOut": pool.checkedout(),
+                # negative while the pool hasn't opened all of its connections
+                "overflow": pool.overflow(),
+                "maxOverflow": pool._max_overflow,
+                "overflowPeak": self.overflow_max,
+                "connects": self.connects,
+                "checkouts": checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "waitAvgMs": round(self.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "waitMaxMs": round(self.wait_max * 1000, 3),
+                "waitHistogram": {
+                    **{f"le_{bound}": count for bound, count in zip(WAIT_BUCKETS, self.wait_buckets)},
+                    "le_inf": self.wait_buckets[-1],
+                },
+            }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # times how long a checkout waits for a free (or new) connection
+    stats = None
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.count("timeouts")
+            raise
+        finally:
+            self.stats.waited(time.perf_counter() - started_at, self.overflow())
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def instrument_pool(engine):
+    # dispose() recreates the pool, the stats and these listeners carry over
+    stats = engine.sync_engine.pool.stats = PoolStats()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.count("connects")
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.count("checkouts")
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.count("checkins")
+
+    @event.listens_for(engine.sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.count("invalidations")
+
+    return stats
+
+
+def pool_status(engine):
+    pool = engine.sync_engine.pool
+    return pool.stats.snapshot(pool)
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+QUERY_PROFILER_ENABLED = os.environ.get("QUERY_PROFILER_ENABLED", "true").lower() == "true"
+# statements slower than this are logged, with their parameters redacted
+QUERY_SLOW_MS = float(os.environ.get("QUERY_SLOW_MS", 200))
+# a request running one statement (fingerprint) more often than this is an N+1
+QUERY_REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", 10))
+# adds X-Query-Stats to every response, for development / staging
+QUERY_STATS_HEADER = os.environ.get("QUERY_STATS_HEADER", "false").lower() == "true"
+QUERY_STATS_HEADER_NAME = "x-query-stats"
+
+# literals and bind placeholders of every dialect / driver style
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+|\?")
+# asyncpg casts every bind ($1::INTEGER, $2::TIMESTAMP WITHOUT TIME ZONE, $3::VARCHAR[])
+TYPE_CAST = re.compile(
+    r"\?::(?:(?:TIMESTAMP|TIME) WITH(?:OUT)? TIME ZONE|DOUBLE PRECISION|\w+(?:\(\d+(?:\s*,\s*\d+)?\))?)(?:\[\])*",
+    re.IGNORECASE)
+# expanded IN lists and multi-row VALUES differ in length only
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+WHITESPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize(statement: str):
+    statement = STRING_LITERAL.sub("?", statement)
+    statement = PLACEHOLDER.sub("?", statement)
+    statement = TYPE_CAST.sub("?", statement)
+    statement = NUMBER_LITERAL.sub("?", statement)
+    statement = VALUE_LIST.sub("(...)", statement)
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement: str):
+    # same statement shape -> same fingerprint, whatever the values
+    return hashlib.blake2b(normalize(statement).encode(), digest_size=8).hexdigest()
+
+
+def redact_value(value):
+    if value is None:
+        return "None"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def redact(parameters, executemany: bool = False):
+    # types (and lengths) only, values can hold passwords, emails, tokens
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} rows of {redact(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {redact_value(value)}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(redact_value(value) for value in parameters) + ")"
+    return redact_value(parameters)
+
+
+class QueryProfile:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+        self.fingerprints = Counter()
+        # fingerprint -> normalized statement, for the reports
+        self.statements = {}
+        # relationship path -> lazy loads
+        self.lazy_loads = Counter()
+
+    def record(self, statement: str, seconds: float):
+        key = fingerprint(statement)
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[key] += 1
+        if key not in self.statements:
+            self.statements[key] = normalize(statement)
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD):
+        # [(fingerprint, count, statement)] run more than threshold times
+        return [(key, count, self.statements[key])
+                for key, count in self.fingerprints.most_common() if count > threshold]
+
+    def max_repeats(self):
+        if not self.fingerprints:
+            return 0
+        return self.fingerprints.most_common(1)[0][1]
+
+    def header(self):
+        return (f"count={self.count}; time_ms={round(self.seconds * 1000, 3)}; "
+                f"slow={self.slow}; max_repeats={self.max_repeats()}")
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "timeMs": round(self.seconds * 1000, 3),
+            "slow": self.slow,
+            "maxRepeats": self.max_repeats(),
+            "lazyLoads": dict(self.lazy_loads),
+            "repeated": [{"fingerprint": key, "count": count, "statement": statement}
+                         for key, count, statement in self.repeated()],
+        }
+
+
+# every profile open in this context: the request's and e.g. a test's budget
+active_profiles = ContextVar("active_profiles", default=())
+
+
+@contextmanager
+def profile_queries():
+    profile = QueryProfile()
+    token = active_profiles.set((*active_profiles.get(), profile))
+    try:
+        yield profile
+    finally:
+        active_profiles.reset(token)
+
+
+def report_repeats(profile: QueryProfile, where: str, threshold: int = QUERY_REPEAT_THRESHOLD):
+    for key, count, statement in profile.repeated(threshold):
+        logging.error(f"N+1 in {where}: statement {key} ran {count} times: {statement[:500]}")
+    for path, count in profile.lazy_loads.items():
+        if count > threshold:
+            logging.error(f"N+1 in {where}: {count} lazy loads of {path}")
+
+
+# session events: which relationship a lazy load came from
+def count_lazy_loads(orm_execute_state):
+    # only selects carry load options, ORM updates / deletes have none
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    path = orm_execute_state.loader_strategy_path
+    relationship = path[-1] if path else None
+    name = str(relationship) if relationship is not None else "unknown relationship"
+    for profile in active_profiles.get():
+        profile.lazy_loads[name] += 1
+
+
+# engine events: timing, slow log and the per-request counts
+def instrument_profiler(engine, slow_ms: float = QUERY_SLOW_MS):
+    if not QUERY_PROFILER_ENABLED:
+        return
+
+    # every session, once for all the engines
+    if not event.contains(Session, "do_orm_execute", count_lazy_loads):
+        event.listen(Session, "do_orm_execute", count_lazy_loads)
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiler_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["profiler_started_at"].pop()
+        profiles = active_profiles.get()
+        for profile in profiles:
+            profile.record(statement, seconds)
+
+        if seconds * 1000 >= slow_ms:
+            for profile in profiles:
+                profile.slow += 1
+            logging.error(
+                f"Slow query {fingerprint(statement)} took {round(seconds * 1000, 1)}ms: "
+                f"{normalize(statement)[:1000]} parameters={redact(parameters, executemany)}")
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("profiler_started_at"):
+            conn.info["profiler_started_at"].pop()
+
+
+# test helpers
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def check_query_budget(profile: QueryProfile, max_queries: int, max_repeats: int = None):
+    problems = []
+    if profile.count > max_queries:
+        problems.append(f"{profile.count} queries, budget is {max_queries}")
+    if max_repeats is not None:
+        for key, count, statement in profile.repeated(max_repeats):
+            problems.append(f"statement {key} ran {count} times (max {max_repeats}): {statement[:300]}")
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_repeats: int = None):
+    # for code run in the same task (controllers, in-process ASGI calls):
+    #     with assert_query_budget(3, max_repeats=1):
+    #         await MovieController(db).get_by_id(1)
+    with profile_queries() as profile:
+        yield profile
+    check_query_budget(profile, max_queries, max_repeats)
+
+
+def parse_query_stats(header: str):
+    # X-Query-Stats value -> {"count": 12, "time_ms": 3.4, ...}
+    stats = {}
+    for part in header.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name:
+            stats[name] = float(value) if "." in value else int(value)
+    return stats
+
+
+def assert_response_query_budget(response, max_queries: int):
+    # for clients in another task / thread (TestClient); needs QUERY_STATS_HEADER
+    header = response.headers.get(QUERY_STATS_HEADER_NAME)
+    if header is None:
+        raise AssertionError(f"Response has no {QUERY_STATS_HEADER_NAME} header, set QUERY_STATS_HEADER=true")
+    count = parse_query_stats(header)["count"]
+    if count > max_queries:
+        raise QueryBudgetExceeded(f"{count} queries, budget is {max_queries}")
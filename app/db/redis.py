@@ -1,10 +1,59 @@
 import aioredis
 import os
+import time
+from aioredis.client import Pipeline
+from app.utils.metrics import METRICS_ENABLED, observe_redis
 
 
 REDIS_URL = os.environ.get("REDIS_URL")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
 
+# one client (and connection pool) per process
+redis_pool = None
 
-async def create_redis_pool():
-    redis_pool = await aioredis.from_url(url=REDIS_URL, encoding="utf-8", decode_responses=True)
+
+class InstrumentedPipeline(Pipeline):
+    # a pipeline is one round trip, timed as one command
+    async def execute(self, raise_on_error: bool = True):
+        started_at = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            observe_redis("MULTI" if self.is_transaction else "PIPELINE", time.perf_counter() - started_at)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    # every command (scripts included, they run as EVALSHA) is timed
+    async def execute_command(self, *args, **options):
+        started_at = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis(str(args[0]).upper(), time.perf_counter() - started_at)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def get_redis_pool():
+    global redis_pool
+    if redis_pool is None:
+        client = InstrumentedRedis if METRICS_ENABLED else aioredis.Redis
+        redis_pool = client.from_url(
+            url=REDIS_URL,
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS)
     return redis_pool
+
+
+async def create_redis_pool():
+    return get_redis_pool()
+
+
+async def close_redis_pool():
+    global redis_pool
+    if redis_pool is not None:
+        await redis_pool.close()
+        await redis_pool.connection_pool.disconnect()
+        redis_pool = None
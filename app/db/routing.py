@@ -0,0 +1,169 @@
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+import itertools
+from contextvars import ContextVar
+from sqlalchemy import text
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+# replicas further behind than this are skipped until they catch up
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", 5))
+REPLICA_CHECK_TIMEOUT = float(os.environ.get("REPLICA_CHECK_TIMEOUT", 2))
+# after a write, the client's reads stay on the primary this long
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", 10))
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+# signs the cookie, so a client can't pin its reads (or everyone's load) on the primary
+READ_YOUR_WRITES_SECRET = os.environ.get("SECRET_KEY") or ""
+
+# replay lag; 0 when caught up, so an idle primary doesn't look like lag
+REPLICA_LAG_QUERY = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+# per request: {"primary_until": epoch seconds, "wrote": bool}
+request_routing = ContextVar("request_routing", default=None)
+
+
+def sign_primary_until(until: int):
+    signature = hmac.new(READ_YOUR_WRITES_SECRET.encode(), str(until).encode(), hashlib.sha256).hexdigest()
+    return f"{until}.{signature}"
+
+
+def read_primary_until(cookie: str, window: int = READ_YOUR_WRITES_SECONDS):
+    # epoch seconds of a cookie we signed, capped at one window from now; 0 otherwise
+    until, _, signature = (cookie or "").partition(".")
+    if not until.isdigit() or not hmac.compare_digest(sign_primary_until(int(until)), cookie):
+        return 0
+    return min(int(until), time.time() + window)
+
+
+def use_primary(session):
+    # pins a (sync or async) session to the primary, e.g. for read-modify-write
+    getattr(session, "sync_session", session).info["use_primary"] = True
+
+
+def is_read(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+
+    def status(self):
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lagSeconds": self.lag,
+            "error": self.error,
+            "checkedAt": self.checked_at,
+        }
+
+
+class ReplicaRouter:
+    def __init__(self, primary: AsyncEngine, replicas: list, max_lag: float = REPLICA_MAX_LAG_SECONDS,
+                 check_interval: float = REPLICA_CHECK_INTERVAL, check_timeout: float = REPLICA_CHECK_TIMEOUT):
+        self.primary = primary
+        self.replicas = [Replica(replica) for replica in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.turn = itertools.count()
+        self.task = None
+
+    def choose_replica(self, session):
+        # round robin over the healthy ones, once per session: its reads
+        # all see the same snapshot; None -> primary
+        replica = session.info.get("replica")
+        if replica is None or not replica.healthy:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            replica = session.info["replica"] = healthy[next(self.turn) % len(healthy)]
+        return replica.engine
+
+    def get_bind(self, session, clause=None):
+        if self.replicas and is_read(clause) and not session._flushing \
+                and not session.info.get("use_primary") and not self.is_sticky():
+            replica = self.choose_replica(session)
+            if replica is not None:
+                return replica.sync_engine
+
+        if session._flushing or isinstance(clause, UpdateBase):
+            session.info["wrote"] = True
+        # reads after a write (or lock) in this session see it
+        session.info["use_primary"] = True
+        return self.primary.sync_engine
+
+    def is_sticky(self):
+        state = request_routing.get()
+        return bool(state) and state["primary_until"] > time.time()
+
+    def committed(self, session):
+        if session.info.pop("wrote", False):
+            state = request_routing.get()
+            if state is not None:
+                state["wrote"] = True
+
+    # health / lag checks
+    async def check(self, replica: Replica):
+        # log transitions (and the first result) only
+        was_healthy = None if replica.checked_at is None else replica.healthy
+        try:
+            async with replica.engine.connect() as conn:
+                lag = await asyncio.wait_for(
+                    conn.scalar(REPLICA_LAG_QUERY), timeout=self.check_timeout)
+            replica.lag = float(lag)
+            replica.error = None
+            replica.healthy = replica.lag <= self.max_lag
+        except Exception as e:
+            replica.lag = None
+            replica.error = repr(e)
+            replica.healthy = False
+        replica.checked_at = time.time()
+
+        if was_healthy != replica.healthy:
+            url = replica.engine.url.render_as_string(hide_password=True)
+            if replica.healthy:
+                logging.warning(f"Replica {url} is in rotation, lag={replica.lag}")
+            else:
+                logging.error(f"Replica {url} is out of rotation: lag={replica.lag} error={replica.error}")
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_all()
+
+    async def start(self):
+        if not self.replicas:
+            return
+        await self.check_all()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def status(self):
+        return [replica.status() for replica in self.replicas]
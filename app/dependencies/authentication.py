@@ -7,6 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_db
 from app.utils.error_handler import ErrorHandler
 from app.controllers.user import UserController
+from app.controllers.principal_cache import principal_cache
+from app.controllers.session import session_store
 from fastapi.security import HTTPBearer  # TODO Bearer
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
@@ -15,9 +17,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(
     os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
 
-def token_generator(user_id: int, scope: str):
+def token_generator(user_id: int, scope: str, jti: str):
     to_encode_data = {
         "user_id": user_id,
+        "jti": jti,  # session id, see SessionStore
         "created_at": str(datetime.now())
     }
 
@@ -40,6 +43,8 @@ def token_decoder(token: str):
 
     return {
         "user_id": payload["user_id"],
+        "jti": payload.get("jti"),
+        "exp": payload.get("exp"),
     }
 
 
@@ -55,10 +60,37 @@ async def get_token_info(auth_token: str = Header(...), db: AsyncSession = Depen
         raise ErrorHandler.user_unauthorized(
             message="Invalid authentication scheme for auth token (Use Bearer)")
 
-    token_info = token_decoder(token_value)
+    # decoded claims and user are memoized per token
+    cached_principal = principal_cache.get_local(token_value)
+    if cached_principal:
+        token_info, user = cached_principal
+    else:
+        token_info = token_decoder(token_value)
+        user = None
 
-    user_controller = UserController(db)
-    user = await user_controller.get_by_id(id=token_info["user_id"])
+    # logged out; tokens issued before sessions had a jti can't be revoked
+    if token_info["jti"] and await session_store.is_revoked(token_info["jti"]):
+        principal_cache.invalidate_token(token_value)
+        raise ErrorHandler.user_unauthorized(message="Auth token is revoked.")
+
+    if cached_principal:
+        return {
+            "user": user,
+            "token": token_value,
+            **token_info
+        }
+
+    user = await principal_cache.get_user(token_info["user_id"])
+    if not user:
+        user_controller = UserController(db)
+        user = await user_controller.get_by_id(id=token_info["user_id"])
+        if user:
+            await principal_cache.set_user(user)
+
+    if user:
+        principal_cache.set_local(token_value, token_info, user)
     return {
-        "user": user
+        "user": user,
+        "token": token_value,
+        **token_info
     }
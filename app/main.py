@@ -1,14 +1,33 @@
-from fastapi import FastAPI
-from app.db.base import create_all_tables
-from app.middleware import CustomMiddleware
+from fastapi import FastAPI, Depends
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from app.db.base import verify_schema_revision, warm_up_pool, SessionLocal, replica_router
+from app.db.redis import close_redis_pool
+from app.utils.request_logger import access_logger
+from app.utils.password_operator import password_hasher
+from app.controllers.user import UserController
+from app.controllers.search import SEARCH_BACKEND, load_movie_search_index
+from app.utils.metrics import render_metrics
+from app.middleware import (ExceptionMiddleware, RateLimitMiddleware, AccessLogMiddleware,
+                            ReadYourWritesMiddleware, MetricsMiddleware, QueryProfilerMiddleware,
+                            AccessPolicyMiddleware, DynamicCORSMiddleware)
+from app.controllers.access_policy import access_policy, CORS_ORIGINS
+from app.controllers.cast_graph import collaboration_graph
 import logging
-from fastapi.middleware.cors import CORSMiddleware
-# from app.routes.user import router as user_router
+from app.api.v1.user import router as user_router
+from app.api.v1.movie import router as movie_router
+from app.api.v1.review import router as review_router
+from app.api.v1.cast import router as cast_router
+from app.api.v1.writer import router as writer_router
+from app.api.v1.genre import router as genre_router
+from app.api.v1.leaderboard import router as leaderboard_router
+from app.api.v1.export import router as export_router
+from app.api.internal import router as internal_router, check_internal_token
 
 
 app = FastAPI(
     title="Mini IMDB",
-    description="This is a mini IMDB project which is written and developed by FastAPI."
+    description="This is a mini IMDB project which is written and developed by FastAPI.",
+    default_response_class=ORJSONResponse
 )
 
 # Logging
@@ -17,22 +36,76 @@ logging.basicConfig(filename='errors.log', level=logging.ERROR)
 
 @app.on_event("startup")
 async def startup_db():
-    await create_all_tables()
+    await verify_schema_revision()
+    await replica_router.start()
+    await warm_up_pool()
+    await access_policy.start()
+    await collaboration_graph.start()
+    access_logger.start()
+
+    # shared bloom filter of taken usernames / emails
+    try:
+        async with SessionLocal() as db:
+            await UserController(db).build_taken_names_filter()
+    except Exception as e:
+        logging.error(f"Could not build taken names filter: {e!r}")
+
+    if SEARCH_BACKEND == "memory":
+        logging.warning("SEARCH_BACKEND=memory is for development: the index isn't refreshed after startup")
+        async with SessionLocal() as db:
+            await load_movie_search_index(db)
+
+
+@app.on_event("shutdown")
+async def shutdown_redis():
+    await access_policy.stop()
+    await collaboration_graph.stop()
+    await close_redis_pool()
+    await replica_router.stop()
+    access_logger.stop()
+    password_hasher.shutdown()
+
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    return {"status": "ok"}
+
+
+# prometheus text format, per worker process
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(check_internal_token)])
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # Middlewares
-allowed_origins = [
-    "http://localhost:3000",  # TODO get from redis
-]
+# CORS_ORIGINS plus access_policy:cors_origins in redis
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allowed_origins,
+    DynamicCORSMiddleware,
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(CustomMiddleware)
+# added last = runs first: metrics -> access log -> exception mapping -> query profiler
+# -> ip access policy -> rate limit -> replica stickiness
+excluded_paths = ["/health", "/internal", "/metrics"]
+app.add_middleware(ReadYourWritesMiddleware, exclude_paths=excluded_paths)
+app.add_middleware(RateLimitMiddleware, exclude_paths=excluded_paths)
+# internal endpoints and metrics are subject to the ip rules too
+app.add_middleware(AccessPolicyMiddleware, exclude_paths=["/health"])
+app.add_middleware(QueryProfilerMiddleware, exclude_paths=excluded_paths)
+app.add_middleware(ExceptionMiddleware)
+app.add_middleware(AccessLogMiddleware, exclude_paths=excluded_paths)
+app.add_middleware(MetricsMiddleware, exclude_paths=excluded_paths)
 
 
-# # APIs
-# app.include_router(user_router, prefix="/user", tags=["User"])
+# APIs
+app.include_router(user_router, prefix="/v1/user", tags=["User"])
+app.include_router(movie_router, prefix="/v1/movies", tags=["Movie"])
+app.include_router(review_router, prefix="/v1", tags=["Review"])
+app.include_router(cast_router, prefix="/v1/casts", tags=["Cast"])
+app.include_router(writer_router, prefix="/v1/writers", tags=["Writer"])
+app.include_router(genre_router, prefix="/v1/genres", tags=["Genre"])
+app.include_router(leaderboard_router, prefix="/v1/leaderboards", tags=["Leaderboard"])
+app.include_router(export_router, prefix="/v1/export", tags=["Export"])
+app.include_router(internal_router, prefix="/internal", include_in_schema=False)
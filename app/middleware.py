@@ -1,47 +1,234 @@
-from fastapi import Request, Response, status
-from datetime import datetime
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
 from datetime import datetime
 from app.utils.error_handler import CustomException
-from app.controllers.redis import RedisController
-from fastapi.responses import JSONResponse
+from app.utils.request_logger import access_logger
+from app.controllers.rate_limiter import rate_limiter
+from app.controllers.access_policy import access_policy
+from app.utils.error_handler import ErrorHandler
+from app.db.routing import request_routing, sign_primary_until, read_primary_until, READ_YOUR_WRITES_COOKIE, \
+    READ_YOUR_WRITES_SECONDS
+from app.utils.metrics import RequestStats, request_stats, requests_in_flight, record_request, get_route
+from app.db.profiler import profile_queries, report_repeats, QUERY_STATS_HEADER, QUERY_STATS_HEADER_NAME
+from starlette.requests import cookie_parser
+from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 import logging
+import time
 
 
-class CustomMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        try:
-            # check request count per minute
-            await self.check_request_attempts(request)
+# Plain ASGI middlewares. Each concern is its own layer and can be skipped
+# for some path prefixes (e.g. health checks), e.g.:
+#   app.add_middleware(RateLimitMiddleware, exclude_paths=["/health"])
 
-            # log request info
-            self.log_request(request)
 
-            # Continue processing the request
-            response: Response = await call_next(request)
-            return response
+class ASGIMiddleware:
+    def __init__(self, app, exclude_paths=()):
+        self.app = app
+        self.exclude_paths = tuple(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.exclude_paths and scope["path"].startswith(self.exclude_paths)):
+            await self.app(scope, receive, send)
+            return
+        await self.handle(scope, receive, send)
+
+    async def handle(self, scope, receive, send):
+        raise NotImplementedError
+
+
+def get_client_ip(scope):
+    client = scope.get("client")
+    if client:
+        return client[0]
+    return None  # for unit-testing
+
+
+def get_header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ExceptionMiddleware(ASGIMiddleware):
+    async def handle(self, scope, receive, send):
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_wrapper)
         except CustomException as e:
-            return JSONResponse(status_code=e.status_code, content={"message": e.detail})
+            if response_started:
+                raise
+            response = ORJSONResponse(status_code=e.status_code, content={"message": e.detail})
+            await response(scope, receive, send)
+        except PoolTimeoutError as e:
+            # every db connection of this worker stayed busy for DB_POOL_TIMEOUT
+            logging.error(f"Database pool exhausted at {datetime.now()}: {e}")
+            if response_started:
+                raise
+            response = ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    content={"message": "Server is busy, try again later"})
+            await response(scope, receive, send)
         except Exception as e:
             logging.error(f"An error occurred at {datetime.now()}: {e}")
-            return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                                content={"message": "Something went wrong in our server!"})
-
-    def log_request(self, request: Request):
-        if request.client:
-            client_ip = request.client.host
-        else:
-            client_ip = "N/A"  # for unit-testing
-
-        current_date = str(datetime.now())
-        request_data = f"Date: {current_date}, Request Method: {request.method}, Client Ip: {client_ip} {request.headers}\n"
-        with open("request_logger.log", 'a') as log_file:
-            log_file.write(request_data)
-
-    async def check_request_attempts(self, request: Request):
-        if not request.client:
-            return  # for unit-testing
-        client_ip = request.client.host
-        redis_controller = RedisController()
-        await redis_controller.increase_request_attempts(client_ip)
+            if response_started:
+                raise
+            response = ORJSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                    content={"message": "Something went wrong in our server!"})
+            await response(scope, receive, send)
+
+
+class AccessPolicyMiddleware(ASGIMiddleware):
+    # ip allow / block rules, matched in memory (see AccessPolicy)
+    def __init__(self, app, exclude_paths=(), policy=access_policy):
+        super().__init__(app, exclude_paths)
+        self.policy = policy
+
+    async def handle(self, scope, receive, send):
+        client_ip = get_client_ip(scope)
+        if client_ip and not self.policy.is_allowed(client_ip):
+            raise ErrorHandler.blocked_ip()
+
+        await self.app(scope, receive, send)
+
+
+class DynamicCORSMiddleware(CORSMiddleware):
+    # allow_origins plus the origins the access policy loaded from redis
+    def __init__(self, app, policy=access_policy, **kwargs):
+        super().__init__(app, **kwargs)
+        self.policy = policy
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        return super().is_allowed_origin(origin) or self.policy.is_allowed_origin(origin)
+
+
+class RateLimitMiddleware(ASGIMiddleware):
+    def __init__(self, app, exclude_paths=(), limiter=rate_limiter):
+        super().__init__(app, exclude_paths)
+        self.limiter = limiter
+
+    async def handle(self, scope, receive, send):
+        # check request count per minute
+        client_ip = get_client_ip(scope)
+        if client_ip:
+            await self.limiter.check(
+                path=scope["path"],
+                client_ip=client_ip,
+                auth_token=get_header(scope, b"auth-token"))
+
+        await self.app(scope, receive, send)
+
+
+class MetricsMiddleware(ASGIMiddleware):
+    # latency per route template and the time spent in postgres / redis /
+    # bcrypt, collected through request_stats while the request runs
+    async def handle(self, scope, receive, send):
+        started_at = time.perf_counter()
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        requests_in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.dec()
+            request_stats.reset(token)
+            record_request(scope, status_code, time.perf_counter() - started_at, stats)
+
+
+class QueryProfilerMiddleware(ASGIMiddleware):
+    # flags requests that repeat one statement (N+1), optionally reports
+    # the request's query count / time in X-Query-Stats
+    def __init__(self, app, exclude_paths=(), stats_header: bool = QUERY_STATS_HEADER):
+        super().__init__(app, exclude_paths)
+        self.stats_header = stats_header
+
+    async def handle(self, scope, receive, send):
+        with profile_queries() as profile:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and self.stats_header:
+                    header = (QUERY_STATS_HEADER_NAME.encode(), profile.header().encode("latin-1"))
+                    message["headers"] = [*message.get("headers", []), header]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                report_repeats(profile, f"{scope['method']} {get_route(scope)}")
+
+
+class AccessLogMiddleware(ASGIMiddleware):
+    def __init__(self, app, exclude_paths=(), logger=access_logger):
+        super().__init__(app, exclude_paths)
+        self.logger = logger
+
+    async def handle(self, scope, receive, send):
+        started_at = time.perf_counter()
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # log request info
+            record = {
+                "date": datetime.now().isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started_at) * 1000, 3),
+                "client_ip": get_client_ip(scope) or "N/A",
+                "user_agent": get_header(scope, b"user-agent"),
+            }
+            # set by MetricsMiddleware when it runs outside of this one
+            stats = request_stats.get()
+            if stats is not None:
+                for dependency, seconds in stats.seconds.items():
+                    record[f"{dependency}_ms"] = round(seconds * 1000, 3)
+            self.logger.log(record)
+
+
+class ReadYourWritesMiddleware(ASGIMiddleware):
+    # a client that just wrote reads from the primary for a while, so it
+    # doesn't see a replica that hasn't replayed its write yet
+    def __init__(self, app, exclude_paths=(), window: int = READ_YOUR_WRITES_SECONDS):
+        super().__init__(app, exclude_paths)
+        self.window = window
+
+    async def handle(self, scope, receive, send):
+        cookies = cookie_parser(get_header(scope, b"cookie") or "")
+        primary_until = read_primary_until(cookies.get(READ_YOUR_WRITES_COOKIE), self.window)
+        state = {"primary_until": primary_until, "wrote": False}
+        token = request_routing.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["wrote"]:
+                until = int(time.time()) + self.window
+                cookie = (f"{READ_YOUR_WRITES_COOKIE}={sign_primary_until(until)}; Max-Age={self.window}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_routing.reset(token)
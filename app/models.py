@@ -1,5 +1,5 @@
-from sqlalchemy import String, Text, ForeignKey
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import String, Text, ForeignKey, Computed, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from datetime import datetime, date
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from app.db.base import Base
@@ -65,11 +65,25 @@ class User(Base):
 
 class Movie(Base):
     __tablename__ = 'movies'
+    __table_args__ = (
+        Index("ix_movies_search_vector", "searchVector", postgresql_using="gin"),
+        # array containment filters (countries @> '{US}')
+        Index("ix_movies_countries", "countries", postgresql_using="gin"),
+        Index("ix_movies_languages", "languages", postgresql_using="gin"),
+        # keyset listings, see MOVIE_ORDERS
+        Index("ix_movies_created_at_id", "createdAt", "id"),
+        Index("ix_movies_rate_id", "rate", "id"),
+        # incremental exports (updatedSince)
+        Index("ix_movies_updated_at", "updatedAt"),
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, nullable=False, autoincrement=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     rate: Mapped[float] = mapped_column(nullable=False, default=1.0)
+    # running aggregates of reviews, kept by the rating engine
+    rateSum: Mapped[int] = mapped_column(nullable=False, default=0)
+    rateCount: Mapped[int] = mapped_column(nullable=False, default=0)
     duration: Mapped[float] = mapped_column(nullable=False)
     releaseYear: Mapped[int] = mapped_column(nullable=False)
     cover: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -83,11 +97,21 @@ class Movie(Base):
         default=datetime.utcnow, nullable=False)
     updatedAt: Mapped[datetime] = mapped_column(
         default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # full-text search document, maintained by postgres (name > summary > storyline)
+    searchVector = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(summary, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(storyline, '')), 'C')",
+            persisted=True),
+        deferred=True)
 
     # relations
-    movieCast: Mapped['MovieCast'] = relationship(back_populates="movie")
-    movieWriter: Mapped['MovieWriter'] = relationship(back_populates="movie")
-    movieGenre: Mapped['MovieGenre'] = relationship(back_populates="movie")
+    movieCast: Mapped[List['MovieCast']] = relationship(back_populates="movie")
+    movieWriter: Mapped[List['MovieWriter']] = relationship(back_populates="movie")
+    movieGenre: Mapped[List['MovieGenre']] = relationship(back_populates="movie")
+    reviews: Mapped[List['Review']] = relationship(back_populates="movie")
 
 
 class Cast(Base):
@@ -107,7 +131,7 @@ class Cast(Base):
         default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     # relations
-    movieCast: Mapped['MovieCast'] = relationship(back_populates="cast")
+    movieCast: Mapped[List['MovieCast']] = relationship(back_populates="cast")
 
 
 class Writer(Base):
@@ -127,7 +151,7 @@ class Writer(Base):
         default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     # relations
-    movieWriter: Mapped['MovieWriter'] = relationship(back_populates="writer")
+    movieWriter: Mapped[List['MovieWriter']] = relationship(back_populates="writer")
 
 
 class Genre(Base):
@@ -143,16 +167,23 @@ class Genre(Base):
         default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     # relations
-    movieGenre: Mapped['MovieGenre'] = relationship(back_populates="genre")
+    movieGenre: Mapped[List['MovieGenre']] = relationship(back_populates="genre")
 
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        # one review per user and movie
+        # also serves lookups by userId alone
+        UniqueConstraint("userId", "movieId", name="uq_reviews_user_movie"),
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, nullable=False, autoincrement=True)
     userId: Mapped[int] = mapped_column(
         ForeignKey("users.id"), nullable=False)
+    movieId: Mapped[int] = mapped_column(
+        ForeignKey("movies.id"), nullable=False, index=True)
     title: Mapped[str] = mapped_column(String(255), nullable=True)
     rate: Mapped[ReviewRate] = mapped_column(nullable=False)
     text: Mapped[str] = mapped_column(Text, nullable=False)
@@ -163,6 +194,7 @@ class Review(Base):
 
     # relations
     user: Mapped[User] = relationship(back_populates="reviews")
+    movie: Mapped[Movie] = relationship(back_populates="reviews")
 
 
 class MovieCast(Base):
@@ -171,9 +203,9 @@ class MovieCast(Base):
     id: Mapped[int] = mapped_column(
         primary_key=True, nullable=False, autoincrement=True)
     castId: Mapped[int] = mapped_column(
-        ForeignKey("casts.id"), nullable=False)
+        ForeignKey("casts.id"), nullable=False, index=True)
     movieId: Mapped[int] = mapped_column(
-        ForeignKey("movies.id"), nullable=False)
+        ForeignKey("movies.id"), nullable=False, index=True)
     isStar: Mapped[bool] = mapped_column(nullable=False, default=False)
     createdAt: Mapped[datetime] = mapped_column(
         default=datetime.utcnow, nullable=False)
@@ -191,9 +223,9 @@ class MovieWriter(Base):
     id: Mapped[int] = mapped_column(
         primary_key=True, nullable=False, autoincrement=True)
     writerId: Mapped[int] = mapped_column(
-        ForeignKey("writers.id"), nullable=False)
+        ForeignKey("writers.id"), nullable=False, index=True)
     movieId: Mapped[int] = mapped_column(
-        ForeignKey("movies.id"), nullable=False)
+        ForeignKey("movies.id"), nullable=False, index=True)
     createdAt: Mapped[datetime] = mapped_column(
         default=datetime.utcnow, nullable=False)
     updatedAt: Mapped[datetime] = mapped_column(
@@ -210,9 +242,9 @@ class MovieGenre(Base):
     id: Mapped[int] = mapped_column(
         primary_key=True, nullable=False, autoincrement=True)
     genreId: Mapped[int] = mapped_column(
-        ForeignKey("genres.id"), nullable=False)
+        ForeignKey("genres.id"), nullable=False, index=True)
     movieId: Mapped[int] = mapped_column(
-        ForeignKey("movies.id"), nullable=False)
+        ForeignKey("movies.id"), nullable=False, index=True)
     createdAt: Mapped[datetime] = mapped_column(
         default=datetime.utcnow, nullable=False)
     updatedAt: Mapped[datetime] = mapped_column(
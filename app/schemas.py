@@ -1,7 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
-from app.models import Gender
-from datetime import date
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, List
+from app.models import Gender, ReviewRate
+from datetime import date, datetime
 
 
 # User
@@ -26,3 +26,271 @@ class ICreateUserController(BaseModel):
 class ILoginUser(BaseModel):
     username: str
     password: str
+
+
+class IUpdateUserBody(BaseModel):
+    username: Optional[str] = None
+    email: Optional[str] = None
+    fullname: Optional[str] = None
+    dob: Optional[str] = None
+    gender: Optional[Gender] = None
+
+
+class IUpdateUserController(BaseModel):
+    username: Optional[str] = None
+    email: Optional[str] = None
+    fullname: Optional[str] = None
+    dob: Optional[date] = None
+    gender: Optional[Gender] = None
+
+
+# responses never include hashedPassword
+class IUserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    fullname: Optional[str] = None
+    profilePic: Optional[str] = None
+    email: str
+    dob: Optional[date] = None
+    gender: Optional[Gender] = None
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class IAuthResponse(BaseModel):
+    user: IUserResponse
+    token: str
+
+
+class IUserProfileResponse(BaseModel):
+    user: IUserResponse
+
+
+class IUsernameAvailable(BaseModel):
+    available: bool
+
+
+# sessions (one per login / device)
+class ISession(BaseModel):
+    jti: str
+    device: Optional[str] = None
+    ip: Optional[str] = None
+    createdAt: int
+    expiresAt: int
+    current: bool = False
+
+
+class ISessionList(BaseModel):
+    items: List[ISession]
+
+
+class ILogoutResponse(BaseModel):
+    revoked: int
+
+
+# Movie
+class ICastCredit(BaseModel):
+    id: int
+    fullname: Optional[str] = None
+    profilePic: Optional[str] = None
+    isStar: bool = False
+
+
+class IWriterCredit(BaseModel):
+    id: int
+    fullname: Optional[str] = None
+    profilePic: Optional[str] = None
+
+
+class IGenreItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+
+
+class IMovieListItem(BaseModel):
+    id: int
+    name: str
+    rate: float
+    duration: float
+    releaseYear: int
+    cover: str
+    cast: List[ICastCredit] = []
+    writers: List[IWriterCredit] = []
+    genres: List[IGenreItem] = []
+
+
+class IMovieDetail(IMovieListItem):
+    countries: List[str]
+    languages: List[str]
+    director: str
+    summary: str
+    storyline: str
+    budget: float
+    rateCount: int
+    weightedRate: float
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class ICastMovie(BaseModel):
+    id: int
+    name: str
+    releaseYear: int
+    cover: str
+    isStar: bool = False
+
+
+class ICastPathCast(BaseModel):
+    id: int
+    fullname: Optional[str] = None
+    profilePic: Optional[str] = None
+
+
+class ICastPathMovie(BaseModel):
+    id: int
+    name: str
+    releaseYear: int
+    cover: str
+
+
+class ICastPath(BaseModel):
+    # movies in the chain; casts[i] and casts[i + 1] both played in movies[i]
+    degrees: int
+    casts: List[ICastPathCast]
+    movies: List[ICastPathMovie]
+
+
+class IWriterMovie(BaseModel):
+    id: int
+    name: str
+    releaseYear: int
+    cover: str
+
+
+class ICastDetail(BaseModel):
+    id: int
+    fullname: Optional[str] = None
+    profilePic: Optional[str] = None
+    summary: str
+    dob: Optional[date] = None
+    gender: Optional[Gender] = None
+    movies: List[ICastMovie] = []
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class IWriterDetail(BaseModel):
+    id: int
+    fullname: Optional[str] = None
+    profilePic: Optional[str] = None
+    summary: str
+    dob: Optional[date] = None
+    gender: Optional[Gender] = None
+    movies: List[IWriterMovie] = []
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class IGenreDetail(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    description: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class IMoviePage(BaseModel):
+    items: List[IMovieListItem]
+    nextCursor: Optional[str] = None
+
+
+class IMovieSearchHit(BaseModel):
+    id: int
+    name: str
+    rate: float
+    releaseYear: int
+    cover: str
+    rank: float
+    # html escaped, matched terms wrapped in <b></b>
+    nameHighlight: str
+    summaryHighlight: str
+
+
+class IMovieSearchPage(BaseModel):
+    items: List[IMovieSearchHit]
+    page: int
+    size: int
+    hasMore: bool
+
+
+class ISimilarMovie(BaseModel):
+    id: int
+    name: str
+    rate: float
+    releaseYear: int
+    cover: str
+    # cosine similarity of the credits, 0..1
+    score: float
+
+
+class ISimilarMovieList(BaseModel):
+    items: List[ISimilarMovie]
+
+
+# Review
+class ICreateReviewBody(BaseModel):
+    title: Optional[str] = None
+    rate: ReviewRate
+    text: str
+
+
+class IUpdateReviewBody(BaseModel):
+    title: Optional[str] = None
+    rate: Optional[ReviewRate] = None
+    text: Optional[str] = None
+
+
+class IReview(BaseModel):
+    id: int
+    userId: int
+    movieId: int
+    title: Optional[str] = None
+    rate: int
+    text: str
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class IMovieRating(BaseModel):
+    rate: float
+    rateCount: int
+    weightedRate: float
+
+
+class IReviewResponse(BaseModel):
+    review: IReview
+    rating: Optional[IMovieRating] = None
+
+
+class IReviewDeleteResponse(BaseModel):
+    rating: Optional[IMovieRating] = None
+
+
+# Leaderboard
+class ILeaderboardItem(BaseModel):
+    rank: int
+    id: int
+    name: str
+    cover: str
+    releaseYear: int
+    rate: float
+
+
+class ILeaderboard(BaseModel):
+    items: List[ILeaderboardItem]
@@ -0,0 +1,126 @@
+import math
+import uuid
+import hashlib
+from app.db.redis import get_redis_pool
+
+
+# a build left behind by a crashed worker stops catching adds after this
+BUILD_TTL_SECONDS = 3600
+
+# KEYS: filter, building; ARGV: bit positions. While a build runs, adds
+# go to both, so the rebuilt filter doesn't miss what was added meanwhile.
+# Neither key is created here: a filter holding only the latest adds would
+# answer "free" for everything else
+ADD_SCRIPT = """
+for k = 1, 2 do
+    if redis.call('EXISTS', KEYS[k]) == 1 then
+        for i = 1, #ARGV do
+            redis.call('SETBIT', KEYS[k], ARGV[i], 1)
+        end
+    end
+end
+return 1
+"""
+
+# KEYS: filter, building, upload
+SWAP_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('BITOP', 'OR', KEYS[2], KEYS[2], KEYS[3])
+else
+    -- another build swapped first, or this one outlived its ttl: keep what is live
+    redis.call('BITOP', 'OR', KEYS[2], KEYS[1], KEYS[3])
+end
+redis.call('DEL', KEYS[3])
+redis.call('RENAME', KEYS[2], KEYS[1])
+redis.call('PERSIST', KEYS[1])
+return 1
+"""
+
+
+def filter_size(capacity: int, error_rate: float):
+    # (bits, hash functions)
+    size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    return size, max(1, round(size / capacity * math.log(2)))
+
+
+def bit_positions(value: str, size: int, hash_count: int):
+    digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % size for i in range(hash_count)]
+
+
+class BloomFilter:
+    # bits are stored most significant bit first, the same layout redis uses
+    # for SETBIT/GETBIT, so a filter built here can be uploaded as is
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size, self.hash_count = filter_size(capacity, error_rate)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value: str):
+        return bit_positions(value, self.size, self.hash_count)
+
+    def add(self, value: str):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def __contains__(self, value: str):
+        return all(self.bits[position >> 3] & (0x80 >> (position & 7))
+                   for position in self.positions(value))
+
+
+class RedisBloomFilter:
+    # shared between workers, one round trip per check or add
+    def __init__(self, key: str, capacity: int, error_rate: float = 0.01):
+        self.key = key
+        self.building_key = f"{key}:building"
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size, self.hash_count = filter_size(capacity, error_rate)
+        self.scripts = None
+
+    @property
+    def redis_pool(self):
+        return get_redis_pool()
+
+    def get_scripts(self):
+        if self.scripts is None:
+            redis_pool = self.redis_pool
+            self.scripts = {
+                "add": redis_pool.register_script(ADD_SCRIPT),
+                "swap": redis_pool.register_script(SWAP_SCRIPT),
+            }
+        return self.scripts
+
+    def new_filter(self):
+        return BloomFilter(capacity=self.capacity, error_rate=self.error_rate)
+
+    def positions(self, value: str):
+        return bit_positions(value, self.size, self.hash_count)
+
+    async def exists(self):
+        return bool(await self.redis_pool.exists(self.key))
+
+    async def add(self, *values: str):
+        positions = [position for value in values for position in self.positions(value)]
+        await self.get_scripts()["add"](keys=[self.key, self.building_key], args=positions)
+
+    async def might_contain(self, value: str):
+        # a missing filter (not built yet, evicted, flushed) rules nothing out
+        pipe = self.redis_pool.pipeline(transaction=False)
+        pipe.exists(self.key)
+        for position in self.positions(value):
+            pipe.getbit(self.key, position)
+        exists, *bits = await pipe.execute()
+        return not exists or all(bits)
+
+    async def start_build(self):
+        # call before reading the values a new filter is built from; adds
+        # made from now on are merged into it by replace()
+        await self.redis_pool.set(self.building_key, "", ex=BUILD_TTL_SECONDS, nx=True)
+
+    async def replace(self, bloom: BloomFilter):
+        # upload a locally built filter and swap it in atomically
+        upload_key = f"{self.key}:upload:{uuid.uuid4().hex}"
+        await self.redis_pool.set(upload_key, bytes(bloom.bits), ex=BUILD_TTL_SECONDS)
+        await self.get_scripts()["swap"](keys=[self.key, self.building_key, upload_key])
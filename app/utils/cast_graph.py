@@ -0,0 +1,168 @@
+import numpy as np
+
+
+# Co-starring graph of casts and movies as two CSR adjacency arrays: the
+# movies of cast row c are cast_movies[cast_indptr[c]:cast_indptr[c + 1]],
+# the casts of movie row m are movie_casts[movie_indptr[m]:movie_indptr[m + 1]].
+# Rows are positions in the sorted cast_ids / movie_ids. Immutable: changes
+# build a new graph, which readers pick up by reference.
+
+CAST = 0
+MOVIE = 1
+
+
+def edge_keys(cast_ids, movie_ids):
+    # one int64 per credit, casts and movies both fit in 32 bits
+    return (np.asarray(cast_ids, dtype=np.int64) << 32) | np.asarray(movie_ids, dtype=np.int64)
+
+
+def csr(sources, targets, size: int):
+    # sources / targets: row of each edge's two ends
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32)
+
+
+def expand(indptr, indices, nodes):
+    # neighbors of every node, and the node each one was reached from
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    return indices[offsets], np.repeat(nodes, lengths)
+
+
+class Search:
+    # one side of a bidirectional search; the visited flags are zeroed
+    # pages and parents / depths are only read where visited is set, so
+    # a query costs nothing per node of the graph it never reaches
+    def __init__(self, graph, root: int):
+        self.visited = (np.zeros(len(graph.cast_ids), dtype=bool), np.zeros(len(graph.movie_ids), dtype=bool))
+        self.parent = (np.empty(len(graph.cast_ids), dtype=np.int32), np.empty(len(graph.movie_ids), dtype=np.int32))
+        self.depth = (np.empty(len(graph.cast_ids), dtype=np.int32), np.empty(len(graph.movie_ids), dtype=np.int32))
+        self.visited[CAST][root] = True
+        self.parent[CAST][root] = -1
+        self.depth[CAST][root] = 0
+        self.frontier = np.asarray([root], dtype=np.int32)
+        self.kind = CAST
+        self.level = 0
+
+    def path_to(self, kind: int, row: int):
+        # [(kind, row)] from the root to the node
+        path = [(kind, row)]
+        while self.parent[kind][row] >= 0:
+            row = int(self.parent[kind][row])
+            kind = 1 - kind
+            path.append((kind, row))
+        return path[::-1]
+
+
+class CastGraph:
+    def __init__(self, cast_ids, movie_ids, cast_indptr, cast_movies, movie_indptr, movie_casts):
+        self.cast_ids = cast_ids
+        self.movie_ids = movie_ids
+        self.cast_indptr = cast_indptr
+        self.cast_movies = cast_movies
+        self.movie_indptr = movie_indptr
+        self.movie_casts = movie_casts
+
+    @classmethod
+    def from_keys(cls, keys):
+        keys = np.unique(keys)
+        cast_ids, cast_rows = np.unique(keys >> 32, return_inverse=True)
+        movie_ids, movie_rows = np.unique(keys & 0xFFFFFFFF, return_inverse=True)
+        cast_indptr, cast_movies = csr(cast_rows, movie_rows, len(cast_ids))
+        movie_indptr, movie_casts = csr(movie_rows, cast_rows, len(movie_ids))
+        return cls(cast_ids, movie_ids, cast_indptr, cast_movies, movie_indptr, movie_casts)
+
+    @classmethod
+    def from_credits(cls, cast_ids, movie_ids):
+        # one (cast id, movie id) per credit, a cast credited twice in a movie is one edge
+        return cls.from_keys(edge_keys(cast_ids, movie_ids))
+
+    def keys(self):
+        # sorted: casts are in id order and so are the movies of each cast
+        casts = np.repeat(self.cast_ids, np.diff(self.cast_indptr))
+        return edge_keys(casts, self.movie_ids[self.cast_movies])
+
+    def with_changes(self, added=(), removed=()):
+        # [(cast id, movie id)] -> a new graph
+        keys = self.keys()
+        if removed:
+            removed = edge_keys(*zip(*removed))
+            positions = np.searchsorted(keys, removed).clip(max=max(len(keys) - 1, 0))
+            if len(keys):
+                keys = np.delete(keys, positions[keys[positions] == removed])
+        if added:
+            keys = np.concatenate([keys, edge_keys(*zip(*added))])
+        return self.from_keys(keys)
+
+    @property
+    def credits(self):
+        return len(self.cast_movies)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.cast_ids, self.movie_ids, self.cast_indptr,
+                                               self.cast_movies, self.movie_indptr, self.movie_casts))
+
+    def cast_row(self, cast_id: int):
+        row = int(np.searchsorted(self.cast_ids, cast_id))
+        if row < len(self.cast_ids) and self.cast_ids[row] == cast_id:
+            return row
+        return None
+
+    def adjacency(self, kind: int):
+        if kind == CAST:
+            return self.cast_indptr, self.cast_movies
+        return self.movie_indptr, self.movie_casts
+
+    def shortest_path(self, source_id: int, target_id: int, max_degrees: int = 6):
+        # [cast id, movie id, cast id, ...] with the fewest movies in
+        # between, or None; bidirectional BFS, a level at a time, always
+        # growing the side whose next level is cheaper
+        source, target = self.cast_row(source_id), self.cast_row(target_id)
+        if source is None or target is None:
+            return None
+        if source == target:
+            return [source_id]
+
+        forward, backward = Search(self, source), Search(self, target)
+        # cast -> movie -> cast is one degree, two levels
+        while forward.level + backward.level < 2 * max_degrees:
+            sides = []
+            for side in (forward, backward):
+                indptr, _ = self.adjacency(side.kind)
+                if len(side.frontier):
+                    sides.append((int((indptr[side.frontier + 1] - indptr[side.frontier]).sum()), side))
+            if len(sides) < 2:
+                # one side ran out: the casts aren't connected
+                return None
+            _, side = min(sides, key=lambda item: item[0])
+            other = backward if side is forward else forward
+
+            indptr, indices = self.adjacency(side.kind)
+            kind = 1 - side.kind
+            nodes, parents = expand(indptr, indices, side.frontier)
+            new = ~side.visited[kind][nodes]
+            nodes, first = np.unique(nodes[new], return_index=True)
+            parents = parents[new][first]
+
+            side.level += 1
+            side.visited[kind][nodes] = True
+            side.parent[kind][nodes] = parents
+            side.depth[kind][nodes] = side.level
+            side.frontier, side.kind = nodes, kind
+
+            met = nodes[other.visited[kind][nodes]]
+            if len(met):
+                # the meeting node the other side reached soonest
+                meeting = int(met[np.argmin(other.depth[kind][met])])
+                path = side.path_to(kind, meeting) + other.path_to(kind, meeting)[::-1][1:]
+                if side is backward:
+                    path = path[::-1]
+                if len(path) - 1 > 2 * max_degrees:
+                    return None
+                return [int(self.cast_ids[row] if node_kind == CAST else self.movie_ids[row])
+                        for node_kind, row in path]
+        return None
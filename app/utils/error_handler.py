@@ -5,8 +5,7 @@ from fastapi import status, HTTPException
 
 class CustomException(HTTPException):
     def __init__(self, status_code: int, detail: str):
-        self.status_code = status_code
-        self.detail = detail
+        super().__init__(status_code=status_code, detail=detail)
 
 
 class ErrorHandler:
@@ -47,3 +46,8 @@ class ErrorHandler:
     def too_many_request():
         raise CustomException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many request")
+
+    @staticmethod
+    def service_unavailable():
+        raise CustomException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, try again later")
@@ -0,0 +1,255 @@
+import os
+import time
+import bisect
+from contextvars import ContextVar
+from sqlalchemy import event
+from app.db.pool import WAIT_BUCKETS
+
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+# upper bounds (seconds) of the latency histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# time spent outside the route's own code, per request
+DEPENDENCIES = ("postgres", "redis", "bcrypt")
+
+# label of requests that matched no route (404s, rejected before routing),
+# raw paths would make the label set unbounded
+UNMATCHED_ROUTE = "unmatched"
+
+
+# Everything is recorded on the event loop thread with no await between
+# reading and writing a value, so concurrent requests never interleave
+# inside an update and no locks are needed. Values are per worker process;
+# scrape every worker.
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple, extra: str = None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self):
+        lines = self.header()
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, label_values: tuple = (), amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, label_values: tuple = (), amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, label_values: tuple = (), amount: float = 1):
+        self.inc(label_values, -amount)
+
+    def set(self, label_values: tuple = (), value: float = 0):
+        self.values[label_values] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, label_values: tuple, value: float):
+        # [bucket counts..., +Inf count], sum
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = self.header()
+        for label_values, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = format_labels(self.labels, label_values, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        # callables returning more exposition lines at scrape time
+        self.collectors = []
+
+    def add(self, metric: Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, description: str, labels: tuple = ()):
+        return self.add(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: tuple = ()):
+        return self.add(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        return self.add(Histogram(name, description, labels, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests being served")
+requests_total = registry.counter(
+    "http_requests_total", "Requests served", ("method", "route", "status"))
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Request latency", ("method", "route"))
+dependency_seconds = registry.counter(
+    "http_request_dependency_seconds_total", "Time requests spent waiting on a dependency",
+    ("route", "dependency"))
+dependency_calls = registry.counter(
+    "http_request_dependency_calls_total", "SQL statements, redis commands and password hashes of requests",
+    ("route", "dependency"))
+sql_duration = registry.histogram(
+    "db_statement_duration_seconds", "SQL statement latency", ("database",))
+redis_duration = registry.histogram(
+    "redis_command_duration_seconds", "Redis command latency", ("command",))
+
+
+class RequestStats:
+    # dependency time of the request being served, see request_stats
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self):
+        self.calls = dict.fromkeys(DEPENDENCIES, 0)
+        self.seconds = dict.fromkeys(DEPENDENCIES, 0.0)
+
+    def record(self, dependency: str, seconds: float):
+        self.calls[dependency] += 1
+        self.seconds[dependency] += seconds
+
+
+request_stats = ContextVar("request_stats", default=None)
+
+
+def record_dependency(dependency: str, seconds: float):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.record(dependency, seconds)
+
+
+def get_route(scope):
+    # the template (/v1/movies/{movie_id}), set by the router once it matched
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def record_request(scope, status_code: int, seconds: float, stats: RequestStats):
+    route = get_route(scope)
+    method = scope["method"]
+    requests_total.inc((method, route, str(status_code)))
+    request_duration.observe((method, route), seconds)
+    for dependency in DEPENDENCIES:
+        if stats.calls[dependency]:
+            dependency_calls.inc((route, dependency), stats.calls[dependency])
+            dependency_seconds.inc((route, dependency), stats.seconds[dependency])
+
+
+# SQL: timed between the cursor events, started_at is kept on the connection
+def instrument_engine(engine, database: str):
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["metrics_started_at"].pop()
+        sql_duration.observe((database,), seconds)
+        record_dependency("postgres", seconds)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(exception_context):
+        # the failed statement never reaches after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_started_at"):
+            seconds = time.perf_counter() - conn.info["metrics_started_at"].pop()
+            sql_duration.observe((database,), seconds)
+            record_dependency("postgres", seconds)
+
+
+def pool_metric_lines(engines: dict):
+    # database name -> engine with an InstrumentedQueuePool, read at scrape time
+    checked_out = Gauge("db_pool_checked_out", "Connections in use", ("database",))
+    overflow = Gauge("db_pool_overflow", "Connections open beyond the pool size", ("database",))
+    timeouts = Counter("db_pool_timeouts_total", "Checkouts that gave up waiting", ("database",))
+    wait = Histogram("db_pool_wait_seconds", "Time checkouts waited for a connection",
+                     ("database",), WAIT_BUCKETS)
+    for database, engine in engines.items():
+        pool = engine.sync_engine.pool
+        stats = pool.stats
+        checked_out.set((database,), pool.checkedout())
+        overflow.set((database,), max(pool.overflow(), 0))
+        timeouts.inc((database,), stats.timeouts)
+        wait.values[(database,)] = [list(stats.wait_buckets), stats.wait_total]
+
+    return checked_out.render() + overflow.render() + timeouts.render() + wait.render()
+
+
+def observe_redis(command: str, seconds: float):
+    redis_duration.observe((command,), seconds)
+    record_dependency("redis", seconds)
+
+
+def observe_password_hash(seconds: float):
+    record_dependency("bcrypt", seconds)
+
+
+def render_metrics():
+    return registry.render()
@@ -1,12 +1,86 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from passlib.context import CryptContext
+from app.utils.error_handler import ErrorHandler
+from app.utils.metrics import observe_password_hash
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", 32))
+
+
+# hashes made with other rounds are reported as needing an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=PASSWORD_BCRYPT_ROUNDS)
 
 
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str):
     return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    # runs bcrypt off the event loop; once every worker is busy and the
+    # queue is full, new work is rejected with 503 instead of piling up
+    def __init__(self, executor: str = PASSWORD_HASH_EXECUTOR, workers: int = PASSWORD_HASH_WORKERS,
+                 queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.executor_type = executor
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.pending = 0
+        self.rejected = 0
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            if self.executor_type == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hasher")
+        return self.executor
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ErrorHandler.service_unavailable()
+
+        self.pending += 1
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            # queueing for a worker included, that's what the request waits
+            observe_password_hash(time.perf_counter() - started_at)
+
+    async def hash(self, password: str):
+        return await self.run(get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        # returns (is_valid, new_hash or None)
+        return await self.run(verify_and_update_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+
+
+REQUEST_LOG_PATH = os.environ.get("REQUEST_LOG_PATH", "request_logger.log")
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get("REQUEST_LOG_QUEUE_SIZE", 10000))
+REQUEST_LOG_BATCH_SIZE = int(os.environ.get("REQUEST_LOG_BATCH_SIZE", 500))
+REQUEST_LOG_FLUSH_INTERVAL = float(
+    os.environ.get("REQUEST_LOG_FLUSH_INTERVAL", 1))
+REQUEST_LOG_MAX_BYTES = int(
+    os.environ.get("REQUEST_LOG_MAX_BYTES", 50 * 1024 * 1024))
+REQUEST_LOG_ROTATE_INTERVAL = int(
+    os.environ.get("REQUEST_LOG_ROTATE_INTERVAL", 24 * 60 * 60))
+REQUEST_LOG_BACKUP_COUNT = int(os.environ.get("REQUEST_LOG_BACKUP_COUNT", 7))
+
+
+class AccessLogger:
+    # requests are queued in memory and written as json lines by one
+    # background thread, so the event loop never touches the disk
+    def __init__(
+            self,
+            path: str = REQUEST_LOG_PATH,
+            queue_size: int = REQUEST_LOG_QUEUE_SIZE,
+            batch_size: int = REQUEST_LOG_BATCH_SIZE,
+            flush_interval: float = REQUEST_LOG_FLUSH_INTERVAL,
+            max_bytes: int = REQUEST_LOG_MAX_BYTES,
+            rotate_interval: int = REQUEST_LOG_ROTATE_INTERVAL,
+            backup_count: int = REQUEST_LOG_BACKUP_COUNT):
+        self.path = path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+
+        self.dropped = 0
+        self.written = 0
+        self.reported_dropped = 0
+        self.file = None
+        self.opened_at = 0
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="access-logger", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5):
+        if not self.thread:
+            return
+        self.stopping.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def log(self, record: dict):
+        # never block the caller, count what we could not keep
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    def _run(self):
+        while not self.stopping.is_set() or not self.queue.empty():
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logging.error(f"Access logger could not write batch: {e!r}")
+
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        if self.dropped != self.reported_dropped:
+            batch.append({
+                "event": "access_log_dropped",
+                "count": self.dropped - self.reported_dropped,
+                "date": time.time(),
+            })
+            self.reported_dropped = self.dropped
+
+        lines = "".join(json.dumps(record, default=str) +
+                        "\n" for record in batch)
+
+        self._rotate_if_needed()
+        self.file.write(lines)
+        self.file.flush()
+        self.written += len(batch)
+
+    def _rotate_if_needed(self):
+        if self.file:
+            too_big = self.file.tell() >= self.max_bytes
+            too_old = time.time() - self.opened_at >= self.rotate_interval
+            if not (too_big or too_old):
+                return
+            self.file.close()
+            self.file = None
+            self._shift_backups()
+
+        self.file = open(self.path, "a")
+        self.opened_at = time.time()
+
+    def _shift_backups(self):
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+access_logger = AccessLogger()
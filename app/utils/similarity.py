@@ -0,0 +1,201 @@
+import os
+import numpy as np
+import scipy.sparse as sp
+
+
+# Item-item similarity over a sparse movie x feature matrix: every row is a
+# movie, every column a feature ("cast:12", "genre:3", "country:us"),
+# weighted by the feature kind and its idf and L2 normalized, so a block of
+# rows times the transposed matrix is the cosine similarity of those movies
+# with every movie.
+
+
+def smooth_idf(document_frequency, documents: int):
+    # rare features (one actor) say more than common ones (Drama)
+    return (np.log((1 + documents) / (1 + np.asarray(document_frequency))) + 1).astype(np.float32)
+
+
+def normalize_rows(matrix):
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float32).ravel())
+    norms[norms == 0] = 1
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+    return matrix
+
+
+def row_blocks(rows, document_frequency, max_nnz: int):
+    # consecutive row ranges whose product with the transposed matrix has at
+    # most about max_nnz entries; a row's share is bounded by the movies
+    # sharing each of its features, so one blockbuster genre doesn't blow
+    # the memory
+    binary = rows.copy()
+    binary.data[:] = 1
+    cost = np.cumsum(binary @ document_frequency)
+
+    start, count = 0, rows.shape[0]
+    while start < count:
+        spent = cost[start - 1] if start else 0
+        end = int(np.searchsorted(cost, spent + max_nnz, side="right"))
+        end = min(max(end, start + 1), count)
+        yield start, end
+        start = end
+
+
+def top_k(scores, k: int, own_columns):
+    # best k columns of every row of a csr score block, the row's own movie
+    # left out; rows with fewer candidates are padded with -1 / 0
+    neighbors = np.full((scores.shape[0], k), -1, dtype=np.int32)
+    values = np.zeros((scores.shape[0], k), dtype=np.float32)
+    indptr, indices, data = scores.indptr, scores.indices, scores.data
+    for row in range(scores.shape[0]):
+        columns = indices[indptr[row]:indptr[row + 1]]
+        row_scores = data[indptr[row]:indptr[row + 1]]
+        keep = (columns != own_columns[row]) & (row_scores > 0)
+        columns, row_scores = columns[keep], row_scores[keep]
+        if len(columns) > k:
+            best = np.argpartition(-row_scores, k - 1)[:k]
+            columns, row_scores = columns[best], row_scores[best]
+        # highest score first, lower row (older movie) first on a tie
+        order = np.lexsort((columns, -row_scores))
+        neighbors[row, :len(order)] = columns[order]
+        values[row, :len(order)] = row_scores[order]
+    return neighbors, values
+
+
+class SimilarityModel:
+    # the normalized matrix, its vocabulary and idf, and the top k neighbors
+    # (row positions) and scores of every movie; saved between jobs so a
+    # refresh only recomputes the movies a change can reach
+    def __init__(self, movie_ids, features, idf, matrix, neighbors, scores, max_nnz: int):
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.features = list(features)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.matrix = matrix
+        self.neighbors = neighbors
+        self.scores = scores
+        self.k = neighbors.shape[1]
+        self.max_nnz = max_nnz
+        self.row_of = {int(movie_id): row for row, movie_id in enumerate(self.movie_ids)}
+        self.column_of = {feature: column for column, feature in enumerate(self.features)}
+
+    @classmethod
+    def build(cls, movie_ids, features, rows, columns, weights, k: int, max_nnz: int):
+        # rows / columns index movie_ids / features, one entry per credit
+        shape = (len(movie_ids), len(features))
+        raw = sp.csr_matrix((np.asarray(weights, dtype=np.float32),
+                             (np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64))),
+                            shape=shape)
+        raw.sum_duplicates()
+        idf = smooth_idf(np.diff(raw.tocsc().indptr), shape[0])
+        matrix = normalize_rows(raw @ sp.diags(idf))
+
+        model = cls(movie_ids, features, idf, matrix,
+                    np.full((shape[0], k), -1, dtype=np.int32), np.zeros((shape[0], k), dtype=np.float32),
+                    max_nnz)
+        model.recompute(np.arange(shape[0]))
+        return model
+
+    def recompute(self, rows):
+        # top k of the given rows against the whole catalog, block by block
+        rows = np.asarray(rows, dtype=np.int64)
+        subset = self.matrix[rows]
+        transposed = self.matrix.T.tocsr()
+        document_frequency = np.diff(transposed.indptr).astype(np.int64)
+        for start, end in row_blocks(subset, document_frequency, self.max_nnz):
+            block = (subset[start:end] @ transposed).tocsr()
+            neighbors, scores = top_k(block, self.k, rows[start:end])
+            self.neighbors[rows[start:end]] = neighbors
+            self.scores[rows[start:end]] = scores
+
+    def similar(self, movie_id: int):
+        # [(movie id, score)], best first
+        row = self.row_of.get(movie_id)
+        if row is None:
+            return []
+        valid = self.neighbors[row] >= 0
+        return [(int(self.movie_ids[neighbor]), float(score))
+                for neighbor, score in zip(self.neighbors[row][valid], self.scores[row][valid])]
+
+    def vectors(self, feature_weights: list):
+        # one normalized row per {feature: weight}; idf is kept until the
+        # next build, features never seen count as seen once
+        new_features = {feature for weights in feature_weights for feature in weights
+                        if feature not in self.column_of}
+        for feature in sorted(new_features):
+            self.column_of[feature] = len(self.features)
+            self.features.append(feature)
+        if new_features:
+            self.idf = np.concatenate(
+                [self.idf, np.full(len(new_features), smooth_idf(1, len(self.movie_ids))[()], dtype=np.float32)])
+            self.matrix.resize((self.matrix.shape[0], len(self.features)))
+
+        rows, columns, weights = [], [], []
+        for row, feature_weight in enumerate(feature_weights):
+            for feature, weight in feature_weight.items():
+                rows.append(row)
+                columns.append(self.column_of[feature])
+                weights.append(weight * self.idf[self.column_of[feature]])
+        vectors = sp.csr_matrix((np.asarray(weights, dtype=np.float32), (rows, columns)),
+                                shape=(len(feature_weights), len(self.features)))
+        return normalize_rows(vectors)
+
+    def update(self, changes: dict):
+        # movie id -> {feature: weight}, or None for a deleted movie.
+        # Replaces their rows and recomputes the top k of every movie whose
+        # list they were in or could now enter; returns those movie ids
+        changes = {movie_id: weights for movie_id, weights in changes.items()
+                   if weights is not None or movie_id in self.row_of}
+        if not changes:
+            return []
+        new_ids = [movie_id for movie_id in changes if movie_id not in self.row_of]
+        if new_ids:
+            for index, movie_id in enumerate(new_ids):
+                self.row_of[movie_id] = len(self.movie_ids) + index
+            self.movie_ids = np.concatenate([self.movie_ids, np.asarray(new_ids, dtype=np.int64)])
+            self.matrix.resize((len(self.movie_ids), self.matrix.shape[1]))
+            self.neighbors = np.vstack([self.neighbors, np.full((len(new_ids), self.k), -1, dtype=np.int32)])
+            self.scores = np.vstack([self.scores, np.zeros((len(new_ids), self.k), dtype=np.float32)])
+
+        changed_rows = np.asarray([self.row_of[movie_id] for movie_id in changes], dtype=np.int64)
+        vectors = self.vectors([weights or {} for weights in changes.values()])
+
+        # swap the rows: drop the old ones, add the new ones in their place
+        kept = np.ones(self.matrix.shape[0], dtype=np.float32)
+        kept[changed_rows] = 0
+        placed = sp.csr_matrix(
+            (np.ones(len(changed_rows), dtype=np.float32), (changed_rows, np.arange(len(changed_rows)))),
+            shape=(self.matrix.shape[0], len(changed_rows)))
+        self.matrix = (sp.diags(kept) @ self.matrix + placed @ vectors).tocsr()
+        self.matrix.eliminate_zeros()
+
+        # movies listing a changed one, and movies it now beats the k-th of
+        affected = np.isin(self.neighbors, changed_rows).any(axis=1)
+        affected[changed_rows] = True
+        new_scores = (vectors @ self.matrix.T).tocsr()
+        threshold = self.scores[:, -1]
+        for row in range(new_scores.shape[0]):
+            columns = new_scores.indices[new_scores.indptr[row]:new_scores.indptr[row + 1]]
+            values = new_scores.data[new_scores.indptr[row]:new_scores.indptr[row + 1]]
+            affected[columns[values > threshold[columns]]] = True
+
+        rows = np.flatnonzero(affected)
+        self.recompute(rows)
+        return [int(movie_id) for movie_id in self.movie_ids[rows]]
+
+    def save(self, path: str):
+        # written next to the old one and renamed, readers never see half a file
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(file, movie_ids=self.movie_ids, features=np.asarray(self.features, dtype=str),
+                     idf=self.idf, data=self.matrix.data, indices=self.matrix.indices,
+                     indptr=self.matrix.indptr, shape=np.asarray(self.matrix.shape),
+                     neighbors=self.neighbors, scores=self.scores, max_nnz=self.max_nnz)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as arrays:
+            matrix = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                   shape=tuple(arrays["shape"]))
+            return cls(arrays["movie_ids"], arrays["features"].tolist(), arrays["idf"], matrix,
+                       arrays["neighbors"], arrays["scores"], int(arrays["max_nnz"]))
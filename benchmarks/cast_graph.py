@@ -0,0 +1,83 @@
+# Memory footprint, build / delta time and shortest path latency of the
+# in-memory cast graph on a synthetic catalog (no postgres needed): a few
+# prolific casts credited in thousands of movies, a long tail in one or two.
+#
+#   python -m benchmarks.cast_graph --credits 1000000 --queries 2000
+
+import argparse
+import json
+import time
+import numpy as np
+from app.utils.cast_graph import CastGraph
+
+
+def make_credits(credits: int, casts: int, movies: int, rng):
+    # zipf-like cast popularity, movies drawn uniformly
+    weights = 1 / np.arange(1, casts + 1) ** 0.8
+    cast_ids = rng.choice(casts, size=credits, p=weights / weights.sum()) + 1
+    movie_ids = rng.integers(1, movies + 1, size=credits)
+    return cast_ids, movie_ids
+
+
+def percentile(timings, p):
+    return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+
+def run(credits: int, casts: int, movies: int, queries: int, max_degrees: int, seed: int):
+    rng = np.random.default_rng(seed)
+    cast_ids, movie_ids = make_credits(credits, casts, movies, rng)
+
+    started_at = time.perf_counter()
+    graph = CastGraph.from_credits(cast_ids, movie_ids)
+    build_seconds = time.perf_counter() - started_at
+
+    # a batch of deltas, as a worker applies them between rebuilds
+    added = list(zip(*make_credits(1000, casts, movies, rng)))
+    removed = list(zip(cast_ids[:1000].tolist(), movie_ids[:1000].tolist()))
+    started_at = time.perf_counter()
+    graph.with_changes(added, removed)
+    delta_seconds = time.perf_counter() - started_at
+
+    timings, degrees = [], []
+    sources = rng.choice(graph.cast_ids, size=queries)
+    targets = rng.choice(graph.cast_ids, size=queries)
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        started_at = time.perf_counter()
+        path = graph.shortest_path(source, target, max_degrees)
+        timings.append(time.perf_counter() - started_at)
+        if path is not None:
+            degrees.append(len(path) // 2)
+    timings.sort()
+
+    return {
+        "credits": graph.credits,
+        "casts": len(graph.cast_ids),
+        "movies": len(graph.movie_ids),
+        "bytes": graph.nbytes,
+        "bytes_per_credit": round(graph.nbytes / graph.credits, 1),
+        "build_seconds": build_seconds,
+        "delta_1000_seconds": delta_seconds,
+        "queries": queries,
+        "found": len(degrees),
+        "mean_degrees": round(sum(degrees) / len(degrees), 2) if degrees else None,
+        "p50_ms": percentile(timings, 0.5),
+        "p95_ms": percentile(timings, 0.95),
+        "p99_ms": percentile(timings, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--credits", type=int, default=1000000)
+    parser.add_argument("--casts", type=int, default=300000)
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-degrees", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(run(args.credits, args.casts, args.movies, args.queries,
+                         args.max_degrees, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Local stand-ins for the app's backing services, shared by the benchmarks
+# that go through the app itself (micro, load, suite):
+#
+#   - a fake redis (fakeredis, with lua for the rate limiter / cache scripts)
+#   - a throwaway SQLite database (aiosqlite), or the Postgres given in
+#     BENCH_DATABASE_URL (an empty database migrated with `alembic upgrade head`)
+#
+# The app reads its settings at import time, so this module has to be
+# imported before anything from app.
+#
+#   pip install -r benchmarks/requirements.txt
+
+import os
+import tempfile
+import random
+from datetime import datetime, timedelta
+
+BENCH_WORKDIR = os.environ.get("BENCH_WORKDIR") or tempfile.mkdtemp(prefix="imdb-bench-")
+BENCH_DATABASE_URL = os.environ.get(
+    "BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{BENCH_WORKDIR}/bench.db")
+
+# never the configured database / redis / log
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["REQUEST_LOG_PATH"] = f"{BENCH_WORKDIR}/request_logger.log"
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("PASSWORD_BCRYPT_ROUNDS", "12")
+# the limiter still runs on every request; the load driver varies the client
+# ip for anonymous requests, a few tokens would otherwise run dry
+os.environ.setdefault("RATE_LIMIT_AUTHENTICATED_CAPACITY", str(10 ** 9))
+
+import fakeredis  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+import app.db.redis  # noqa: E402
+from app.db.base import Base, engine  # noqa: E402
+from app.models import Movie, Cast, Writer, Genre, MovieCast, MovieWriter, MovieGenre  # noqa: E402
+
+
+# sqlite has no ARRAY / TSVECTOR; arrays are stored as '' which reads back as []
+SQLITE_MOVIES_DDL = (
+    """
+    CREATE TABLE movies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL,
+        rate FLOAT NOT NULL,
+        "rateSum" INTEGER NOT NULL,
+        "rateCount" INTEGER NOT NULL,
+        duration FLOAT NOT NULL,
+        "releaseYear" INTEGER NOT NULL,
+        cover VARCHAR(255) NOT NULL,
+        countries TEXT NOT NULL,
+        languages TEXT NOT NULL,
+        director VARCHAR NOT NULL,
+        summary TEXT NOT NULL,
+        storyline TEXT NOT NULL,
+        budget FLOAT NOT NULL,
+        "createdAt" DATETIME NOT NULL,
+        "updatedAt" DATETIME NOT NULL,
+        "searchVector" TEXT
+    )
+    """,
+    'CREATE INDEX ix_movies_created_at_id ON movies ("createdAt", id)',
+    "CREATE INDEX ix_movies_rate_id ON movies (rate, id)",
+)
+
+
+def install_fake_redis():
+    # every get_redis_pool() caller shares it, like the real per-process client
+    app.db.redis.redis_pool = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return app.db.redis.redis_pool
+
+
+def is_sqlite():
+    return engine.url.get_backend_name() == "sqlite"
+
+
+async def create_schema():
+    # postgres is expected to be migrated already
+    if not is_sqlite():
+        return
+    async with engine.begin() as conn:
+        # concurrent writers wait on each other instead of failing
+        await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        for statement in SQLITE_MOVIES_DDL:
+            await conn.exec_driver_sql(statement)
+        tables = [table for table in Base.metadata.sorted_tables if table.name != "movies"]
+        await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+
+
+def movie_rows(movies: int, rng: random.Random):
+    started_at = datetime.utcnow() - timedelta(days=movies)
+    for i in range(movies):
+        rate_count = rng.randint(0, 500)
+        rate_sum = sum(rng.randint(1, 5) for _ in range(min(rate_count, 20))) * rate_count // 20
+        yield {
+            "name": f"Movie {i}",
+            "rate": round(rate_sum / rate_count, 2) if rate_count else 1.0,
+            "rateSum": rate_sum,
+            "rateCount": rate_count,
+            "duration": float(rng.randint(80, 180)),
+            "releaseYear": rng.randint(1950, 2024),
+            "cover": f"covers/{i}.jpg",
+            "director": f"Director {rng.randint(0, movies // 10)}",
+            "summary": "summary " * 30,
+            "storyline": "storyline " * 100,
+            "budget": float(rng.randint(1, 200) * 1e6),
+            "createdAt": started_at + timedelta(days=i),
+            "updatedAt": started_at + timedelta(days=i),
+        }
+
+
+async def insert_movies(conn, rows: list):
+    if not is_sqlite():
+        await conn.execute(insert(Movie), [
+            {**row, "countries": ["US"], "languages": ["English"]} for row in rows])
+        return
+    columns = list(rows[0]) + ["countries", "languages"]
+    statement = "INSERT INTO movies ({}) VALUES ({})".format(
+        ", ".join(f'"{column}"' for column in columns), ", ".join("?" for _ in columns))
+    await conn.exec_driver_sql(statement, [
+        (*(str(value) if isinstance(value, datetime) else value for value in row.values()), "", "")
+        for row in rows])
+
+
+async def seed_catalog(movies: int = 1000, casts: int = 500, writers: int = 100, genres: int = 20,
+                       credits: int = 8, seed: int = 0):
+    # deterministic for a given seed, so runs on different commits compare
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    async with engine.begin() as conn:
+        await insert_movies(conn, list(movie_rows(movies, rng)))
+        await conn.execute(insert(Cast), [
+            {"fullname": f"Cast {i}", "summary": "summary", "createdAt": now, "updatedAt": now}
+            for i in range(casts)])
+        await conn.execute(insert(Writer), [
+            {"fullname": f"Writer {i}", "summary": "summary", "createdAt": now, "updatedAt": now}
+            for i in range(writers)])
+        await conn.execute(insert(Genre), [
+            {"title": f"Genre {i}", "createdAt": now, "updatedAt": now} for i in range(genres)])
+
+        movie_cast, movie_writers, movie_genres = [], [], []
+        for movie_id in range(1, movies + 1):
+            for position, cast_id in enumerate(rng.sample(range(1, casts + 1), credits)):
+                movie_cast.append({"movieId": movie_id, "castId": cast_id, "isStar": position < 2,
+                                   "createdAt": now, "updatedAt": now})
+            for writer_id in rng.sample(range(1, writers + 1), 2):
+                movie_writers.append({"movieId": movie_id, "writerId": writer_id,
+                                      "createdAt": now, "updatedAt": now})
+            for genre_id in rng.sample(range(1, genres + 1), 3):
+                movie_genres.append({"movieId": movie_id, "genreId": genre_id,
+                                     "createdAt": now, "updatedAt": now})
+        await conn.execute(insert(MovieCast), movie_cast)
+        await conn.execute(insert(MovieWriter), movie_writers)
+        await conn.execute(insert(MovieGenre), movie_genres)
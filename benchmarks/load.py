@@ -0,0 +1,216 @@
+# In-process load driver: concurrent clients call the full app (every
+# middleware, dependency and route) over ASGI, no server or sockets, against
+# the stand-ins in benchmarks.fixtures. Reports throughput and latency
+# percentiles per scenario.
+#
+#   python -m benchmarks.load --requests 2000 --concurrency 32
+#   python -m benchmarks.load --scenario login --scenario movie_detail
+
+from benchmarks import fixtures  # noqa: F401, sets up the environment first
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+import orjson
+from app.main import app
+from app.db.base import SessionLocal, engine
+from app.utils.request_logger import access_logger
+from app.utils.password_operator import password_hasher
+from app.controllers.user import UserController
+from app.controllers.leaderboard import LeaderboardController
+from benchmarks.micro import summarize
+
+PASSWORD = "Benchmark1!"
+
+# every request comes from a new address, so the per-ip login / register
+# limits run on each request without rejecting any of them
+client_ips = (f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}" for n in itertools.count(1))
+
+
+async def request(method: str, url: str, body=None, headers: dict = None):
+    # returns (status, body)
+    parts = urlsplit(url)
+    content = orjson.dumps(body) if body is not None else b""
+    raw_headers = [(b"host", b"testserver"), (b"user-agent", b"benchmark")]
+    if body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(content)).encode()))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), value.encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "root_path": "",
+        "query_string": parts.query.encode(),
+        "headers": raw_headers,
+        "client": (next(client_ips), 50000),
+        "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": content, "more_body": False}]
+    response = {"status": None, "body": []}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # the client stays connected until the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], b"".join(response["body"])
+
+
+async def register(username: str):
+    status, body = await request("POST", "/v1/user/register", {
+        "username": username, "email": f"{username}@example.com", "password": PASSWORD})
+    if status != 200:
+        raise RuntimeError(f"Could not register {username}: {status} {body[:200]!r}")
+    return orjson.loads(body)["token"]
+
+
+class Scenarios:
+    # each scenario maps a request number to a request
+    def __init__(self, users: list, movies: int, genres: int, seed: int = 0):
+        # users: [(username, token)]
+        self.users = users
+        self.movies = movies
+        self.genres = genres
+        self.rng = random.Random(seed)
+        self.run_id = int(time.time())
+        # not the request number, the warm up would take the first names
+        self.registered = itertools.count()
+
+    def register(self, i: int):
+        username = f"bench_{self.run_id}_{next(self.registered)}"
+        return "POST", "/v1/user/register", {
+            "username": username, "email": f"{username}@example.com", "password": PASSWORD}, None
+
+    def login(self, i: int):
+        username, _ = self.users[i % len(self.users)]
+        return "POST", "/v1/user/token", {"username": username, "password": PASSWORD}, None
+
+    def profile_update(self, i: int):
+        # the authenticated path: get_token_info + a write
+        _, token = self.users[i % len(self.users)]
+        return "PUT", "/v1/user/me", {"fullname": f"Benchmark {i}"}, {"auth-token": f"Bearer {token}"}
+
+    def username_available(self, i: int):
+        return "GET", f"/v1/user/username-available?username=free_{self.run_id}_{i}", None, None
+
+    def movies_list(self, i: int):
+        order = "top" if i % 2 else "latest"
+        return "GET", f"/v1/movies?order={order}&limit=20", None, None
+
+    def movie_detail(self, i: int):
+        return "GET", f"/v1/movies/{self.rng.randint(1, self.movies)}", None, None
+
+    def genre_detail(self, i: int):
+        return "GET", f"/v1/genres/{self.rng.randint(1, self.genres)}", None, None
+
+    def leaderboard(self, i: int):
+        return "GET", "/v1/leaderboards/top?limit=20", None, None
+
+
+SCENARIOS = ["register", "login", "profile_update", "username_available",
+             "movies_list", "movie_detail", "genre_detail", "leaderboard"]
+
+
+async def measure(make_request, requests: int, concurrency: int):
+    counter = itertools.count()
+    timings = []
+    statuses = Counter()
+
+    async def client():
+        while (i := next(counter)) < requests:
+            method, url, body, headers = make_request(i)
+            started_at = time.perf_counter()
+            status, _ = await request(method, url, body, headers)
+            timings.append(time.perf_counter() - started_at)
+            statuses[status] += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": summarize(timings, scale=1e3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def startup(movies: int, genres: int):
+    # what the app's startup does, minus the alembic check on the fixture
+    fixtures.install_fake_redis()
+    await fixtures.create_schema()
+    await fixtures.seed_catalog(movies=movies, genres=genres)
+    access_logger.start()
+    async with SessionLocal() as db:
+        await UserController(db).build_taken_names_filter()
+        await LeaderboardController(db).rebuild()
+
+
+async def shutdown():
+    access_logger.stop()
+    password_hasher.shutdown()
+    await engine.dispose()
+
+
+async def run(scenarios: list, requests: int, concurrency: int, movies: int, genres: int = 20,
+              users: int = 16):
+    await startup(movies, genres)
+    try:
+        run_id = int(time.time())
+        usernames = [f"seed_{run_id}_{i}" for i in range(users)]
+        tokens = await asyncio.gather(*(register(username) for username in usernames))
+        cases = Scenarios(list(zip(usernames, tokens)), movies, genres)
+
+        results = {}
+        for name in scenarios:
+            make_request = getattr(cases, name)
+            # warm up: pools, caches, first-call imports
+            await measure(make_request, min(requests // 10, 100), concurrency)
+            results[name] = await measure(make_request, requests, concurrency)
+    finally:
+        await shutdown()
+
+    return {
+        "database": engine.url.get_backend_name(),
+        "movies": movies,
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="repeatable, all scenarios by default")
+    parser.add_argument("--requests", type=int, default=2000, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--movies", type=int, default=1000, help="catalog size to seed")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(
+        args.scenario or SCENARIOS, args.requests, args.concurrency, args.movies)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
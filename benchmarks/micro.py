@@ -0,0 +1,116 @@
+# Micro-benchmarks of the per-request building blocks of the auth and
+# catalog paths: password hashing, JWT encode/decode, get_token_info,
+# response serialization, the rate limiter (against a fake redis) and the
+# ip access policy.
+#
+#   python -m benchmarks.micro --iterations 5000
+#   PASSWORD_BCRYPT_ROUNDS=4 python -m benchmarks.micro   # quick run
+
+from benchmarks import fixtures  # noqa: F401, sets up the environment first
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from app.controllers.access_policy import PolicySnapshot
+from app.controllers.principal_cache import principal_cache
+from app.controllers.session import new_token_id
+from app.controllers.rate_limiter import RateLimiter, LocalTokenBucket, DEFAULT_POLICY
+from app.dependencies.authentication import token_generator, token_decoder, get_token_info
+from app.utils.password_operator import (get_password_hash, verify_password,
+                                         PASSWORD_BCRYPT_ROUNDS)
+from benchmarks import serialization
+
+
+def summarize(timings: list, scale: float = 1e6):
+    # seconds -> µs by default
+    timings = sorted(timings)
+    return {
+        "count": len(timings),
+        "mean": round(statistics.fmean(timings) * scale, 3),
+        "p50": round(timings[int(len(timings) * 0.50)] * scale, 3),
+        "p95": round(timings[int(len(timings) * 0.95)] * scale, 3),
+        "p99": round(timings[int(len(timings) * 0.99)] * scale, 3),
+    }
+
+
+def timed(function, iterations: int):
+    function()
+    timings = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started_at)
+    return summarize(timings)
+
+
+async def timed_async(function, iterations: int):
+    await function()
+    timings = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await function()
+        timings.append(time.perf_counter() - started_at)
+    return summarize(timings)
+
+
+async def run(iterations: int, hash_iterations: int):
+    fixtures.install_fake_redis()
+    user = serialization.make_user()
+    token = token_generator(user_id=user.id, scope="user", jti=new_token_id())
+    auth_token = f"Bearer {token}"
+    hashed_password = get_password_hash("password")
+
+    results = {
+        # bcrypt is ms-scale, a handful of rounds is enough
+        "password_hash": timed(lambda: get_password_hash("password"), hash_iterations),
+        "password_verify": timed(lambda: verify_password("password", hashed_password), hash_iterations),
+        "jwt_encode": timed(lambda: token_generator(user_id=user.id, scope="user", jti=new_token_id()), iterations),
+        "jwt_decode": timed(lambda: token_decoder(token), iterations),
+    }
+
+    # get_token_info: in-process hit, and a miss served from the redis snapshot
+    await principal_cache.set_user(user)
+    results["get_token_info_local"] = await timed_async(
+        lambda: get_token_info(auth_token=auth_token, db=None), iterations)
+
+    async def token_info_from_redis():
+        principal_cache.invalidate_token(token)
+        await get_token_info(auth_token=auth_token, db=None)
+    results["get_token_info_redis"] = await timed_async(token_info_from_redis, iterations)
+
+    # one principal per call, so no call is ever rejected
+    limiter = RateLimiter()
+    principals = iter(range(10 ** 9))
+    results["rate_limit_redis"] = await timed_async(
+        lambda: limiter.check(path="/v1/movies", client_ip=f"10.0.{next(principals)}"), iterations)
+    bucket = LocalTokenBucket()
+    results["rate_limit_local"] = timed(
+        lambda: bucket.hit(f"ip:{next(principals)}", DEFAULT_POLICY, time.time() * 1000), iterations)
+
+    # a few hundred ranges, the client matches the longest one
+    policy = PolicySnapshot([f"10.{i}.0.0/16" for i in range(256)],
+                            [f"10.{i}.7.0/24" for i in range(256)] + ["2001:db8::/32"])
+    results["access_policy_ipv4"] = timed(lambda: policy.is_allowed("10.42.7.9"), iterations)
+    results["access_policy_ipv6"] = timed(lambda: policy.is_allowed("2001:db8::1"), iterations)
+
+    return {
+        "unit": "us",
+        "iterations": iterations,
+        "bcrypt_rounds": PASSWORD_BCRYPT_ROUNDS,
+        "cases": results,
+        "serialization": serialization.run(iterations, credits=20),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--hash-iterations", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.iterations, args.hash_iterations)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
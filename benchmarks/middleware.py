@@ -0,0 +1,166 @@
+# Per-request overhead of the middleware stack: the former
+# BaseHTTPMiddleware-based CustomMiddleware vs. the plain ASGI layers.
+#
+#   python -m benchmarks.middleware --requests 20000
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from app.controllers.rate_limiter import RateLimiter, RateLimitPolicy
+from app.middleware import ExceptionMiddleware, RateLimitMiddleware, AccessLogMiddleware
+from app.utils.error_handler import CustomException
+from app.utils.request_logger import AccessLogger
+
+
+class LocalRateLimiter(RateLimiter):
+    # never rejects and never talks to redis, so only the middleware differs
+    policy = RateLimitPolicy("benchmark", 10 ** 9, 1)
+
+    def __init__(self):
+        super().__init__()
+        self.redis_disabled_until = float("inf")
+
+    def get_policy(self, path: str, authenticated: bool):
+        return self.policy
+
+
+class LegacyMiddleware(BaseHTTPMiddleware):
+    # same behavior as the former CustomMiddleware
+    def __init__(self, app, limiter, logger):
+        super().__init__(app)
+        self.limiter = limiter
+        self.logger = logger
+
+    async def dispatch(self, request: Request, call_next):
+        started_at = time.perf_counter()
+        try:
+            await self.limiter.check(
+                path=request.url.path,
+                client_ip=request.client.host,
+                auth_token=request.headers.get("auth-token"))
+            response = await call_next(request)
+        except CustomException as e:
+            response = JSONResponse(status_code=e.status_code, content={"message": e.detail})
+        except Exception:
+            response = JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                    content={"message": "Something went wrong in our server!"})
+
+        self.logger.log({
+            "date": datetime.now().isoformat(),
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 3),
+            "client_ip": request.client.host,
+            "user_agent": request.headers.get("user-agent"),
+        })
+        return response
+
+
+async def endpoint(request):
+    return PlainTextResponse("ok")
+
+
+def build_apps(logger):
+    routes = [Route("/", endpoint)]
+    limiter = LocalRateLimiter()
+
+    bare = Starlette(routes=routes)
+    legacy = Starlette(routes=routes, middleware=[
+        Middleware(LegacyMiddleware, limiter=limiter, logger=logger),
+    ])
+    asgi = Starlette(routes=routes, middleware=[
+        Middleware(AccessLogMiddleware, logger=logger),
+        Middleware(ExceptionMiddleware),
+        Middleware(RateLimitMiddleware, limiter=limiter),
+    ])
+    return {"bare": bare, "legacy": legacy, "asgi": asgi}
+
+
+async def call(app, scope):
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # the client stays connected until the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+
+
+async def measure(app, requests: int):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"user-agent", b"benchmark")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+    # warm up
+    for _ in range(min(1000, requests)):
+        await call(app, scope)
+
+    timings = []
+    for _ in range(requests):
+        started_at = time.perf_counter()
+        await call(app, scope)
+        timings.append(time.perf_counter() - started_at)
+
+    timings.sort()
+    return {
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99)] * 1e6,
+    }
+
+
+async def run(requests: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = AccessLogger(path=f"{tmp}/access.log")
+        logger.start()
+        try:
+            results = {name: await measure(app, requests)
+                       for name, app in build_apps(logger).items()}
+        finally:
+            logger.stop()
+
+    bare = results["bare"]["mean_us"]
+    for name in ("legacy", "asgi"):
+        results[name]["overhead_us"] = results[name]["mean_us"] - bare
+    results["saved_per_request_us"] = results["legacy"]["overhead_us"] - \
+        results["asgi"]["overhead_us"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
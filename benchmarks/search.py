@@ -0,0 +1,81 @@
+# Build time and query latency of the in-process inverted index on a
+# synthetic catalog (no postgres needed).
+#
+#   python -m benchmarks.search --movies 200000 --queries 2000
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from app.controllers.search import InvertedIndex, InMemorySearchBackend
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def zipf_weights(size: int):
+    # a few very common words, a long tail of rare ones
+    weights, total = [], 0
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        weights.append(total)
+    return weights
+
+
+def make_text(vocabulary, weights, words: int, rng: random.Random):
+    return " ".join(rng.choices(vocabulary, cum_weights=weights, k=words))
+
+
+def percentile(timings, p):
+    return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+
+async def run(movies: int, queries: int, seed: int):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(50000, rng)
+    weights = zipf_weights(len(vocabulary))
+
+    index = InvertedIndex()
+    started_at = time.perf_counter()
+    for movie_id in range(1, movies + 1):
+        index.add(movie_id,
+                  name=make_text(vocabulary, weights, rng.randint(1, 4), rng),
+                  summary=make_text(vocabulary, weights, 40, rng),
+                  storyline=make_text(vocabulary, weights, 120, rng),
+                  rate=rng.uniform(1, 5), release_year=rng.randint(1950, 2024), cover="")
+    build_seconds = time.perf_counter() - started_at
+
+    backend = InMemorySearchBackend(index)
+    timings = []
+    for _ in range(queries):
+        q = make_text(vocabulary, weights, rng.randint(1, 3), rng)
+        started_at = time.perf_counter()
+        await backend.search(q, offset=0, limit=20)
+        timings.append(time.perf_counter() - started_at)
+    timings.sort()
+
+    return {
+        "movies": movies,
+        "terms": len(index.postings),
+        "build_seconds": build_seconds,
+        "queries": queries,
+        "p50_ms": percentile(timings, 0.5),
+        "p95_ms": percentile(timings, 0.95),
+        "p99_ms": percentile(timings, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.movies, args.queries, args.seed)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
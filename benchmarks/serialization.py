@@ -0,0 +1,80 @@
+# Encode time of response bodies: the old path (jsonable_encoder over ORM
+# objects / models + json.dumps) against explicit response models + orjson.
+#
+#   python -m benchmarks.serialization --iterations 20000 --credits 20
+
+import argparse
+import json
+import time
+from datetime import date, datetime
+import orjson
+from fastapi.encoders import jsonable_encoder
+from app.models import User, Gender
+from app.schemas import (IUserResponse, IAuthResponse, IMovieDetail, ICastCredit,
+                         IWriterCredit, IGenreItem)
+
+
+def make_user():
+    now = datetime.utcnow()
+    return User(id=1, username="username", fullname="Full Name", profilePic=None,
+                email="user@example.com", hashedPassword="$2b$12$" + "x" * 53,
+                dob=date(1990, 1, 1), gender=Gender.FEMALE, createdAt=now, updatedAt=now)
+
+
+def make_movie(credits: int):
+    now = datetime.utcnow()
+    return IMovieDetail(
+        id=1, name="Movie", rate=4.2, duration=123.0, releaseYear=2001, cover="cover.jpg",
+        countries=["US", "UK"], languages=["English"], director="Director",
+        summary="summary " * 40, storyline="storyline " * 120, budget=1e8,
+        rateCount=1000, weightedRate=4.1, createdAt=now, updatedAt=now,
+        cast=[ICastCredit(id=i, fullname=f"Cast {i}", profilePic=None, isStar=i < 3)
+              for i in range(credits)],
+        writers=[IWriterCredit(id=i, fullname=f"Writer {i}") for i in range(credits // 4 + 1)],
+        genres=[IGenreItem(id=i, title=f"Genre {i}") for i in range(3)])
+
+
+def timed(function, iterations: int):
+    function()
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - started_at) / iterations * 1e6
+
+
+def run(iterations: int, credits: int):
+    user = make_user()
+    movie = make_movie(credits)
+
+    cases = {
+        # what register/login returned: the ORM user, reflected field by field
+        "user_legacy": lambda: json.dumps(jsonable_encoder({"user": user, "token": "t"})).encode(),
+        "user_model_orjson": lambda: orjson.dumps(
+            IAuthResponse(user=IUserResponse.model_validate(user), token="t").model_dump()),
+        "movie_legacy": lambda: json.dumps(jsonable_encoder(movie)).encode(),
+        "movie_orjson": lambda: orjson.dumps(movie.model_dump()),
+        "movie_pydantic_json": lambda: movie.model_dump_json().encode(),
+    }
+    results = {name: round(timed(case, iterations), 2) for name, case in cases.items()}
+
+    legacy_user = json.loads(cases["user_legacy"]())
+    return {
+        "iterations": iterations,
+        "credits": credits,
+        "us_per_encode": results,
+        "user_speedup": round(results["user_legacy"] / results["user_model_orjson"], 1),
+        "movie_speedup": round(results["movie_legacy"] / results["movie_orjson"], 1),
+        "legacy_user_leaks_hashed_password": "hashedPassword" in legacy_user["user"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--credits", type=int, default=20, help="cast credits per movie")
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations, args.credits), indent=2))
+
+
+if __name__ == "__main__":
+    main()
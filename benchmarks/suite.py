@@ -0,0 +1,108 @@
+# Runs the micro-benchmarks and the load driver and writes one JSON document
+# with the commit and environment it ran on; two of them can be compared.
+#
+#   python -m benchmarks.suite --output results/$(git rev-parse --short HEAD).json
+#   python -m benchmarks.suite --compare results/old.json results/new.json
+
+from benchmarks import fixtures  # noqa: F401, sets up the environment first
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from benchmarks import micro, load
+
+# lower is better for these keys, higher for the rest (throughput)
+LOWER_IS_BETTER = ("mean", "p50", "p95", "p99", "seconds")
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": fixtures.BENCH_DATABASE_URL.split("://")[0],
+        "bcrypt_rounds": int(os.environ["PASSWORD_BCRYPT_ROUNDS"]),
+    }
+
+
+async def run(args):
+    return {
+        "environment": environment(),
+        "micro": await micro.run(args.iterations, args.hash_iterations),
+        "load": await load.run(args.scenario or load.SCENARIOS, args.requests,
+                               args.concurrency, args.movies),
+    }
+
+
+def flatten(results: dict, prefix: str = ""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+def compare(old: dict, new: dict):
+    # new / old for the timings and throughput both runs have
+    old_metrics = dict(flatten({"micro": old["micro"]["cases"], "load": old["load"]["scenarios"]}))
+    new_metrics = dict(flatten({"micro": new["micro"]["cases"], "load": new["load"]["scenarios"]}))
+    changes = {}
+    for key, old_value in old_metrics.items():
+        new_value = new_metrics.get(key)
+        metric = key.rsplit(".", 1)[-1]
+        if new_value is None or not old_value or metric in ("count", "requests", "concurrency"):
+            continue
+        ratio = new_value / old_value
+        better = None if ratio == 1 else ratio < 1 if metric in LOWER_IS_BETTER else ratio > 1
+        changes[key] = {"old": old_value, "new": new_value, "ratio": round(ratio, 3),
+                        "better": better}
+    return {
+        "old": old["environment"]["commit"],
+        "new": new["environment"]["commit"],
+        "changes": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--hash-iterations", type=int, default=20)
+    parser.add_argument("--scenario", action="append", choices=load.SCENARIOS)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--movies", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            print(json.dumps(compare(json.load(old), json.load(new)), indent=2))
+        return
+
+    results = asyncio.run(run(args))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
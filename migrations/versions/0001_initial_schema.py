@@ -0,0 +1,130 @@
+"""initial schema
+
+The tables as create_all used to build them, before reviews were linked
+to movies and movies gained rating aggregates and a search vector (0003).
+Databases created that way are adopted with `alembic stamp 0001` before
+upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+gender = postgresql.ENUM("MALE", "FEMALE", "NOT_SPECIFIED", name="gender", create_type=False)
+review_rate = postgresql.ENUM("ONE", "TWO", "THREE", "FOUR", "FIVE", name="reviewrate", create_type=False)
+
+
+def timestamps():
+    return [
+        sa.Column("createdAt", sa.DateTime(), nullable=False),
+        sa.Column("updatedAt", sa.DateTime(), nullable=False),
+    ]
+
+
+def person_table(name):
+    op.create_table(
+        name,
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("fullname", sa.String(length=255), nullable=True),
+        sa.Column("profilePic", sa.String(length=255), nullable=True),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("dob", sa.Date(), nullable=True),
+        sa.Column("gender", gender, nullable=True),
+        *timestamps(),
+        sa.PrimaryKeyConstraint("id"))
+
+
+def credit_table(name, column, target):
+    op.create_table(
+        name,
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column(column, sa.Integer(), nullable=False),
+        sa.Column("movieId", sa.Integer(), nullable=False),
+        *([sa.Column("isStar", sa.Boolean(), nullable=False)] if name == "movie_casts" else []),
+        *timestamps(),
+        sa.ForeignKeyConstraint([column], [f"{target}.id"]),
+        sa.ForeignKeyConstraint(["movieId"], ["movies.id"]),
+        sa.PrimaryKeyConstraint("id"))
+
+
+def upgrade():
+    bind = op.get_bind()
+    gender.create(bind, checkfirst=True)
+    review_rate.create(bind, checkfirst=True)
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("username", sa.String(length=255), nullable=False),
+        sa.Column("fullname", sa.String(length=255), nullable=True),
+        sa.Column("profilePic", sa.String(length=255), nullable=True),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("hashedPassword", sa.String(length=255), nullable=False),
+        sa.Column("dob", sa.Date(), nullable=True),
+        sa.Column("gender", gender, nullable=True),
+        *timestamps(),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("username", name="users_username_key"),
+        sa.UniqueConstraint("email", name="users_email_key"))
+
+    op.create_table(
+        "movies",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.Column("duration", sa.Float(), nullable=False),
+        sa.Column("releaseYear", sa.Integer(), nullable=False),
+        sa.Column("cover", sa.String(length=255), nullable=False),
+        sa.Column("countries", postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column("languages", postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column("director", sa.String(), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("storyline", sa.Text(), nullable=False),
+        sa.Column("budget", sa.Float(), nullable=False),
+        *timestamps(),
+        sa.PrimaryKeyConstraint("id"))
+
+    person_table("casts")
+    person_table("writers")
+
+    op.create_table(
+        "genres",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        *timestamps(),
+        sa.PrimaryKeyConstraint("id"))
+
+    op.create_table(
+        "reviews",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("userId", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=True),
+        sa.Column("rate", review_rate, nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        *timestamps(),
+        sa.ForeignKeyConstraint(["userId"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"))
+
+    credit_table("movie_casts", "castId", "casts")
+    credit_table("movie_writers", "writerId", "writers")
+    credit_table("movie_genres", "genreId", "genres")
+
+
+def downgrade():
+    for table in ("movie_genres", "movie_writers", "movie_casts", "reviews",
+                  "genres", "writers", "casts", "movies", "users"):
+        op.drop_table(table)
+    bind = op.get_bind()
+    review_rate.drop(bind, checkfirst=True)
+    gender.drop(bind, checkfirst=True)
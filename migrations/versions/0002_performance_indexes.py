@@ -0,0 +1,46 @@
+"""performance indexes
+
+Foreign keys of the credit tables, GIN indexes for the array
+filters and composite indexes for the keyset listings. Built concurrently
+so an existing database keeps serving writes meanwhile.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:30:00
+
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# name, table, columns, index method
+INDEXES = [
+    ("ix_movie_casts_castId", "movie_casts", ["castId"], None),
+    ("ix_movie_casts_movieId", "movie_casts", ["movieId"], None),
+    ("ix_movie_writers_writerId", "movie_writers", ["writerId"], None),
+    ("ix_movie_writers_movieId", "movie_writers", ["movieId"], None),
+    ("ix_movie_genres_genreId", "movie_genres", ["genreId"], None),
+    ("ix_movie_genres_movieId", "movie_genres", ["movieId"], None),
+    ("ix_movies_countries", "movies", ["countries"], "gin"),
+    ("ix_movies_languages", "movies", ["languages"], "gin"),
+    ("ix_movies_created_at_id", "movies", ["createdAt", "id"], None),
+    ("ix_movies_rate_id", "movies", ["rate", "id"], None),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, using in INDEXES:
+            op.create_index(name, table, columns, postgresql_using=using,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,55 @@
+"""reviews, rating aggregates and search
+
+Links reviews to movies (one review per user and movie), adds the running
+rateSum / rateCount of every movie and the generated full-text searchVector
+with its GIN index. Reviews couldn't be written before this revision, so
+the table is expected to be empty.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(summary, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(storyline, '')), 'C')")
+
+
+def upgrade():
+    op.add_column("reviews", sa.Column("movieId", sa.Integer(), nullable=False))
+    op.create_foreign_key("reviews_movieId_fkey", "reviews", "movies", ["movieId"], ["id"])
+    # also serves lookups by userId alone
+    op.create_unique_constraint("uq_reviews_user_movie", "reviews", ["userId", "movieId"])
+    op.create_index("ix_reviews_movieId", "reviews", ["movieId"])
+
+    # existing movies start with no reviews
+    for column in ("rateSum", "rateCount"):
+        op.add_column("movies", sa.Column(column, sa.Integer(), nullable=False, server_default="0"))
+        op.alter_column("movies", column, server_default=None)
+
+    # rewrites the table once to fill in the generated column
+    op.add_column("movies", sa.Column(
+        "searchVector", postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True), nullable=True))
+    op.create_index("ix_movies_search_vector", "movies", ["searchVector"], postgresql_using="gin")
+
+
+def downgrade():
+    op.drop_index("ix_movies_search_vector", table_name="movies")
+    op.drop_column("movies", "searchVector")
+    op.drop_column("movies", "rateCount")
+    op.drop_column("movies", "rateSum")
+    op.drop_index("ix_reviews_movieId", table_name="reviews")
+    op.drop_constraint("uq_reviews_user_movie", "reviews", type_="unique")
+    op.drop_constraint("reviews_movieId_fkey", "reviews", type_="foreignkey")
+    op.drop_column("reviews", "movieId")
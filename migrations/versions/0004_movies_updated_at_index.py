@@ -0,0 +1,29 @@
+"""movies.updatedAt index
+
+For the incremental export (?updatedSince=), which would otherwise scan
+every movie. Built concurrently, like 0002.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 11:30:00
+
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index("ix_movies_updated_at", "movies", ["updatedAt"],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_movies_updated_at", table_name="movies", postgresql_concurrently=True, if_exists=True)
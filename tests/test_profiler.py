@@ -0,0 +1,49 @@
+import unittest
+from app.db.profiler import normalize, fingerprint
+
+
+# statements as SQLAlchemy renders them for asyncpg
+SELECT_BY_IDS = "SELECT movies.id \nFROM movies \nWHERE movies.id IN ({})"
+INSERT_REVIEWS = (
+    'INSERT INTO reviews ("userId", "movieId", title, rate, text, "createdAt", "updatedAt") VALUES {}')
+REVIEW_ROW = ("(${}::INTEGER, ${}::INTEGER, ${}::VARCHAR, ${}::reviewrate, ${}::VARCHAR, "
+              "${}::TIMESTAMP WITHOUT TIME ZONE, ${}::TIMESTAMP WITHOUT TIME ZONE)")
+
+
+def id_list(count: int):
+    return ", ".join(f"${number}::INTEGER" for number in range(1, count + 1))
+
+
+def review_rows(count: int):
+    return ", ".join(REVIEW_ROW.format(*range(7 * row + 1, 7 * row + 8)) for row in range(count))
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_strips_asyncpg_casts(self):
+        self.assertEqual(
+            normalize('UPDATE movies SET "rateSum"=(movies."rateSum" + $1::INTEGER), '
+                      '"updatedAt"=$2::TIMESTAMP WITHOUT TIME ZONE WHERE movies.id = $3::INTEGER'),
+            'UPDATE movies SET "rateSum"=(movies."rateSum" + ?), "updatedAt"=? WHERE movies.id = ?')
+        self.assertEqual(
+            normalize('SELECT movies.id \nFROM movies \nWHERE movies.countries @> $1::VARCHAR[] '
+                      'AND movies.name = $2::VARCHAR(255) LIMIT $3::INTEGER'),
+            "SELECT movies.id FROM movies WHERE movies.countries @> ? AND movies.name = ? LIMIT ?")
+
+    def test_collapses_asyncpg_in_lists(self):
+        self.assertEqual(normalize(SELECT_BY_IDS.format(id_list(3))),
+                         "SELECT movies.id FROM movies WHERE movies.id IN (...)")
+        self.assertEqual(fingerprint(SELECT_BY_IDS.format(id_list(1))),
+                         fingerprint(SELECT_BY_IDS.format(id_list(50))))
+
+    def test_collapses_asyncpg_multi_row_values(self):
+        self.assertEqual(fingerprint(INSERT_REVIEWS.format(review_rows(1))),
+                         fingerprint(INSERT_REVIEWS.format(review_rows(20))))
+        self.assertTrue(normalize(INSERT_REVIEWS.format(review_rows(2))).endswith("VALUES (...)"))
+
+    def test_keeps_casts_in_the_statement_text(self):
+        # only binds are placeholders, a cast written in the query is part of its shape
+        self.assertNotEqual(fingerprint("SELECT now()::date"), fingerprint("SELECT now()::timestamp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
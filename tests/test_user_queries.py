@@ -0,0 +1,77 @@
+# Query budgets of the user endpoints, through the whole app in-process
+# against the stand-ins of benchmarks.fixtures (pip install -r
+# benchmarks/requirements.txt):
+#
+#   python -m unittest tests.test_user_queries
+
+import os
+
+# a cheap hash, the tests count queries not bcrypt time
+os.environ.setdefault("PASSWORD_BCRYPT_ROUNDS", "4")
+
+from benchmarks import fixtures  # noqa: E402, sets up the environment before anything from app
+
+import asyncio  # noqa: E402
+import unittest  # noqa: E402
+import orjson  # noqa: E402
+from app.db.base import engine  # noqa: E402
+from app.db.profiler import assert_query_budget  # noqa: E402
+from benchmarks.load import request, PASSWORD  # noqa: E402
+
+
+# statements per request: the session lookup cache lets each one read the
+# user at most once
+REGISTER_QUERIES = 2  # conflicts, INSERT
+LOGIN_QUERIES = 1  # SELECT by username
+PROFILE_UPDATE_QUERIES = 2  # user of the token, UPDATE; no conflict check without username / email
+
+
+def setUpModule():
+    async def create_schema():
+        await fixtures.create_schema()
+        await engine.dispose()
+    asyncio.run(create_schema())
+
+
+class UserQueriesTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        fixtures.install_fake_redis()
+
+    async def asyncTearDown(self):
+        # the pool's connections belong to this test's event loop
+        await engine.dispose()
+
+    async def register(self, username: str):
+        status, body = await request("POST", "/v1/user/register", {
+            "username": username, "email": f"{username}@example.com", "password": PASSWORD})
+        self.assertEqual(status, 200, body)
+        return orjson.loads(body)["token"]
+
+    async def test_register(self):
+        with assert_query_budget(REGISTER_QUERIES, max_repeats=1):
+            await self.register("queries_register")
+
+    async def test_login(self):
+        await self.register("queries_login")
+        with assert_query_budget(LOGIN_QUERIES, max_repeats=1):
+            status, body = await request("POST", "/v1/user/token", {
+                "username": "queries_login", "password": PASSWORD})
+        self.assertEqual(status, 200, body)
+
+    async def test_profile_update(self):
+        token = await self.register("queries_profile")
+        with assert_query_budget(PROFILE_UPDATE_QUERIES, max_repeats=1):
+            status, body = await request("PUT", "/v1/user/me", {"fullname": "Query Budget"},
+                                         {"auth-token": f"Bearer {token}"})
+        self.assertEqual(status, 200, body)
+
+    async def test_profile_update_rejects_nulls(self):
+        token = await self.register("queries_nulls")
+        for field in ("username", "email"):
+            status, body = await request("PUT", "/v1/user/me", {field: None},
+                                         {"auth-token": f"Bearer {token}"})
+            self.assertEqual(status, 400, body)
+
+
+if __name__ == "__main__":
+    unittest.main()